@@ -1,43 +1,55 @@
 
-import particles
-import couplings
-import lorentz
-import parameters
-import vertices
-import coupling_orders
-import write_param_card
-import propagators
-
-
-all_particles = particles.all_particles
-all_vertices = vertices.all_vertices
-all_couplings = couplings.all_couplings
-all_lorentz = lorentz.all_lorentz
-all_parameters = parameters.all_parameters
-all_orders = coupling_orders.all_orders
-all_functions = function_library.all_functions
-all_propagators = propagators.all_propagators
-
-try:
-   import decays
-except ImportError:
-   pass
-else:
-   all_decays = decays.all_decays
-
-try:
-   import form_factors
-except ImportError:
-   pass
-else:
-   all_form_factors = form_factors.all_form_factors
-
-try:
-   import CT_vertices
-except ImportError:
-   pass
-else:
-   all_CTvertices = CT_vertices.all_CTvertices
+import sys
+import types
+
+# The model files are imported on first access of the attributes below, such
+# that e.g. a param_card writer only needing all_parameters does not build
+# all the vertices and Lorentz structures.
+_lazy_attributes = {
+    'all_particles': ('particles', True),
+    'all_vertices': ('vertices', True),
+    'all_couplings': ('couplings', True),
+    'all_lorentz': ('lorentz', True),
+    'all_parameters': ('parameters', True),
+    'all_orders': ('coupling_orders', True),
+    'all_functions': ('function_library', True),
+    'all_propagators': ('propagators', True),
+    'all_decays': ('decays', False),
+    'all_form_factors': ('form_factors', False),
+    'all_CTvertices': ('CT_vertices', False),
+    'model_index': ('lookup', True),
+    }
+
+_submodules = ['particles', 'couplings', 'lorentz', 'parameters', 'vertices',
+               'coupling_orders', 'write_param_card', 'propagators',
+               'function_library', 'object_library']
+
+
+class _LazyModel(types.ModuleType):
+    """ the model package, importing its files on demand """
+
+    def _import(self, name):
+        __import__('%s.%s' % (self.__name__, name))
+        return sys.modules['%s.%s' % (self.__name__, name)]
+
+    def __getattr__(self, name):
+        if name in _lazy_attributes:
+            module, required = _lazy_attributes[name]
+            try:
+                value = getattr(self._import(module), name)
+            except ImportError:
+                if required:
+                    raise
+                raise AttributeError(name)
+            setattr(self, name, value)
+            return value
+        elif name in _submodules:
+            return self._import(name)
+        raise AttributeError("'module' object has no attribute '%s'" % name)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_submodules) |
+                      set(name for name in _lazy_attributes if hasattr(self, name)))
 
 
 gauge = [0, 1]
@@ -46,3 +58,10 @@ gauge = [0, 1]
 __author__ = "N. Christensen, C. Duhr, B. Fuks"
 __date__ = "28. 09. 2016"
 __version__= "1.4.7"
+
+_model = _LazyModel(__name__, __doc__)
+_model.__dict__.update(globals())
+# keep the original module alive: python 2 clears the globals of a module
+# when it is deleted
+_model._module = sys.modules[__name__]
+sys.modules[__name__] = _model
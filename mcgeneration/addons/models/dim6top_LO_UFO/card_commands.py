@@ -0,0 +1,242 @@
+""" Interpreter of the MadGraph commands setting the parameters of the model.
+
+customizecards.dat and reweight_card.dat define parameter points with
+commands like
+
+    set param_card mass 6 172.5
+    set param_card decay 6 auto
+    launch --rwgt_name=ctg_p1
+    set ctG 1.0
+
+The interpreter applies them to the values of the external parameters (in
+the order of parameters.py), without MadGraph:
+
+    from card_commands import CommandInterpreter
+    interpreter = CommandInterpreter()            # defaults of parameters.py
+    interpreter.run(open('customizecards.dat'))   # one point: the new base
+    names, points = interpreter.run(open('reweight_card.dat'))
+    couplings = interpreter.couplings(points)     # (npoints, ncouplings)
+
+In a reweight_card, each 'launch' starts a new point from the base values
+(the param_card of the events) and the following 'set' commands apply to
+it. 'change' commands and the settings of the other cards are ignored.
+Widths set to 'auto' or given to compute_widths (particle names, PDG codes
+or all) are the two-body widths of widths.py.
+
+    python card_commands.py [--param_card=FILE] [--customize=FILE]
+                            [--save=FILE.npz] [REWEIGHT_CARD]
+"""
+
+import shlex
+import sys
+
+import numpy
+
+from evaluator import BatchEvaluator, is_wilson_coefficient
+from object_library import UFOError
+
+# cards which can be edited with 'set' but do not hold model parameters
+other_cards = ['run_card', 'madspin_card', 'shower_card', 'pythia8_card',
+               'delphes_card', 'madanalysis5_parton_card', 'madanalysis5_hadron_card',
+               'MadLoopParams', 'FO_analyse_card']
+
+class CommandInterpreter(object):
+    """ values of the external parameters set by MadGraph commands """
+
+    def __init__(self, base=None, evaluator=None):
+        """ base is the (K,) array of the external parameters, or a
+        param_card file; the defaults of parameters.py if None. The widths
+        of the base set to Auto (NaN) are computed. """
+
+        if evaluator is None:
+            evaluator = BatchEvaluator()
+        self.evaluator = evaluator
+        self.names = list(evaluator.external_names)
+        self._by_name = dict((name.lower(), i) for i, name in enumerate(self.names))
+        self._by_code = dict(((p.lhablock.upper(), tuple(p.lhacode)), i)
+                                              for i, p in enumerate(evaluator.external))
+        self._widths = {}
+        self.ignored = []        # commands without effect on the parameters
+
+        if base is None:
+            base = evaluator.default_values()
+        elif isinstance(base, str):
+            from read_param_card import ParamCardReader
+            base = ParamCardReader(evaluator.external).read_file(base)
+        self.base = numpy.array(base, dtype=float)
+        auto = dict((column, evaluator.external[column].lhacode[0])
+                    for column in numpy.nonzero(numpy.isnan(self.base))[0]
+                    if evaluator.external[column].lhablock.upper() == 'DECAY')
+        self.compute_widths(self.base[numpy.newaxis], [auto])
+
+    def column(self, arguments):
+        """ column and value (string) set by the arguments of 'set', without
+        'param_card'. None for other cards. """
+
+        if len(arguments) == 2 and arguments[0].lower() in self._by_name:
+            return self._by_name[arguments[0].lower()], arguments[1]
+        if len(arguments) < 3:
+            raise UFOError('Unknown parameter in "set %s"' % ' '.join(arguments))
+        try:
+            key = (arguments[0].upper(), tuple(int(code) for code in arguments[1:-1]))
+        except ValueError:
+            key = None
+        if key not in self._by_code:
+            raise UFOError('No parameter of the model for "set %s"' % ' '.join(arguments))
+        return self._by_code[key], arguments[-1]
+
+    def set(self, values, arguments, auto):
+        """ apply 'set arguments' to the values, record the widths set to
+        auto (as column -> PDG code) """
+
+        if arguments and arguments[0] in other_cards:
+            self.ignored.append('set ' + ' '.join(arguments))
+            return
+        if arguments and arguments[0] == 'param_card':
+            arguments = arguments[1:]
+        try:
+            column, value = self.column(arguments)
+        except UFOError:
+            # e.g. run_card settings given without the name of the card
+            if len(arguments) == 2:
+                self.ignored.append('set ' + ' '.join(arguments))
+                return
+            raise
+        if value.lower() == 'auto':
+            param = self.evaluator.external[column]
+            if param.lhablock.upper() != 'DECAY':
+                raise UFOError('Only widths can be set to auto, not %s.' % param.name)
+            auto[column] = param.lhacode[0]
+            return
+        try:
+            values[column] = float(value.upper().replace('D', 'E'))
+        except ValueError:
+            raise UFOError('Unsupported value in "set %s"' % ' '.join(arguments))
+        auto.pop(column, None)
+
+    def width_columns(self, arguments):
+        """ column -> PDG code of the widths of the particles (names or PDG
+        codes, 'all') of compute_widths, options (--body_decay=...) are
+        ignored """
+
+        from lookup import model_index
+        by_name = dict((p.name.lower(), p) for p in model_index.particles)
+        widths = dict((column, param.lhacode[0]) for column, param in
+                      enumerate(self.evaluator.external) if param.lhablock.upper() == 'DECAY')
+        out = {}
+        for word in arguments:
+            if word.startswith('--'):
+                continue
+            if word.lower() == 'all':
+                out.update(widths)
+                continue
+            try:
+                particle = model_index.particle(int(word))
+            except ValueError:
+                particle = by_name.get(word.lower())
+            except KeyError:
+                particle = None
+            if particle is None:
+                raise UFOError('No particle "%s" in the model for "compute_widths %s"'
+                               % (word, ' '.join(arguments)))
+            code = abs(particle.pdg_code)
+            key = ('DECAY', (code,))
+            if key not in self._by_code:
+                raise UFOError('No width of %s (DECAY %d) in the param_card for '
+                               '"compute_widths %s"' % (particle.name, code,
+                                                        ' '.join(arguments)))
+            out[self._by_code[key]] = code
+        return out
+
+    def run(self, lines):
+        """ interpret the commands, return the names and the (npoints, K)
+        values of the points. Without 'launch', the commands define a
+        single point (named 'base') which becomes the new base. """
+
+        names, points, autos = [], [], []
+        values, auto = self.base.copy(), {}
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            words = shlex.split(line)
+            command = words[0].lower()
+            if command == 'launch':
+                name = [word.split('=', 1)[1] for word in words[1:]
+                                               if word.startswith('--rwgt_name=')]
+                names.append(name[0] if name else 'rwgt_%d' % (len(names) + 1))
+                points.append(self.base.copy())
+                autos.append({})
+                values, auto = points[-1], autos[-1]
+            elif command == 'set':
+                self.set(values, words[1:], auto)
+            elif command == 'compute_widths':
+                auto.update(self.width_columns(words[1:]))
+            else:
+                # change, done, exit, 0, ...
+                self.ignored.append(line)
+
+        if not names:
+            self.compute_widths(values[numpy.newaxis], [auto])
+            self.base = values
+            return ['base'], values[numpy.newaxis].copy()
+        points = numpy.array(points)
+        self.compute_widths(points, autos)
+        return names, points
+
+    def compute_widths(self, points, autos):
+        """ replace the widths set to auto by the two-body widths, at the
+        masses of each point """
+
+        from widths import DecayWidths
+        for i, auto in enumerate(autos):
+            for column, code in auto.items():
+                fixed = tuple((name, points[i, j]) for j, name in enumerate(self.names)
+                              if not is_wilson_coefficient(self.evaluator.external[j])
+                              and self.evaluator.external[j].lhablock.upper() != 'DECAY')
+                key = (code, fixed)
+                if key not in self._widths:
+                    self._widths[key] = DecayWidths(code, dict(fixed), evaluator=self.evaluator)
+                points[i, column] = self._widths[key](points[i])[0]
+
+    def couplings(self, points):
+        """ values of the couplings for the (npoints, K) points """
+        return self.evaluator.evaluate(numpy.atleast_2d(points))
+
+    def changes(self, point):
+        """ name -> value of the parameters of point different from the base """
+        return [(name, point[i]) for i, name in enumerate(self.names)
+                                  if point[i] != self.base[i]]
+
+
+if '__main__' == __name__:
+    options = {}
+    files = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--') and '=' in arg:
+            key, value = arg[2:].split('=', 1)
+            options[key] = value
+        else:
+            files.append(arg)
+    if not files and 'customize' not in options:
+        sys.exit(__doc__)
+
+    interpreter = CommandInterpreter(options.get('param_card'))
+    if 'customize' in options:
+        interpreter.run(open(options['customize']))
+    names, points = ['base'], interpreter.base[numpy.newaxis]
+    for filename in files:
+        names, points = interpreter.run(open(filename))
+
+    base_couplings = interpreter.couplings(interpreter.base)
+    couplings = interpreter.couplings(points)
+    for name, point, values in zip(names, points, couplings):
+        changed = (values != base_couplings).sum()
+        print('%-12s %3d couplings changed  %s' % (name, changed, ' '.join(
+              '%s=%g' % change for change in interpreter.changes(point))))
+    for command in interpreter.ignored:
+        print('ignored: %s' % command)
+    if 'save' in options:
+        numpy.savez(options['save'], names=numpy.array(names),
+                    parameters=numpy.array(interpreter.names),
+                    points=points, couplings=couplings)
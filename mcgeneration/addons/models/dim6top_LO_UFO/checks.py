@@ -0,0 +1,352 @@
+""" Regression checks of the numerical evaluation of the model.
+
+Each check raises an AssertionError when the results change:
+
+    cse            the optimized evaluation of cse.py is bit-for-bit identical
+                   to the evaluation of the strings of parameters.py and
+                   couplings.py (scalar and array versions)
+    batch          the BatchEvaluator agrees with the scalar exec/eval of the
+                   strings at random values of the Wilson coefficients
+    qqbar, gg      the SM |M|^2 of q q~ > t t~ and g g > t t~ of
+                   matrix_elements.py agree with the analytic formulas
+    gauge          |M|^2 of g g > t t~ vanishes when a gluon polarization is
+                   replaced by its momentum
+    reversal       with DIM6<=1 and random coefficients, the |M|^2 summed over
+                   the states of q q~ > t t~ and g g > t t~ are the ones of
+                   t t~ > q q~ and t t~ > g g with the momenta reversed
+    quadratic      with DIM6<=1, |M|^2 is quadratic in ctG
+    widths         the top width of points with other masses is the one at
+                   these masses (sm_values), for any Wilson coefficients
+    snapshot       after snapshot.load() in a new interpreter (model files as
+                   top-level modules and in the package), the imports and the
+                   BatchEvaluator see each object of the model once
+    reweighting    compare_to_lhe reads back the reweights of g g and q q~
+                   events with MT = 172.5 in the param_card of their header,
+                   and sees the change of a param_card with MT = 172
+
+    python checks.py [cse batch qqbar gg gauge reversal quadratic widths snapshot
+                      reweighting]
+"""
+
+import imp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+import cse
+from evaluator import BatchEvaluator, is_wilson_coefficient, scalar_evaluation
+from matrix_elements import MatrixElement, compare_to_lhe, coupling_values
+
+sm_excluded = ('a', 'z', 'h', 'w+')
+
+def random_points(evaluator, npoints=20, seed=1234, scale=3.):
+    """ points of the external parameters with random Wilson coefficients """
+
+    random = numpy.random.RandomState(seed)
+    points = evaluator.points(npoints)
+    for param in evaluator.external:
+        if is_wilson_coefficient(param):
+            points[:, evaluator.index(param.name)] = random.uniform(-scale, scale, npoints)
+    return points
+
+def random_momenta(nevents=50, energy=1000., mass=173., seed=4321):
+    """ (N, 4, 4) momenta of 2 -> 2 events in the center of mass frame, with
+    massless initial and final particles of the given mass """
+
+    random = numpy.random.RandomState(seed)
+    cos = random.uniform(-1., 1., nevents)
+    phi = random.uniform(0., 2 * numpy.pi, nevents)
+    sin = numpy.sqrt(1. - cos ** 2)
+    p = numpy.sqrt((energy / 2.) ** 2 - mass ** 2)
+    out = numpy.zeros((nevents, 4, 4))
+    out[:, 0] = [energy / 2., 0., 0., energy / 2.]
+    out[:, 1] = [energy / 2., 0., 0., -energy / 2.]
+    out[:, 2, 0] = out[:, 3, 0] = energy / 2.
+    out[:, 2, 1:] = p * numpy.array([sin * numpy.cos(phi), sin * numpy.sin(phi), cos]).T
+    out[:, 3, 1:] = -out[:, 2, 1:]
+    return out
+
+def mandelstam(momenta):
+    def square(p):
+        return p[:, 0] ** 2 - (p[:, 1:] ** 2).sum(axis=1)
+    return (square(momenta[:, 0] + momenta[:, 1]), square(momenta[:, 0] - momenta[:, 2]),
+            square(momenta[:, 0] - momenta[:, 3]))
+
+def assert_close(values, expected, rtol, what):
+    difference = numpy.max(abs(values / expected - 1))
+    if not difference <= rtol:
+        raise AssertionError('%s: relative difference %.3g (tolerance %g)' %
+                             (what, difference, rtol))
+    return difference
+
+def sm_matrix_element(initial, evaluator, max_orders=None):
+    """ the matrix element to t t~, without top width in the propagators,
+    and the coupling values of the SM """
+
+    me = MatrixElement(initial, ['t', 't~'], excluded=sm_excluded,
+                       max_orders=max_orders or {'DIM6': 0}, evaluator=evaluator)
+    me.values['WT'] = 0.
+    return me, coupling_values(evaluator, evaluator.default_values())
+
+#=============================================================================
+# checks
+#=============================================================================
+
+def check_cse(evaluator):
+    """ bit-for-bit comparison, see cse.check. The module is built from the
+    current cse.py, not loaded from optimized_couplings.py, which is only
+    rewritten when the expressions change. """
+
+    module = imp.new_module('optimized_couplings')
+    exec(compile(cse.module_source(), '<cse>', 'exec'), module.__dict__)
+    cse.check(module)
+    return 'identical to the string evaluation'
+
+def check_batch(evaluator, npoints=20):
+    points = random_points(evaluator, npoints)
+    batch = evaluator.evaluate(points)
+    expected = scalar_evaluation(points)
+    single = numpy.array([evaluator.evaluate(row) for row in points])
+    if single.tobytes() != batch.tobytes():
+        raise AssertionError('evaluation of single points differs from the batch')
+    scale = abs(expected).max(axis=0)
+    difference = numpy.max(abs(batch - expected) / numpy.where(scale > 0, scale, 1.))
+    if not difference <= 1e-12:
+        raise AssertionError('batch evaluation: relative difference %.3g from '
+                             'the scalar evaluation' % difference)
+    return '%d points, relative difference %.3g' % (npoints, difference)
+
+def check_qqbar(evaluator):
+    """ 4/9 g^4 ((m^2-t)^2 + (m^2-u)^2 + 2 m^2 s) / s^2 """
+
+    me, couplings = sm_matrix_element(['u', 'u~'], evaluator)
+    mass, g = me.values['MT'], me.values['G']
+    momenta = random_momenta(mass=mass)
+    s, t, u = mandelstam(momenta)
+    expected = 4. / 9 * g ** 4 * ((mass ** 2 - t) ** 2 + (mass ** 2 - u) ** 2 +
+                                  2 * mass ** 2 * s) / s ** 2
+    return 'relative difference %.3g' % assert_close(me(momenta, couplings), expected,
+                                                     1e-10, 'u u~ > t t~')
+
+def check_gg(evaluator):
+    """ g^4 (1/(6 t1 t2) - 3/8) (t1^2 + t2^2 + r - r^2/(4 t1 t2)), with
+    t1 = (m^2-t)/s, t2 = (m^2-u)/s and r = 4 m^2/s """
+
+    me, couplings = sm_matrix_element(['g', 'g'], evaluator)
+    mass, g = me.values['MT'], me.values['G']
+    momenta = random_momenta(mass=mass)
+    s, t, u = mandelstam(momenta)
+    t1, t2, r = (mass ** 2 - t) / s, (mass ** 2 - u) / s, 4 * mass ** 2 / s
+    expected = g ** 4 * (1. / (6 * t1 * t2) - 3. / 8) * \
+               (t1 ** 2 + t2 ** 2 + r - r ** 2 / (4 * t1 * t2))
+    return 'relative difference %.3g' % assert_close(me(momenta, couplings), expected,
+                                                     1e-10, 'g g > t t~')
+
+def check_gauge(evaluator):
+    """ the first gluon is longitudinal, the second transverse """
+
+    me, couplings = sm_matrix_element(['g', 'g'], evaluator, {'DIM6': 1})
+    points = random_points(evaluator, 1)[0]
+    couplings = coupling_values(evaluator, points)
+    momenta = random_momenta(mass=me.values['MT'])
+    physical = me(momenta, couplings)
+    wavefunctions = me._wavefunctions
+    def longitudinal(momenta):
+        out = wavefunctions(momenta)
+        p = momenta[:, 0, :]
+        out[0] = ([(p / p[:, :1]).astype(complex)], out[0][1])
+        return out
+    me._wavefunctions = longitudinal
+    ratio = numpy.max(me(momenta, couplings) / physical)
+    if not ratio <= 1e-10:
+        raise AssertionError('g g > t t~ with a longitudinal gluon: %.3g of the '
+                             'physical |M|^2' % ratio)
+    return 'longitudinal / physical %.3g' % ratio
+
+def check_reversal(evaluator):
+    couplings = coupling_values(evaluator, random_points(evaluator, 1)[0])
+    differences = []
+    for initial in (['u', 'u~'], ['g', 'g']):
+        forward = MatrixElement(initial, ['t', 't~'], excluded=sm_excluded,
+                                max_orders={'DIM6': 1}, evaluator=evaluator)
+        backward = MatrixElement(['t', 't~'], initial, excluded=sm_excluded,
+                                 max_orders={'DIM6': 1}, evaluator=evaluator)
+        forward.values['WT'] = backward.values['WT'] = 0.
+        momenta = random_momenta(mass=forward.values['MT'])
+        summed = [me(p, couplings) / (me.average * me.symmetry) for me, p in
+                  [(forward, momenta), (backward, momenta[:, [2, 3, 0, 1]])]]
+        differences.append(assert_close(summed[0], summed[1], 1e-10,
+                                        '%s > t t~ reversed' % ' '.join(initial)))
+    return 'relative difference %.3g' % max(differences)
+
+def check_quadratic(evaluator):
+    me = MatrixElement(['g', 'g'], ['t', 't~'], excluded=sm_excluded,
+                       max_orders={'DIM6': 1}, evaluator=evaluator)
+    momenta = random_momenta(mass=me.values['MT'])
+    values = [-2., 0., 1., 3.]
+    me2 = numpy.array([me(momenta, coupling_values(evaluator, evaluator.points(1, ctG=c)[0]))
+                       for c in values])
+    fit = numpy.polyfit(values[:3], me2[:3], 2)
+    predicted = sum(fit[i] * values[3] ** (2 - i) for i in range(3))
+    if not abs(me2[3] - me2[1]).min() > 0:
+        raise AssertionError('|M|^2 of g g > t t~ does not depend on ctG')
+    return 'relative difference %.3g' % assert_close(me2[3], predicted, 1e-9,
+                                                     'ctG dependence of g g > t t~')
+
+def check_widths(evaluator):
+    from widths import DecayWidths
+    top = DecayWidths('t', evaluator=evaluator)
+    masses = [172., 175., 180., 172.5]
+    points = random_points(evaluator, len(masses))
+    points[:, evaluator.index('MT')] = masses
+    values = top(points)
+    expected = [DecayWidths('t', {'MT': mass}, evaluator=evaluator)(point)[0]
+                for mass, point in zip(masses, points)]
+    if len(set(values)) != len(masses):
+        raise AssertionError('top widths %s for MT %s' % (values, masses))
+    return 'relative difference %.3g' % assert_close(values, numpy.array(expected),
+                                                     1e-12, 'top width')
+
+snapshot_script = """
+import sys
+sys.path.insert(0, %(path)r)
+%(imports)s
+snapshot.load()
+from %(prefix)sevaluator import BatchEvaluator
+from %(prefix)sdependency import ParameterGraph
+import %(prefix)sparameters as parameters, %(prefix)svertices as vertices
+import %(prefix)sobject_library as object_library
+ParameterGraph()
+print('%%d %%d %%d %%d' %% (len(parameters.all_parameters), len(BatchEvaluator().couplings),
+                         len(vertices.all_vertices), len(object_library.all_vertices)))
+"""
+
+def check_snapshot(evaluator):
+    """ twice for each import name: the first run may build the snapshot,
+    the second one loads it """
+
+    from parameters import all_parameters
+    from vertices import all_vertices
+    expected = '%d %d %d %d' % (len(all_parameters), len(evaluator.couplings),
+                                len(all_vertices), len(all_vertices))
+    model_dir = os.path.dirname(os.path.abspath(__file__))
+    cases = [(model_dir, 'import snapshot', ''),
+             (os.path.dirname(model_dir), 'from %s import snapshot' %
+                     os.path.basename(model_dir), os.path.basename(model_dir) + '.')]
+    for path, imports, prefix in cases:
+        script = snapshot_script % {'path': path, 'imports': imports, 'prefix': prefix}
+        for _ in range(2):
+            output = subprocess.check_output([sys.executable, '-c', script],
+                                             cwd=os.path.dirname(path))
+            if output.decode().strip() != expected:
+                raise AssertionError('%s: parameters, couplings, vertices %s instead of %s'
+                                     % (imports, output.decode().strip(), expected))
+    return 'parameters, couplings, vertices: %s' % expected
+
+reweight_card = """launch --rwgt_name=ctg_1
+set ctG 1.0
+launch --rwgt_name=ctg_m2
+set ctG -2.0
+"""
+
+def lhe_event(initial, momenta, alpha_s, weight, reweights):
+    """ text of a 2 -> t t~ event """
+
+    lines = [' 4      1 %+13.7e %14.8e %14.8e %14.8e' % (weight, 500., 7.546771e-03, alpha_s)]
+    for code, status, p in zip(list(initial) + [6, -6], [-1, -1, 1, 1], momenta):
+        mass = numpy.sqrt(max(p[0] ** 2 - (p[1:] ** 2).sum(), 0.))
+        lines.append('%9d %2d %4d %4d %4d %4d %+.10e %+.10e %+.10e %.10e %.10e %.4e %.4e' % (
+                     code, status, 0 if status < 0 else 1, 0 if status < 0 else 2, 0, 0,
+                     p[1], p[2], p[3], p[0], mass, 0., 0.))
+    lines.append('<rwgt>')
+    lines.extend("<wgt id='%s'> %+.10e </wgt>" % item for item in reweights)
+    lines.append('</rwgt>')
+    return '<event>\n' + ''.join(line + '\n' for line in lines) + '</event>\n'
+
+def check_reweighting(evaluator):
+    """ the reweights are the ratios of |M|^2 at MT = 172.5, with the
+    initial partons in both orders """
+
+    from card_commands import CommandInterpreter
+    from widths import DecayWidths
+    from write_param_card import CardTemplate
+    mass = 172.5
+    point = evaluator.points(1, MT=mass)[0]
+    width = DecayWidths('t', evaluator=evaluator)(point)[0]
+    card = CardTemplate(['MT', 'WT']).format([mass, width])
+    directory = tempfile.mkdtemp()
+    try:
+        interpreter = CommandInterpreter(evaluator.points(1, MT=mass, WT=width)[0], evaluator)
+        names, points = interpreter.run(reweight_card.splitlines())
+        events = []
+        for i, initial in enumerate([(21, 21), (2, -2), (-2, 2)]):
+            me = MatrixElement(initial, [6, -6], excluded=sm_excluded,
+                               max_orders={'DIM6': 1}, evaluator=evaluator,
+                               point=interpreter.base)
+            momenta = random_momenta(10, 800. + 100 * i, mass, seed=i)
+            alpha_s = numpy.linspace(0.1, 0.12, len(momenta))
+            values = []
+            for p in [interpreter.base] + list(points):
+                p = numpy.tile(p, (len(momenta), 1))
+                p[:, evaluator.index('aS')] = alpha_s
+                values.append(me(momenta, coupling_values(evaluator, p)))
+            for j, event in enumerate(momenta):
+                weight = (-1) ** j * 0.25
+                events.append(lhe_event(initial, event, alpha_s[j], weight,
+                              [(name, weight * v[j] / values[0][j])
+                               for name, v in zip(names, values[1:])]))
+        filename = os.path.join(directory, 'events.lhe')
+        with open(filename, 'w') as fsock:
+            fsock.write('<LesHouchesEvents version="3.0">\n<header>\n<slha>\n%s</slha>\n'
+                        '</header>\n<init>\n</init>\n%s</LesHouchesEvents>\n' %
+                        (card, ''.join(events)))
+        card_name = os.path.join(directory, 'reweight_card.dat')
+        with open(card_name, 'w') as fsock:
+            fsock.write(reweight_card)
+        differences = compare_to_lhe(filename, card_name, excluded=sm_excluded, batch=7)
+        if sorted(differences) != sorted(names) or \
+                    set(len(d) for d in differences.values()) != set([len(events)]):
+            raise AssertionError('differences %s' % differences)
+        difference = max(abs(d).max() for d in differences.values())
+        if not difference <= 1e-8:
+            raise AssertionError('reweights: relative difference %.3g' % difference)
+        other = os.path.join(directory, 'param_card.dat')
+        with open(other, 'w') as fsock:
+            fsock.write(CardTemplate(['MT']).format([172.]))
+        shifted = compare_to_lhe(filename, card_name, other, excluded=sm_excluded)
+        if not max(abs(d).max() for d in shifted.values()) > 1e-6:
+            raise AssertionError('the reweights do not depend on MT')
+    finally:
+        shutil.rmtree(directory)
+    return '%d events, relative difference %.3g' % (len(events), difference)
+
+checks = [('cse', check_cse), ('batch', check_batch), ('qqbar', check_qqbar),
+          ('gg', check_gg), ('gauge', check_gauge), ('reversal', check_reversal),
+          ('quadratic', check_quadratic), ('widths', check_widths),
+          ('snapshot', check_snapshot), ('reweighting', check_reweighting)]
+
+
+if '__main__' == __name__:
+    names = sys.argv[1:] or [name for name, _ in checks]
+    unknown = set(names) - set(name for name, _ in checks)
+    if unknown:
+        sys.exit(__doc__)
+    evaluator = BatchEvaluator()
+    failed = 0
+    for name, check in checks:
+        if name not in names:
+            continue
+        start = time.time()
+        try:
+            result = check(evaluator)
+        except Exception as error:
+            failed += 1
+            print('%-10s FAILED: %s: %s' % (name, error.__class__.__name__, error))
+        else:
+            print('%-10s ok (%s, %.1f s)' % (name, result, time.time() - start))
+    sys.exit(1 if failed else 0)
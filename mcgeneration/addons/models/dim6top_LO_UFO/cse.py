@@ -0,0 +1,342 @@
+""" Common-subexpression elimination over the parameter and coupling
+expressions.
+
+The couplings repeat the same subterms over and over (ee*complex(0,1),
+cmath.sqrt(2), cw/sw, ...). eliminate() parses all the expressions, finds
+the subtrees appearing more than once and computes each of them once in a
+temporary variable. Only identical subtrees are shared: the expressions are
+not reordered or simplified, such that the result is bit-for-bit identical
+to the evaluation of the original strings.
+
+The optimized evaluation is written as a python module with a scalar
+function (one point, python complex numbers) and a NumPy function (same
+interface as the BatchEvaluator):
+
+    import cse
+    fast = cse.load()
+    internal, couplings = fast.evaluate([p.value for p in external])
+
+    python cse.py [--check] [FILENAME]
+"""
+
+import ast
+import hashlib
+import imp
+import os
+import re
+import sys
+import time
+
+model_dir = os.path.dirname(os.path.abspath(__file__))
+default_filename = os.path.join(model_dir, 'optimized_couplings.py')
+
+# prefix of the temporary variables
+temporary_prefix = '_cse'
+
+_binary_operators = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+                     ast.Pow: '**', ast.Mod: '%', ast.FloorDiv: '//'}
+_unary_operators = {ast.USub: '-', ast.UAdd: '+'}
+
+class UnsupportedExpression(Exception):
+    """Raised for expressions using python constructs not handled here; those
+    expressions are kept unchanged."""
+    pass
+
+def _is_shareable(node):
+    if isinstance(node, ast.UnaryOp):
+        return not isinstance(node.operand, ast.Num)
+    return isinstance(node, (ast.BinOp, ast.Call, ast.Attribute))
+
+def _children(node):
+    if isinstance(node, ast.BinOp):
+        return [node.left, node.right]
+    elif isinstance(node, ast.UnaryOp):
+        return [node.operand]
+    elif isinstance(node, ast.Call):
+        if node.keywords or getattr(node, 'starargs', None) or \
+                                           getattr(node, 'kwargs', None):
+            raise UnsupportedExpression(ast.dump(node))
+        return [node.func] + node.args
+    elif isinstance(node, ast.Attribute):
+        return [node.value]
+    elif isinstance(node, (ast.Name, ast.Num)):
+        return []
+    raise UnsupportedExpression(ast.dump(node))
+
+def _render(node, children):
+    """ source of node, given the source of its children (fully
+    parenthesized, such that the evaluation order is the one of the tree) """
+
+    if isinstance(node, ast.BinOp):
+        return '(%s%s%s)' % (children[0], _binary_operators[type(node.op)],
+                                                                   children[1])
+    elif isinstance(node, ast.UnaryOp):
+        return '(%s%s)' % (_unary_operators[type(node.op)], children[0])
+    elif isinstance(node, ast.Call):
+        return '%s(%s)' % (children[0], ', '.join(children[1:]))
+    elif isinstance(node, ast.Attribute):
+        return '%s.%s' % (children[0], node.attr)
+    elif isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Num):
+        text = repr(node.n)
+        return '(%s)' % text if text.startswith('-') else text
+    raise UnsupportedExpression(ast.dump(node))
+
+def _count(trees, shared):
+    """ number of evaluations of each shareable subtree, when the subtrees in
+    shared are only evaluated once """
+
+    counts = {}
+    seen = set()
+    def visit(node):
+        key = ast.dump(node)
+        if _is_shareable(node):
+            counts[key] = counts.get(key, 0) + 1
+            if key in shared:
+                if key in seen:
+                    return
+                seen.add(key)
+        for child in _children(node):
+            visit(child)
+    for tree in trees:
+        visit(tree)
+    return counts
+
+def shared_subexpressions(trees):
+    """ keys (ast.dump) of the subtrees evaluated more than once. A subtree
+    only appearing inside a single shared subtree is not shared itself."""
+
+    shared = set()
+    while True:
+        counts = _count(trees, shared)
+        new = set(key for key, n in counts.items() if n > 1)
+        if new == shared:
+            return shared
+        shared = new
+
+def eliminate(assignments):
+    """ assignments is the list of (target, expression) in evaluation order.
+    Return the list of (target, source) where the shared subexpressions are
+    assigned to temporary variables before their first use."""
+
+    trees = []
+    for target, expression in assignments:
+        tree = ast.parse(expression.strip(), mode='eval').body
+        try:
+            _count([tree], set())
+        except UnsupportedExpression:
+            tree = None
+        trees.append(tree)
+    shared = shared_subexpressions([tree for tree in trees if tree is not None])
+
+    out = []
+    temporaries = {}
+    def build(node):
+        code = _render(node, [build(child) for child in _children(node)])
+        key = ast.dump(node) if _is_shareable(node) else None
+        if key not in shared:
+            return code
+        if key not in temporaries:
+            temporaries[key] = '%s%d' % (temporary_prefix, len(temporaries))
+            out.append((temporaries[key], code))
+        return temporaries[key]
+
+    for (target, expression), tree in zip(assignments, trees):
+        if tree is None:
+            out.append((target, expression.strip()))
+        else:
+            out.append((target, build(tree)))
+    return out
+
+
+def expressions_key(external, internal, couplings):
+    """ hash of the expressions, stored in the generated module """
+
+    key = hashlib.sha1()
+    for param in external:
+        key.update(('%s;' % param.name).encode())
+    for obj in list(internal) + list(couplings):
+        key.update(('%s=%s;' % (obj.name, obj.value)).encode())
+    return key.hexdigest()
+
+def scalar_source(external, internal, couplings):
+    """ code of evaluate(values): values is the sequence of the external
+    parameters, return the lists of internal parameters and couplings """
+
+    lines = ['def evaluate(values):']
+    for i, param in enumerate(external):
+        lines.append('    %s = values[%d]' % (param.name, i))
+    assignments = [(p.name, p.value) for p in internal] + \
+                  [('_gc%d' % i, c.value) for i, c in enumerate(couplings)]
+    for target, code in eliminate(assignments):
+        lines.append('    %s = %s' % (target, code))
+    lines.append('    return [%s], [%s]' % (', '.join(p.name for p in internal),
+                    ', '.join('_gc%d' % i for i in range(len(couplings)))))
+    return '\n'.join(lines) + '\n'
+
+def array_source(external, internal, couplings):
+    """ code of evaluate(values, out, internal) on (N, nexternal) arrays, as
+    used by the BatchEvaluator """
+
+    lines = ['def evaluate(values, out, internal):']
+    for i, param in enumerate(external):
+        lines.append('    %s = values[:, %d]' % (param.name, i))
+    assignments = [(p.name, p.value) for p in internal] + \
+                  [('out[:, %d]' % i, c.value) for i, c in enumerate(couplings)]
+    optimized = eliminate(assignments)
+    # the internal parameters must be stored before the first coupling
+    first = [target for target, code in optimized].index('out[:, 0]') \
+                                           if couplings else len(optimized)
+    for target, code in optimized[:first]:
+        lines.append('    %s = %s' % (target, code))
+    lines.append('    if internal is not None:')
+    for i, param in enumerate(internal):
+        lines.append('        internal[:, %d] = %s' % (i, param.name))
+    for target, code in optimized[first:]:
+        lines.append('    %s = %s' % (target, code))
+    lines.append('    return out')
+    return '\n'.join(lines) + '\n'
+
+def _indent(code, spaces):
+    return ''.join(' ' * spaces + line if line.strip() else line
+                                   for line in code.splitlines(True))
+
+def module_source(list_of_parameters=None, list_of_couplings=None):
+    """ code of the optimized evaluation module """
+
+    if list_of_parameters is None:
+        from parameters import all_parameters
+        list_of_parameters = all_parameters
+    if list_of_couplings is None:
+        from couplings import all_couplings
+        list_of_couplings = all_couplings
+    import function_library
+
+    external = [p for p in list_of_parameters if p.nature == 'external']
+    internal = [p for p in list_of_parameters if p.nature != 'external']
+    couplings = list(list_of_couplings)
+    functions = sorted(f.name for f in function_library.all_functions)
+
+    text = ['# This file was automatically created by cse.py from parameters.py',
+            '# and couplings.py. Do not edit: it is rewritten when they change.',
+            '',
+            'import cmath',
+            'from function_library import %s' % ', '.join(functions),
+            '',
+            'source_key = %r' % expressions_key(external, internal, couplings),
+            'external_names = %r' % [p.name for p in external],
+            'internal_names = %r' % [p.name for p in internal],
+            'coupling_names = %r' % [c.name for c in couplings],
+            '', '',
+            scalar_source(external, internal, couplings),
+            '',
+            'def array_function():',
+            '    """ evaluate(values, out, internal) on NumPy arrays """',
+            '    from evaluator import array_namespace',
+            '    namespace = array_namespace()']
+    for name in ['cmath', 'complex'] + functions:
+        text.append('    %s = namespace[%r]' % (name, name))
+    text.append('')
+    text.append(_indent(array_source(external, internal, couplings), 4))
+    text.append('    return evaluate')
+    return '\n'.join(text) + '\n'
+
+def write_module(filename=default_filename, list_of_parameters=None,
+                                                       list_of_couplings=None):
+    source = module_source(list_of_parameters, list_of_couplings)
+    tmp_name = '%s.%d.tmp' % (filename, os.getpid())
+    with open(tmp_name, 'w') as fsock:
+        fsock.write(source)
+    os.rename(tmp_name, filename)
+    return source
+
+def load(filename=default_filename, list_of_parameters=None,
+                                                     list_of_couplings=None):
+    """ return the optimized module, (re)writing it if it does not match the
+    current expressions. If it cannot be written, it is only built in
+    memory."""
+
+    if list_of_parameters is None:
+        from parameters import all_parameters
+        list_of_parameters = all_parameters
+    if list_of_couplings is None:
+        from couplings import all_couplings
+        list_of_couplings = all_couplings
+    key = expressions_key([p for p in list_of_parameters if p.nature == 'external'],
+                          [p for p in list_of_parameters if p.nature != 'external'],
+                          list_of_couplings)
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    if os.path.exists(filename):
+        module = imp.load_source(name, filename)
+        if module.source_key == key:
+            return module
+    try:
+        source = write_module(filename, list_of_parameters, list_of_couplings)
+    except (IOError, OSError):
+        source = module_source(list_of_parameters, list_of_couplings)
+    else:
+        return imp.load_source(name, filename)
+    module = imp.new_module(name)
+    module.__file__ = filename
+    exec(compile(source, filename, 'exec'), module.__dict__)
+    return module
+
+
+def check(module, npoints=20, seed=4321):
+    """ compare the optimized module bit-for-bit to the evaluation of the
+    strings, at random points of the Wilson coefficients. Return the
+    timings of both scalar and array versions."""
+
+    import numpy
+    from evaluator import BatchEvaluator, is_wilson_coefficient, scalar_evaluation
+
+    reference = BatchEvaluator(optimize=False)
+    random = numpy.random.RandomState(seed)
+    points = reference.points(npoints)
+    for param in reference.external:
+        if is_wilson_coefficient(param):
+            points[:, reference.index(param.name)] = random.uniform(-3., 3., npoints)
+
+    start = time.time()
+    expected = scalar_evaluation(points)
+    string_time = time.time() - start
+    start = time.time()
+    values = numpy.array([module.evaluate([float(x) for x in row])[1] for row in points])
+    scalar_time = time.time() - start
+    if values.tobytes() != expected.tobytes():
+        raise AssertionError('scalar evaluation differs from the string evaluation')
+
+    array_function = module.array_function()
+    points = numpy.repeat(points, 5000, axis=0)
+    expected = numpy.empty((len(points), len(reference.couplings)), dtype=complex)
+    start = time.time()
+    reference._evaluate(points, expected, None)
+    reference_time = time.time() - start
+    values = numpy.empty_like(expected)
+    start = time.time()
+    array_function(points, values, None)
+    array_time = time.time() - start
+    if values.tobytes() != expected.tobytes():
+        raise AssertionError('array evaluation differs from the unoptimized one')
+
+    return {'string': string_time / npoints, 'scalar': scalar_time / npoints,
+            'array reference': reference_time, 'array': array_time,
+            'array points': len(points)}
+
+
+if '__main__' == __name__:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    filename = args[0] if args else default_filename
+    source = write_module(filename)
+    print('%s: %d shared subexpressions' % (filename, len(re.findall(
+                            r'^    %s\d+ = ' % temporary_prefix, source, re.M))))
+    if '--check' in sys.argv:
+        timing = check(load(filename))
+        print('bit-for-bit identical to the string evaluation')
+        print('one point: %.3g ms with eval, %.3g ms optimized' %
+                               (1e3 * timing['string'], 1e3 * timing['scalar']))
+        print('%d points: %.3g ms unoptimized, %.3g ms optimized' % (
+               timing['array points'], 1e3 * timing['array reference'],
+               1e3 * timing['array']))
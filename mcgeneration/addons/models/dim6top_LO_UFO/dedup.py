@@ -0,0 +1,258 @@
+""" Deduplication of the couplings and Lorentz structures of the model.
+
+Lorentz structures are compared on a canonical form: the structure is
+expanded in a sum of products of tensors, the summed (negative) indices of
+each product are relabelled in a canonical way, the symmetric Metric
+arguments are sorted and the terms are sorted. Two structures with the same
+spins and canonical form are identical (e.g. FFV3 and FFV6).
+
+Couplings are compared numerically at random points of all the external
+parameters. Identical couplings (with the same orders) are merged.
+Couplings only proportional to each other are reported but kept: a vertex
+can not carry the constant factor.
+
+The vertices are rewritten to point to the first structure/coupling of
+each group, and the unused ones are removed:
+
+    python dedup.py OUTPUT_DIR
+"""
+
+import ast
+import itertools
+import os
+import sys
+
+import numpy
+
+import model_writer
+from evaluator import BatchEvaluator, is_wilson_coefficient
+
+model_dir = os.path.dirname(os.path.abspath(__file__))
+
+# tensors symmetric in their arguments
+symmetric_tensors = ['Metric']
+
+class UnsupportedStructure(Exception):
+    """Raised for Lorentz structures which can not be expanded; they are
+    never merged."""
+    pass
+
+def _constant(node):
+    """ value of a numerical node, None if not numerical """
+    try:
+        return complex(eval(compile(ast.Expression(node), '<lorentz>', 'eval'),
+                            {'__builtins__': {}, 'complex': complex}))
+    except Exception:
+        return None
+
+def expand(structure):
+    """ the structure as a dictionary: product (tuple of (tensor, indices))
+    -> coefficient """
+
+    def visit(node):
+        value = _constant(node)
+        if value is not None:
+            return {(): value}
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            indices = tuple(int(_constant(arg).real) for arg in node.args)
+            return {((node.func.id, indices),): 1.}
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return dict((term, -coef) for term, coef in visit(node.operand).items())
+        if isinstance(node, ast.BinOp):
+            left = visit(node.left)
+            if isinstance(node.op, (ast.Add, ast.Sub)):
+                sign = 1 if isinstance(node.op, ast.Add) else -1
+                out = dict(left)
+                for term, coef in visit(node.right).items():
+                    out[term] = out.get(term, 0) + sign * coef
+                return out
+            elif isinstance(node.op, ast.Mult):
+                right = visit(node.right)
+                return dict((lt + rt, lc * rc) for lt, lc in left.items()
+                                               for rt, rc in right.items())
+            elif isinstance(node.op, ast.Div):
+                value = _constant(node.right)
+                if value is not None:
+                    return dict((term, coef / value) for term, coef in left.items())
+            elif isinstance(node.op, ast.Pow):
+                value = _constant(node.right)
+                if value is not None and value.imag == 0 and value.real == int(value.real) > 0:
+                    out = left
+                    for _ in range(int(value.real) - 1):
+                        out = dict((lt + rt, lc * rc) for lt, lc in out.items()
+                                                      for rt, rc in left.items())
+                    return out
+        raise UnsupportedStructure(structure)
+
+    return visit(ast.parse(structure.strip(), mode='eval').body)
+
+def canonical_term(term):
+    """ the product with the summed indices relabelled such that the
+    sorted list of its tensors is minimal """
+
+    dummies = sorted(set(i for name, indices in term for i in indices if i < 0))
+    best = None
+    for permutation in itertools.permutations(range(1, len(dummies) + 1)):
+        relabel = dict((d, -p) for d, p in zip(dummies, permutation))
+        factors = []
+        for name, indices in term:
+            indices = tuple(relabel.get(i, i) for i in indices)
+            if name in symmetric_tensors:
+                indices = tuple(sorted(indices))
+            factors.append((name, indices))
+        factors = tuple(sorted(factors))
+        if best is None or factors < best:
+            best = factors
+    return best
+
+def canonical_structure(lorentz, digits=12):
+    """ hashable canonical form of a Lorentz object, None if the structure
+    can not be expanded """
+
+    try:
+        terms = expand(lorentz.structure)
+    except (UnsupportedStructure, SyntaxError, TypeError, ValueError):
+        return None
+    out = {}
+    for term, coef in terms.items():
+        term = canonical_term(term)
+        out[term] = out.get(term, 0) + coef
+    return (tuple(lorentz.spins), tuple(sorted(
+        (term, round(coef.real, digits), round(coef.imag, digits))
+        for term, coef in out.items() if abs(coef) > 10**-digits)))
+
+def lorentz_groups(list_of_lorentz):
+    """ lists of identical Lorentz structures (groups of one included) """
+
+    groups = {}
+    out = []
+    for lorentz in list_of_lorentz:
+        key = canonical_structure(lorentz)
+        if key is None:
+            out.append([lorentz])
+        elif key in groups:
+            groups[key].append(lorentz)
+        else:
+            groups[key] = [lorentz]
+            out.append(groups[key])
+    return out
+
+def coupling_groups(list_of_couplings, evaluator=None, npoints=3, seed=2468,
+                                                               rtol=1e-12):
+    """ lists of identical couplings and lists of proportional couplings
+    (groups of one included), as two lists of [(ratio, coupling), ...] """
+
+    if evaluator is None:
+        evaluator = BatchEvaluator(list_of_couplings=list_of_couplings)
+    random = numpy.random.RandomState(seed)
+    points = evaluator.points(npoints)
+    points *= random.uniform(0.8, 1.2, size=points.shape)
+    for param in evaluator.external:
+        if is_wilson_coefficient(param):
+            points[:, evaluator.index(param.name)] = random.uniform(-2., 2., npoints)
+    values = evaluator.evaluate(points).T
+
+    identical, proportional = [], []
+    for coup, value in zip(evaluator.couplings, values):
+        order = sorted(coup.order.items())
+        scale = abs(value).max()
+        for group in proportional:
+            first, reference = group[0][1], group[0][2]
+            if sorted(first.order.items()) != order or scale == 0:
+                continue
+            ratio = value[0] / reference[0]
+            if numpy.allclose(value, ratio * reference, rtol=rtol, atol=0):
+                group.append((ratio, coup, value))
+                break
+        else:
+            proportional.append([(1., coup, value)])
+    for group in proportional:
+        same = {}
+        for ratio, coup, value in group:
+            for key in same:
+                if abs(ratio - key) <= rtol * abs(key):
+                    same[key].append(coup)
+                    break
+            else:
+                same[ratio] = [coup]
+        identical.extend(same.values())
+    proportional = [[(ratio, coup) for ratio, coup, value in group]
+                                                for group in proportional]
+    return identical, proportional
+
+def rewrite_vertices(vertices, lorentz_map, coupling_map):
+    """ vertices with the Lorentz structures and couplings replaced by their
+    representative. Identical structures of a vertex are merged when no two
+    couplings end up at the same (color, Lorentz) position. """
+
+    out = []
+    for vertex in vertices:
+        lorentz = [lorentz_map.get(l.name, l) for l in vertex.lorentz]
+        couplings = dict((key, coupling_map.get(c.name, c))
+                                             for key, c in vertex.couplings.items())
+        unique = []
+        for l in lorentz:
+            if l not in unique:
+                unique.append(l)
+        moved = dict(((c, unique.index(lorentz[l])), coup)
+                                             for (c, l), coup in couplings.items())
+        if len(moved) == len(couplings):
+            lorentz, couplings = unique, moved
+        out.append(model_writer.VertexRecord(vertex.name, vertex.particles,
+                                             vertex.color, lorentz, couplings))
+    return out
+
+def deduplicate(output_dir, list_of_lorentz=None, list_of_couplings=None,
+                                                         list_of_vertices=None):
+    """ write the deduplicated copy of the model in output_dir, return the
+    dictionary of the counts """
+
+    if list_of_lorentz is None:
+        from lorentz import all_lorentz as list_of_lorentz
+    if list_of_couplings is None:
+        from couplings import all_couplings as list_of_couplings
+    if list_of_vertices is None:
+        from vertices import all_vertices as list_of_vertices
+
+    lorentz_map = {}
+    for group in lorentz_groups(list_of_lorentz):
+        for lorentz in group[1:]:
+            lorentz_map[lorentz.name] = group[0]
+    coupling_map = {}
+    identical, proportional = coupling_groups(list_of_couplings)
+    for group in identical:
+        for coup in group[1:]:
+            coupling_map[coup.name] = group[0]
+
+    vertices = rewrite_vertices(list_of_vertices, lorentz_map, coupling_map)
+    used_lorentz = set(l.name for v in vertices for l in v.lorentz)
+    used_couplings = set(c.name for v in vertices for c in v.couplings.values())
+    lorentz = [l for l in list_of_lorentz if l.name in used_lorentz]
+    couplings = [c for c in list_of_couplings if c.name in used_couplings]
+
+    model_writer.copy_model(model_dir, output_dir)
+    model_writer.write_lorentz(output_dir, lorentz)
+    model_writer.write_couplings(output_dir, couplings)
+    model_writer.write_vertices(output_dir, vertices)
+
+    return {'lorentz': len(lorentz),
+            'removed lorentz': len(list_of_lorentz) - len(lorentz),
+            'couplings': len(couplings),
+            'removed couplings': len(list_of_couplings) - len(couplings),
+            'proportional couplings': sum(len(g) - 1 for g in proportional),
+            'merged lorentz': sorted('%s -> %s' % (name, l.name)
+                                         for name, l in lorentz_map.items()),
+            'merged couplings': sorted('%s -> %s' % (name, c.name)
+                                         for name, c in coupling_map.items())}
+
+
+if '__main__' == __name__:
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    summary = deduplicate(sys.argv[1])
+    for line in summary['merged lorentz'] + summary['merged couplings']:
+        print(line)
+    print('%s: %d Lorentz structures (%d removed), %d couplings (%d removed, '
+          '%d only proportional to another one)' % (sys.argv[1], summary['lorentz'],
+          summary['removed lorentz'], summary['couplings'],
+          summary['removed couplings'], summary['proportional couplings']))
@@ -0,0 +1,194 @@
+""" Dependency graph of the parameters and couplings of the model.
+
+The internal parameters and the couplings are nodes of a directed acyclic
+graph whose edges follow the symbols used in their expressions, e.g.
+aEWM1 -> aEW -> MW -> sw2 -> sw -> ctA -> GC_xxx. When an external parameter
+is changed, only the nodes downstream of it are re-evaluated, and the
+propagation stops at the nodes whose value did not change.
+
+    graph = ParameterGraph()
+    graph.set('ctG', 1.)
+    graph.get_couplings()     # only the couplings depending on ctG are redone
+"""
+
+import ast
+import cmath
+import heapq
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+def expression_symbols(expr):
+    """ set of the names used in the python expression expr (string) """
+    tree = ast.parse(expr.strip(), mode='eval')
+    return set(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+
+
+class Node(object):
+    """ a parameter or a coupling of the graph """
+
+    __slots__ = ['name', 'kind', 'obj', 'code', 'parents', 'children', 'order']
+
+    def __init__(self, name, kind, obj, order):
+        self.name = name
+        self.kind = kind        # 'external', 'internal' or 'coupling'
+        self.obj = obj
+        self.order = order
+        self.code = None
+        self.parents = []
+        self.children = []
+
+    def __repr__(self):
+        return '<Node %s (%s)>' % (self.name, self.kind)
+
+
+class ParameterGraph(object):
+    """ incremental evaluation of the parameters and couplings """
+
+    def __init__(self, list_of_parameters=None, list_of_couplings=None):
+
+        if list_of_parameters is None:
+            from parameters import all_parameters
+            list_of_parameters = all_parameters
+        if list_of_couplings is None:
+            from couplings import all_couplings
+            list_of_couplings = all_couplings
+
+        import function_library
+        self.namespace = {'cmath': cmath}
+        self.namespace.update((f.name, f) for f in function_library.all_functions)
+
+        self.nodes = {}
+        items = [(p, 'external' if p.nature == 'external' else 'internal')
+                                                     for p in list_of_parameters]
+        items += [(c, 'coupling') for c in list_of_couplings]
+        for i, (obj, kind) in enumerate(items):
+            if obj.name in self.nodes:
+                raise Exception('"%s" is defined twice.' % obj.name)
+            self.nodes[obj.name] = Node(obj.name, kind, obj, i)
+
+        for node in self.nodes.values():
+            if node.kind == 'external':
+                continue
+            node.code = compile(node.obj.value, node.name, 'eval')
+            for name in sorted(expression_symbols(node.obj.value)):
+                if name in self.nodes:
+                    node.parents.append(self.nodes[name])
+                    self.nodes[name].children.append(node)
+                elif name not in self.namespace and not hasattr(builtins, name):
+                    raise Exception('Unknown symbol "%s" in %s.' % (name, node.name))
+
+        self.order = self.topological_order()
+        for i, node in enumerate(self.order):
+            node.order = i
+
+        self.nevaluated = 0
+        self._dirty = []
+        self._queued = set()
+        for node in self.order:
+            if node.kind == 'external':
+                self.namespace[node.name] = node.obj.value
+            else:
+                self._evaluate(node)
+
+    def topological_order(self):
+        """ nodes sorted such that each node comes after its parents. Ties are
+        broken by the order of definition in the model."""
+
+        missing = dict((node.name, len(node.parents)) for node in self.nodes.values())
+        ready = [(self.nodes[n].order, n) for n, count in missing.items()
+                                                                  if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            node = self.nodes[heapq.heappop(ready)[1]]
+            order.append(node)
+            for child in node.children:
+                missing[child.name] -= 1
+                if missing[child.name] == 0:
+                    heapq.heappush(ready, (child.order, child.name))
+        if len(order) != len(self.nodes):
+            raise Exception('Circular dependency between %s' % ', '.join(
+                        sorted(n for n, count in missing.items() if count)))
+        return order
+
+    def _evaluate(self, node):
+        value = eval(node.code, self.namespace)
+        self.nevaluated += 1
+        changed = node.name not in self.namespace or \
+                                               self.namespace[node.name] != value
+        self.namespace[node.name] = value
+        return changed
+
+    def _mark_children(self, node):
+        for child in node.children:
+            if child.name not in self._queued:
+                self._queued.add(child.name)
+                heapq.heappush(self._dirty, (child.order, child.name))
+
+    def set(self, name, value):
+        """ change the value of the external parameter name """
+
+        node = self.nodes[name]
+        if node.kind != 'external':
+            raise Exception('"%s" is not an external parameter.' % name)
+        if self.namespace[name] == value:
+            return
+        self.namespace[name] = value
+        self._mark_children(node)
+
+    def update(self, **values):
+        for name, value in values.items():
+            self.set(name, value)
+
+    def is_dirty(self):
+        return bool(self._dirty)
+
+    def refresh(self):
+        """ re-evaluate the nodes affected by the changes since the last call.
+        Return the number of evaluated nodes."""
+
+        start = self.nevaluated
+        while self._dirty:
+            name = heapq.heappop(self._dirty)[1]
+            self._queued.discard(name)
+            node = self.nodes[name]
+            if self._evaluate(node):
+                self._mark_children(node)
+        return self.nevaluated - start
+
+    def get(self, name):
+        """ current value of the parameter or coupling name """
+        if self._dirty:
+            self.refresh()
+        return self.namespace[name]
+
+    def get_couplings(self):
+        """ dictionary name -> value of all couplings """
+        if self._dirty:
+            self.refresh()
+        return dict((n.name, self.namespace[n.name]) for n in self.order
+                                                     if n.kind == 'coupling')
+
+    def descendants(self, name):
+        """ all nodes depending (directly or not) on name, in evaluation order """
+        seen = set()
+        stack = [self.nodes[name]]
+        while stack:
+            for child in stack.pop().children:
+                if child.name not in seen:
+                    seen.add(child.name)
+                    stack.append(child)
+        return [n for n in self.order if n.name in seen]
+
+    def ancestors(self, name):
+        """ all nodes name depends on, in evaluation order """
+        seen = set()
+        stack = [self.nodes[name]]
+        while stack:
+            for parent in stack.pop().parents:
+                if parent.name not in seen:
+                    seen.add(parent.name)
+                    stack.append(parent)
+        return [n for n in self.order if n.name in seen]
@@ -0,0 +1,171 @@
+""" Vectorized evaluation of the internal parameters and couplings.
+
+The internal parameters and the couplings of the UFO are python expressions
+stored as strings. Instead of exec'ing them once per phase-space or
+parameter-space point, the BatchEvaluator translates all of them once into a
+single python function acting on NumPy arrays: one row per point, one column
+per external parameter.
+
+    from evaluator import BatchEvaluator
+    ev = BatchEvaluator()
+    points = ev.points(1000, ctG=numpy.linspace(-2, 2, 1000))
+    gc = ev.evaluate(points)     # shape (1000, len(all_couplings))
+"""
+
+import cmath
+import numpy
+
+from object_library import ArrayMath, array_complex
+import cse
+
+def is_wilson_coefficient(param):
+    """ True for the external dimension-six coefficients (not for Lambda) """
+    return param.nature == 'external' and param.lhablock == 'DIM6' and \
+                                                        param.name != 'Lambda'
+
+def array_namespace():
+    """ namespace in which the UFO expressions are evaluated on arrays """
+
+    import function_library
+    namespace = {'cmath': ArrayMath(), 'complex': array_complex}
+    namespace.update((f.name, f.array_function())
+                                         for f in function_library.all_functions)
+    return namespace
+
+
+class BatchEvaluator(object):
+    """Evaluate the internal parameters and the couplings of the model for
+    many points of the external parameters at once."""
+
+    def __init__(self, list_of_parameters=None, list_of_couplings=None,
+                                                              optimize=True):
+        """ By default, the parameters and couplings of the model are used.
+        Internal parameters must be given in the order of their definition
+        (as in parameters.py). With optimize, the common subexpressions are
+        only computed once (see cse.py)."""
+
+        if list_of_parameters is None:
+            from parameters import all_parameters
+            list_of_parameters = all_parameters
+        if list_of_couplings is None:
+            from couplings import all_couplings
+            list_of_couplings = all_couplings
+
+        self.external = [p for p in list_of_parameters if p.nature == 'external']
+        self.internal = [p for p in list_of_parameters if p.nature != 'external']
+        self.couplings = list(list_of_couplings)
+        self.optimize = optimize
+
+        self.external_names = [p.name for p in self.external]
+        self.internal_names = [p.name for p in self.internal]
+        self.coupling_names = [c.name for c in self.couplings]
+        self._external_index = dict((name, i) for i, name in
+                                               enumerate(self.external_names))
+
+        namespace = array_namespace()
+        exec(compile(self.get_source(), '<%s>' % self.__class__.__name__,
+                                                         'exec'), namespace)
+        self._evaluate = namespace['evaluate']
+
+    def get_source(self):
+        """ return the python code of the vectorized evaluation function """
+
+        if self.optimize:
+            return cse.array_source(self.external, self.internal, self.couplings)
+        lines = ['def evaluate(values, out, internal):']
+        for i, name in enumerate(self.external_names):
+            lines.append('    %s = values[:, %d]' % (name, i))
+        for param in self.internal:
+            lines.append('    %s = %s' % (param.name, param.value))
+        lines.append('    if internal is not None:')
+        for i, name in enumerate(self.internal_names):
+            lines.append('        internal[:, %d] = %s' % (i, name))
+        for i, coup in enumerate(self.couplings):
+            lines.append('    out[:, %d] = %s' % (i, coup.value))
+        lines.append('    return out')
+        return '\n'.join(lines) + '\n'
+
+    def index(self, name):
+        """ column of the external parameter name """
+        return self._external_index[name]
+
+    def default_values(self):
+        """ values of the external parameters written in parameters.py """
+        return numpy.array([complex(p.value).real for p in self.external])
+
+    def points(self, npoints=1, **values):
+        """ return a (npoints, nexternal) array filled with the default values
+        and where the columns named in values are replaced by the given
+        value(s)."""
+
+        out = numpy.tile(self.default_values(), (npoints, 1))
+        for name, value in values.items():
+            try:
+                out[:, self.index(name)] = value
+            except KeyError:
+                raise KeyError('"%s" is not an external parameter.' % name)
+        return out
+
+    def _check_values(self, values):
+        values = numpy.asarray(values, dtype=float)
+        single = (values.ndim == 1)
+        if single:
+            values = values[numpy.newaxis, :]
+        if values.ndim != 2 or values.shape[1] != len(self.external):
+            raise ValueError('Expected an array of shape (N, %d), got %s.' %
+                                          (len(self.external), values.shape))
+        return values, single
+
+    def evaluate(self, values, out=None):
+        """ return the (N, ncouplings) complex array of the coupling values
+        for the (N, nexternal) array of external parameter values.
+        A single point (1d array) returns a 1d array."""
+
+        values, single = self._check_values(values)
+        if out is None:
+            out = numpy.empty((values.shape[0], len(self.couplings)),
+                                                                 dtype=complex)
+        self._evaluate(values, out, None)
+        return out[0] if single else out
+
+    def evaluate_parameters(self, values):
+        """ return the (N, ninternal) complex array of the internal parameters
+        and the (N, ncouplings) complex array of the couplings."""
+
+        values, single = self._check_values(values)
+        internal = numpy.empty((values.shape[0], len(self.internal)),
+                                                                 dtype=complex)
+        out = numpy.empty((values.shape[0], len(self.couplings)), dtype=complex)
+        self._evaluate(values, out, internal)
+        if single:
+            return internal[0], out[0]
+        return internal, out
+
+
+def scalar_evaluation(values, list_of_parameters=None, list_of_couplings=None):
+    """ reference evaluation of the couplings, one point at a time, through
+    exec/eval of the UFO strings (as done in write_param_card.py)."""
+
+    if list_of_parameters is None:
+        from parameters import all_parameters
+        list_of_parameters = all_parameters
+    if list_of_couplings is None:
+        from couplings import all_couplings
+        list_of_couplings = all_couplings
+
+    import function_library
+    external = [p for p in list_of_parameters if p.nature == 'external']
+    internal = [p for p in list_of_parameters if p.nature != 'external']
+    codes = [(p.name, compile(p.value, p.name, 'eval')) for p in internal]
+    coup_codes = [compile(c.value, c.name, 'eval') for c in list_of_couplings]
+
+    values = numpy.atleast_2d(values)
+    out = numpy.empty((values.shape[0], len(coup_codes)), dtype=complex)
+    for i, row in enumerate(values):
+        namespace = {'cmath': cmath}
+        namespace.update((f.name, f) for f in function_library.all_functions)
+        namespace.update((p.name, float(v)) for p, v in zip(external, row))
+        for name, code in codes:
+            namespace[name] = eval(code, namespace)
+        out[i] = [eval(code, namespace) for code in coup_codes]
+    return out
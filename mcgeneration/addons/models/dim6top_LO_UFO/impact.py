@@ -0,0 +1,232 @@
+""" Impact of the Wilson coefficients on the parameters, couplings and
+vertices of the model.
+
+For each external DIM6 coefficient, the index lists the internal parameters
+(e.g. ctA from ctW and ctZ), the couplings and the vertices it reaches
+through the expressions of the model. A coefficient reaching none of the
+vertices allowed in a process can not change it:
+
+    from impact import ImpactIndex
+    index = ImpactIndex()
+    index.vertices('ctG')                  # V_xx with t t~ g, g g t t~, ...
+    index.coefficients_for_vertex('t', 't~', 'g')
+
+    python impact.py [--proc_card=FILE] [ctG ctW ...]
+
+With a proc_card, the particles excluded with '/' (and their antiparticles,
+as in MadGraph) and the coupling order limits (e.g. DIM6=1) of the core
+process are applied to the vertices.
+"""
+
+import re
+import sys
+
+from dependency import ParameterGraph
+from evaluator import is_wilson_coefficient
+
+class ImpactIndex(object):
+    """ Wilson coefficient -> internal parameters, couplings and vertices """
+
+    def __init__(self, list_of_parameters=None, list_of_couplings=None,
+                                                          list_of_vertices=None):
+
+        if list_of_vertices is None:
+            from vertices import all_vertices as list_of_vertices
+        graph = ParameterGraph(list_of_parameters, list_of_couplings)
+
+        self.all_vertices = list(list_of_vertices)
+        coupling_vertices = {}
+        for vertex in self.all_vertices:
+            for coup in vertex.couplings.values():
+                vertices = coupling_vertices.setdefault(coup.name, [])
+                if vertex not in vertices:
+                    vertices.append(vertex)
+
+        self.coefficients = [node.name for node in graph.order
+                             if node.kind == 'external' and is_wilson_coefficient(node.obj)]
+        self._parameters = {}
+        self._couplings = {}
+        self._vertices = {}
+        for name in self.coefficients:
+            nodes = graph.descendants(name)
+            self._parameters[name] = tuple(n.name for n in nodes if n.kind == 'internal')
+            self._couplings[name] = tuple(n.name for n in nodes if n.kind == 'coupling')
+            reached = set()
+            for coup in self._couplings[name]:
+                reached.update(v.name for v in coupling_vertices.get(coup, ()))
+            self._vertices[name] = tuple(v for v in self.all_vertices if v.name in reached)
+
+        self._lookup = None
+        self._by_coupling = {}
+        self._by_vertex = {}
+        for name in self.coefficients:
+            for coup in self._couplings[name]:
+                self._by_coupling.setdefault(coup, []).append(name)
+            for vertex in self._vertices[name]:
+                self._by_vertex.setdefault(vertex.name, []).append(name)
+
+    def _check(self, coefficient):
+        if coefficient not in self._couplings:
+            raise KeyError('"%s" is not a Wilson coefficient of the model.' % coefficient)
+
+    def parameters(self, coefficient):
+        """ names of the internal parameters depending on the coefficient """
+        self._check(coefficient)
+        return self._parameters[coefficient]
+
+    def couplings(self, coefficient):
+        """ names of the couplings depending on the coefficient """
+        self._check(coefficient)
+        return self._couplings[coefficient]
+
+    def vertices(self, coefficient):
+        """ vertices with at least one coupling depending on the coefficient """
+        self._check(coefficient)
+        return self._vertices[coefficient]
+
+    def coefficients_for_coupling(self, coupling):
+        """ coefficients the coupling (name or Coupling) depends on """
+        return tuple(self._by_coupling.get(getattr(coupling, 'name', coupling), ()))
+
+    def coefficients_for_vertex(self, *particles):
+        """ coefficients reaching a vertex, given as a Vertex or as its
+        particles (Particle objects, names or PDG codes) """
+
+        if len(particles) == 1 and hasattr(particles[0], 'couplings'):
+            vertices = particles
+        else:
+            if self._lookup is None:
+                from lookup import ModelIndex
+                self._lookup = ModelIndex(list_of_vertices=self.all_vertices)
+            vertices = self._lookup.vertices(*particles)
+        out = []
+        for vertex in vertices:
+            out.extend(c for c in self._by_vertex.get(vertex.name, ()) if c not in out)
+        return tuple(c for c in self.coefficients if c in out)
+
+    def _excluded_names(self, excluded):
+        """ lower case names of the excluded particles and of their
+        antiparticles """
+        if self._lookup is None:
+            from lookup import ModelIndex
+            self._lookup = ModelIndex(list_of_vertices=self.all_vertices)
+        by_name = dict((p.name.lower(), p) for p in self._lookup.particles)
+        names = set()
+        for name in excluded:
+            if name.lower() not in by_name:
+                raise KeyError('No particle named "%s" in the model.' % name)
+            particle = by_name[name.lower()]
+            names.update([particle.name.lower(), self._lookup.anti(particle).name.lower()])
+        return names
+
+    def allowed_vertices(self, coefficient, excluded=(), max_orders=None):
+        """ vertices reached by the coefficient without any of the excluded
+        particles (names, case insensitive, the antiparticles are excluded as
+        well as in MadGraph), through a coupling within max_orders """
+
+        excluded = self._excluded_names(excluded)
+        couplings = set(self._couplings[coefficient])
+        out = []
+        for vertex in self.vertices(coefficient):
+            if any(p.name.lower() in excluded for p in vertex.particles):
+                continue
+            if max_orders and not any(
+                   all(c.order.get(order, 0) <= limit for order, limit in max_orders.items())
+                   for c in vertex.couplings.values() if c.name in couplings):
+                continue
+            out.append(vertex)
+        return tuple(out)
+
+    def zero_coefficients(self, excluded=(), max_orders=None):
+        """ coefficients which reach no vertex once the excluded particles
+        and the couplings beyond max_orders are removed: they can not change
+        such a process """
+        return [c for c in self.coefficients
+                if not self.allowed_vertices(c, excluded, max_orders)]
+
+
+def core_processes(proc_card):
+    """ core processes (before the decays) of the generate/add process
+    lines of a proc_card.dat """
+
+    out = []
+    for line in open(proc_card):
+        line = line.split('#')[0].strip()
+        if re.match(r'(generate|add\s+process)\s', line):
+            out.append(line.split(',')[0])
+    return out
+
+def excluded_particles(proc_card):
+    """ particles excluded with '/' from the core process (before the
+    decays) of all the generate/add process lines of a proc_card.dat. The
+    decay chains are not considered. """
+
+    excluded = None
+    for core in core_processes(proc_card):
+        names = set()
+        if '/' in core:
+            for name in core.split('/', 1)[1].split():
+                if name.startswith('$') or '=' in name:
+                    break
+                names.add(name)
+        excluded = names if excluded is None else excluded & names
+    return excluded or set()
+
+def order_limits(proc_card):
+    """ coupling order limits (ORDER=N or ORDER<=N) of the core processes,
+    the loosest one over the generate/add process lines. Orders not limited
+    in every line are not limited. """
+
+    limits = None
+    for core in core_processes(proc_card):
+        line = dict((name.upper(), int(value)) for name, value in
+                    re.findall(r'(?:^|\s)(\w+)\s*<?=\s*(-?\d+)(?=\s|$)', core))
+        if limits is None:
+            limits = line
+        else:
+            limits = dict((name, max(limits[name], line[name]))
+                          for name in limits if name in line)
+    return limits or {}
+
+def report(index, coefficients=None, excluded=(), max_orders=None):
+    """ text summary of the impact of the coefficients """
+
+    lines = []
+    restricted = excluded or max_orders
+    for name in coefficients or index.coefficients:
+        vertices = index.allowed_vertices(name, excluded, max_orders)
+        lines.append('%s: %d internal parameters, %d couplings, %d vertices%s' % (
+            name, len(index.parameters(name)), len(index.couplings(name)),
+            len(vertices), ' (excluded: %d)' % (len(index.vertices(name)) - len(vertices))
+                                                                    if restricted else ''))
+        if index.parameters(name):
+            lines.append('    parameters: %s' % ' '.join(index.parameters(name)))
+        for vertex in vertices:
+            used = set(c.name for c in vertex.couplings.values())
+            lines.append('    %-6s %-20s %s' % (vertex.name,
+                ' '.join(p.name for p in vertex.particles),
+                ' '.join(c for c in index.couplings(name) if c in used)))
+    if restricted:
+        zero = set(index.zero_coefficients(excluded, max_orders))
+        zero = [c for c in (coefficients or index.coefficients) if c in zero]
+        conditions = []
+        if excluded:
+            conditions.append('excluding %s and antiparticles' % ' '.join(sorted(excluded)))
+        if max_orders:
+            conditions.append(' '.join('%s<=%d' % item for item in sorted(max_orders.items())))
+        lines.append('no vertex in the core process (%s): %s' % (
+                     ', '.join(conditions), ' '.join(zero) or 'none'))
+    return '\n'.join(lines)
+
+
+if '__main__' == __name__:
+    excluded = ()
+    max_orders = None
+    coefficients = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--proc_card='):
+            excluded = excluded_particles(arg.split('=', 1)[1])
+            max_orders = order_limits(arg.split('=', 1)[1])
+        else:
+            coefficients.append(arg)
+    print(report(ImpactIndex(), coefficients, excluded, max_orders))
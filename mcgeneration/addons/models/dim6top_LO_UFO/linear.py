@@ -0,0 +1,238 @@
+""" Linear decomposition of the couplings in the Wilson coefficients.
+
+Every coupling of the model is (at most) linear in the dimension-six Wilson
+coefficients c. For a fixed point of the other external parameters (SM
+inputs, masses, widths and Lambda) the couplings can therefore be written
+
+    GC = a + B.c
+
+with a constant vector a and a sparse matrix B. decompose() checks the
+linearity on the expressions, computes a and B and caches them on disk, such
+that the coupling values for any point of the Wilson coefficients cost one
+sparse matrix-vector product.
+
+    python linear.py [--cache=DIR] [MT=173.] [Lambda=1000.]
+"""
+
+import ast
+import hashlib
+import os
+import sys
+
+import numpy
+import scipy.sparse
+
+from dependency import expression_symbols
+from evaluator import BatchEvaluator, is_wilson_coefficient
+
+# names of the UFO functions which are linear for real arguments
+linear_functions = ['complexconjugate', 're', 'im']
+
+class NonLinearError(Exception):
+    """Raised when a coupling is not linear in the Wilson coefficients."""
+    pass
+
+def expression_degree(expr, degrees):
+    """ polynomial degree of the python expression expr (string) in the
+    symbols for which degrees gives a non-zero degree. Return None if the
+    expression is not a polynomial in those symbols."""
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        elif isinstance(node, ast.Name):
+            return degrees.get(node.id, 0)
+        elif isinstance(node, (ast.Num, ast.Str, ast.Attribute)):
+            return 0
+        elif isinstance(node, ast.UnaryOp):
+            return visit(node.operand)
+        elif isinstance(node, ast.BinOp):
+            left, right = visit(node.left), visit(node.right)
+            if left is None or right is None:
+                return None
+            if isinstance(node.op, (ast.Add, ast.Sub)):
+                return max(left, right)
+            elif isinstance(node.op, ast.Mult):
+                return left + right
+            elif isinstance(node.op, ast.Div):
+                return left if right == 0 else None
+            elif isinstance(node.op, ast.Pow):
+                if left == 0 and right == 0:
+                    return 0
+                if right == 0 and isinstance(node.right, ast.Num) and \
+                        node.right.n == int(node.right.n) and node.right.n >= 0:
+                    return left * int(node.right.n)
+            return None
+        elif isinstance(node, ast.Call):
+            args = [visit(arg) for arg in node.args]
+            if all(d == 0 for d in args):
+                return 0
+            if isinstance(node.func, ast.Name) and \
+                   node.func.id in linear_functions and len(args) == 1:
+                return args[0]
+            return None
+        else:
+            return None
+
+    return visit(ast.parse(expr.strip(), mode='eval'))
+
+def coefficient_dependencies(list_of_parameters, list_of_couplings):
+    """ return, for each coupling, the set of Wilson coefficients appearing in
+    its expression (directly or through internal parameters)."""
+
+    depends = dict((p.name, set([p.name])) for p in list_of_parameters
+                                                  if is_wilson_coefficient(p))
+    for param in list_of_parameters:
+        if param.nature == 'external':
+            continue
+        depends[param.name] = set()
+        for name in expression_symbols(param.value):
+            depends[param.name].update(depends.get(name, ()))
+
+    out = []
+    for coup in list_of_couplings:
+        deps = set()
+        for name in expression_symbols(coup.value):
+            deps.update(depends.get(name, ()))
+        out.append(deps)
+    return out
+
+
+class LinearCouplings(object):
+    """ couplings = a + B.c for a fixed point of the non-Wilson parameters """
+
+    def __init__(self, a, B, coefficients, couplings, sm_values=None):
+
+        self.a = numpy.asarray(a, dtype=complex)
+        self.B = scipy.sparse.csr_matrix(B, dtype=complex)
+        self.coefficients = list(coefficients)
+        self.couplings = list(couplings)
+        self.sm_values = dict(sm_values or {})
+
+    def __call__(self, c):
+        """ coupling values for the Wilson coefficients c, either a vector of
+        length ncoefficients or an (N, ncoefficients) array."""
+
+        c = numpy.asarray(c)
+        if c.ndim == 1:
+            return self.a + self.B.dot(c)
+        return self.a[numpy.newaxis, :] + self.B.dot(c.T).T
+
+    def coefficient_vector(self, **values):
+        """ vector of Wilson coefficients, zero if not specified """
+        c = numpy.zeros(len(self.coefficients))
+        for name, value in values.items():
+            c[self.coefficients.index(name)] = value
+        return c
+
+    def save(self, path):
+        B = self.B.tocsr()
+        sm_names = sorted(self.sm_values)
+        numpy.savez(path, a=self.a, data=B.data, indices=B.indices,
+                    indptr=B.indptr, shape=B.shape,
+                    coefficients=numpy.array(self.coefficients),
+                    couplings=numpy.array(self.couplings),
+                    sm_names=numpy.array(sm_names),
+                    sm_values=numpy.array([self.sm_values[n] for n in sm_names]))
+
+    @classmethod
+    def load(cls, path):
+        data = numpy.load(path)
+        B = scipy.sparse.csr_matrix((data['data'], data['indices'],
+                                        data['indptr']), shape=tuple(data['shape']))
+        sm_values = dict(zip([str(n) for n in data['sm_names']],
+                                                    data['sm_values']))
+        return cls(data['a'], B, [str(n) for n in data['coefficients']],
+                   [str(n) for n in data['couplings']], sm_values)
+
+
+def cache_key(evaluator, sm_values):
+    """ hash of the model expressions and of the fixed parameter values """
+
+    key = hashlib.sha1()
+    for param in evaluator.external:
+        key.update(('%s:%s;' % (param.name, param.lhablock)).encode())
+    for param in evaluator.internal:
+        key.update(('%s=%s;' % (param.name, param.value)).encode())
+    for coup in evaluator.couplings:
+        key.update(('%s=%s;' % (coup.name, coup.value)).encode())
+    for name in sorted(sm_values):
+        key.update(('%s=%r;' % (name, float(sm_values[name]))).encode())
+    return key.hexdigest()
+
+def decompose(sm_values=None, cache_dir=None, evaluator=None):
+    """ return the LinearCouplings for the given values of the non-Wilson
+    external parameters (defaults of parameters.py for those not given).
+    If cache_dir is set, the result is read from/written to that directory."""
+
+    if evaluator is None:
+        evaluator = BatchEvaluator()
+
+    coefficients = [p for p in evaluator.external if is_wilson_coefficient(p)]
+    coef_names = [p.name for p in coefficients]
+    fixed = dict((p.name, complex(p.value).real) for p in evaluator.external
+                                                if not is_wilson_coefficient(p))
+    for name, value in (sm_values or {}).items():
+        if name not in fixed:
+            raise KeyError('"%s" is not a fixed external parameter.' % name)
+        fixed[name] = float(value)
+
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, 'linear_%s.npz' %
+                                                cache_key(evaluator, fixed))
+        if os.path.exists(path):
+            return LinearCouplings.load(path)
+
+    # check that the model is indeed linear
+    degrees = dict((name, 1) for name in coef_names)
+    for param in evaluator.internal:
+        degrees[param.name] = expression_degree(param.value, degrees)
+    for coup in evaluator.couplings:
+        if expression_degree(coup.value, degrees) not in [0, 1]:
+            raise NonLinearError('%s = %s is not linear in the Wilson coefficients'
+                                                       % (coup.name, coup.value))
+
+    # one point without any coefficient and one per unit coefficient
+    points = evaluator.points(len(coefficients) + 1, **dict((n, 0.) for n in coef_names))
+    for name, value in fixed.items():
+        points[:, evaluator.index(name)] = value
+    for i, name in enumerate(coef_names):
+        points[i + 1, evaluator.index(name)] = 1.
+    values = evaluator.evaluate(points)
+    a = values[0]
+
+    rows, cols, data = [], [], []
+    deps = coefficient_dependencies(evaluator.external + evaluator.internal,
+                                                        evaluator.couplings)
+    for i, coup_deps in enumerate(deps):
+        for name in coup_deps:
+            j = coef_names.index(name)
+            rows.append(i)
+            cols.append(j)
+            data.append(values[j + 1, i] - a[i])
+    B = scipy.sparse.csr_matrix((data, (rows, cols)),
+                    shape=(len(evaluator.couplings), len(coefficients)), dtype=complex)
+    B.eliminate_zeros()
+
+    out = LinearCouplings(a, B, coef_names, evaluator.coupling_names, fixed)
+    if path:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        out.save(path)
+    return out
+
+
+if '__main__' == __name__:
+    cache_dir = None
+    sm_values = {}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--cache='):
+            cache_dir = arg.split('=', 1)[1]
+        else:
+            name, value = arg.split('=')
+            sm_values[name] = float(value)
+    lin = decompose(sm_values, cache_dir)
+    print('%d couplings, %d Wilson coefficients, %d non-zero entries in B, '
+          '%d couplings depend on the coefficients' % (len(lin.couplings),
+          len(lin.coefficients), lin.B.nnz, len(set(lin.B.nonzero()[0]))))
@@ -0,0 +1,111 @@
+""" Lookup index of the particles and vertices of the model.
+
+The index is built once and answers without scanning all_vertices:
+
+    from lookup import model_index
+    model_index.vertices('t', 't~', 'g')       # exactly t t~ g
+    model_index.vertices_with('W+')            # every vertex with a W+
+    model_index.anti('t')                      # the t~ Particle
+
+Particles can be given as Particle objects, names or PDG codes.
+"""
+
+import collections
+import numbers
+
+try:
+    string_types = basestring
+except NameError:
+    # python 3
+    string_types = str
+
+class ModelIndex(object):
+    """ PDG-code multiset -> vertices, particle -> vertices and
+    particle <-> antiparticle maps """
+
+    def __init__(self, list_of_particles=None, list_of_vertices=None):
+
+        if list_of_particles is None:
+            from particles import all_particles as list_of_particles
+        if list_of_vertices is None:
+            from vertices import all_vertices as list_of_vertices
+
+        self.particles = list(list_of_particles)
+        self.all_vertices = list(list_of_vertices)
+
+        self._by_pdg = dict((p.pdg_code, p) for p in self.particles)
+        self._by_name = dict((p.name, p) for p in self.particles)
+
+        self._anti = {}
+        for particle in self.particles:
+            if particle.selfconjugate:
+                self._anti[particle.pdg_code] = particle
+                continue
+            anti = self._by_pdg.get(-particle.pdg_code)
+            if anti is None or anti.name != particle.antiname:
+                continue
+            self._anti[particle.pdg_code] = anti
+            particle.set_anti(anti)
+
+        by_multiset = collections.defaultdict(list)
+        by_particle = collections.defaultdict(list)
+        self._content = {}
+        for vertex in self.all_vertices:
+            codes = [p.pdg_code for p in vertex.particles]
+            by_multiset[tuple(sorted(codes))].append(vertex)
+            content = collections.Counter(codes)
+            self._content[vertex.name] = content
+            for code in content:
+                by_particle[code].append(vertex)
+        self._by_multiset = dict((key, tuple(value)) for key, value in by_multiset.items())
+        self._by_particle = dict((key, tuple(value)) for key, value in by_particle.items())
+
+    def pdg_code(self, particle):
+        """ PDG code of a Particle, a particle name or a PDG code """
+        if isinstance(particle, numbers.Integral):
+            return particle
+        elif isinstance(particle, string_types):
+            try:
+                return self._by_name[particle].pdg_code
+            except KeyError:
+                raise KeyError('No particle named "%s" in the model.' % particle)
+        return particle.pdg_code
+
+    def particle(self, particle):
+        """ the Particle for a name or a PDG code """
+        code = self.pdg_code(particle)
+        try:
+            return self._by_pdg[code]
+        except KeyError:
+            raise KeyError('No particle with PDG code %s in the model.' % particle)
+
+    def anti(self, particle):
+        """ the antiparticle (the particle itself if self-conjugate) """
+        code = self.pdg_code(particle)
+        try:
+            return self._anti[code]
+        except KeyError:
+            raise KeyError('No antiparticle of %s in the model.' % particle)
+
+    def vertices(self, *particles):
+        """ the vertices connecting exactly the given particles (in any
+        order, with multiplicity) """
+        key = tuple(sorted(self.pdg_code(p) for p in particles))
+        return self._by_multiset.get(key, ())
+
+    def vertices_with(self, *particles):
+        """ the vertices containing at least the given particles (with
+        multiplicity) """
+        required = collections.Counter(self.pdg_code(p) for p in particles)
+        if not required:
+            return tuple(self.all_vertices)
+        candidates = min((self._by_particle.get(code, ()) for code in required), key=len)
+        return tuple(vertex for vertex in candidates if all(
+            self._content[vertex.name][code] >= n for code, n in required.items()))
+
+    def multisets(self):
+        """ the PDG-code multisets (sorted tuples) of the vertices """
+        return list(self._by_multiset)
+
+
+model_index = ModelIndex()
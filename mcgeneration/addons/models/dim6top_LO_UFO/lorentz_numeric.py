@@ -0,0 +1,241 @@
+""" Numerical evaluation of the Lorentz structures on batches of events.
+
+Each Lorentz structure is compiled once into a sum of numpy.einsum
+contractions of constant Dirac/Lorentz tensors with the momenta and the
+wavefunctions of the legs, for N events at once:
+
+    from lorentz_numeric import compile_lorentz
+    ffv = compile_lorentz(L.FFV1, open_leg=3)
+    current = ffv(momenta, [ubar, v, None])     # (N, 4) current J^mu
+
+Conventions:
+ - momenta[n-1] is the (N, 4) array of the momentum of leg n, as used in
+   P(mu,n) (UFO momenta are incoming), with upper index (E, px, py, pz).
+ - wavefunctions[n-1] is (N, 4) for a fermion (spinor index, contracted as
+   given: pass the barred spinor for the row index of Gamma(mu,i,j)), (N, 4)
+   with upper index for a vector and (N,) for a scalar or ghost.
+ - Dirac matrices are in the chiral (HELAS) basis, the metric is
+   diag(1,-1,-1,-1). The Lorentz index of an open leg is an upper index.
+"""
+
+import string
+
+import numpy
+
+from dedup import expand, UnsupportedStructure
+from object_library import UFOError
+
+metric = numpy.diag([1., -1., -1., -1.]).astype(complex)
+
+_pauli = [numpy.eye(2),
+          numpy.array([[0, 1], [1, 0]]),
+          numpy.array([[0, -1j], [1j, 0]]),
+          numpy.array([[1, 0], [0, -1]])]
+
+gamma = numpy.zeros((4, 4, 4), dtype=complex)
+gamma[0] = numpy.block([[numpy.zeros((2, 2)), _pauli[0]], [_pauli[0], numpy.zeros((2, 2))]])
+for _mu in range(1, 4):
+    gamma[_mu] = numpy.block([[numpy.zeros((2, 2)), _pauli[_mu]],
+                              [-_pauli[_mu], numpy.zeros((2, 2))]])
+
+gamma5 = numpy.diag([-1., -1., 1., 1.]).astype(complex)
+identity = numpy.eye(4, dtype=complex)
+proj_m = (identity - gamma5) / 2
+proj_p = (identity + gamma5) / 2
+sigma = numpy.array([[(gamma[mu].dot(gamma[nu]) - gamma[nu].dot(gamma[mu])) * 0.5j
+                                             for nu in range(4)] for mu in range(4)])
+
+# constant tensors: name -> (array, kind of each index)
+constant_tensors = {'Gamma': (gamma, 'lss'),
+                    'Gamma5': (gamma5, 'ss'),
+                    'ProjM': (proj_m, 'ss'),
+                    'ProjP': (proj_p, 'ss'),
+                    'Identity': (identity, 'ss'),
+                    'Metric': (metric, 'll'),
+                    'Sigma': (sigma, 'llss')}
+
+# letters of the einsum subscripts, the batch index is z
+_letters = string.ascii_letters.replace('z', '')
+
+class CompiledLorentz(object):
+    """ a Lorentz structure as a sum of einsum contractions """
+
+    def __init__(self, structure, spins, open_leg=None):
+
+        self.structure = structure
+        self.spins = list(spins)
+        self.open_leg = open_leg
+        if open_leg is not None and not 1 <= open_leg <= len(spins):
+            raise UFOError('No leg %s in a %d-point structure.' % (open_leg, len(spins)))
+        for spin in self.spins:
+            if spin not in [-1, 1, 2, 3]:
+                raise UFOError('Spin %s legs are not supported (%s).' % (spin, structure))
+        try:
+            terms = expand(structure)
+        except UnsupportedStructure:
+            raise UFOError('Can not expand the Lorentz structure %s.' % structure)
+        # terms with the same momenta and wavefunctions share one contraction
+        constants = {}
+        for term, coef in terms.items():
+            if coef != 0:
+                key, constant = self._compile_term(term, coef)
+                constants[key] = constants.get(key, 0) + constant
+        self.terms = []
+        for key in sorted(constants):
+            constant_output, variable_subscripts, variables, output = key
+            subscripts = ','.join((constant_output,) + variable_subscripts) + '->' + output
+            self.terms.append((subscripts, constants[key], variables))
+        self._paths = [None] * len(self.terms)
+
+    def _leg_kind(self, leg):
+        return {2: 's', 3: 'l'}.get(self.spins[leg - 1], None)
+
+    def _compile_term(self, term, coef):
+        """ return the key (subscripts and operands) of the term and its
+        constant tensor. Operands are ('momentum', leg) or
+        ('wavefunction', leg). """
+
+        operands = []
+        subscripts = []
+        occurrences = {}     # index -> kinds of its occurrences
+
+        for name, indices in term:
+            if name == 'P':
+                if len(indices) != 2:
+                    raise UFOError('P takes two arguments in %s.' % self.structure)
+                operands.append(('momentum', indices[1]))
+                subscripts.append(['z', indices[0]])
+                occurrences.setdefault(indices[0], []).append('l')
+                continue
+            if name not in constant_tensors:
+                raise UFOError('Unknown tensor %s in %s.' % (name, self.structure))
+            array, kinds = constant_tensors[name]
+            if len(indices) != len(kinds):
+                raise UFOError('%s takes %d arguments in %s.' % (name, len(kinds),
+                                                                 self.structure))
+            operands.append(('constant', array))
+            subscripts.append(list(indices))
+            for index, kind in zip(indices, kinds):
+                occurrences.setdefault(index, []).append(kind)
+
+        # the legs: wavefunctions (or open index)
+        output = ['z']
+        for leg in range(1, len(self.spins) + 1):
+            kind = self._leg_kind(leg)
+            if leg == self.open_leg:
+                if kind is not None:
+                    output.append(leg)
+                continue
+            operands.append(('wavefunction', leg))
+            if kind is None:
+                subscripts.append(['z'])
+            else:
+                subscripts.append(['z', leg])
+                occurrences.setdefault(leg, []).append(kind)
+
+        # consistency and lowering of the contracted Lorentz indices
+        lowered = []
+        for index, kinds in occurrences.items():
+            if len(set(kinds)) != 1:
+                raise UFOError('Index %s used as spinor and Lorentz index in %s.'
+                                                         % (index, self.structure))
+            expected = 1 if index == self.open_leg else 2
+            if len(kinds) != expected:
+                raise UFOError('Index %s appears %d times in %s.' % (index,
+                                                     len(kinds), self.structure))
+            if kinds[0] == 'l' and len(kinds) == 2:
+                lowered.append(index)
+        for index in lowered:
+            # the second occurrence is contracted through the metric
+            found = 0
+            for sub in subscripts:
+                for i, item in enumerate(sub):
+                    if item == index:
+                        found += 1
+                        if found == 2:
+                            sub[i] = ('lowered', index)
+            operands.append(('constant', metric))
+            subscripts.append([index, ('lowered', index)])
+
+        # the constant tensors are contracted once, with the coefficient
+        constant_subscripts, constant_arrays = [], []
+        variable_subscripts, variables = [], []
+        for sub, operand in zip(subscripts, operands):
+            if operand[0] == 'constant':
+                constant_subscripts.append(sub)
+                constant_arrays.append(operand[1])
+            else:
+                variable_subscripts.append(sub)
+                variables.append(operand)
+
+        # letters renamed in order of appearance, such that equivalent terms
+        # have the same subscripts
+        rename = {'z': 'z'}
+        letters = iter(_letters)
+        for sub in variable_subscripts + [output]:
+            for index in sub:
+                if index not in rename:
+                    rename[index] = next(letters)
+        kept = [index for index in rename if index != 'z']
+        kept.sort(key=lambda index: rename[index])
+        for sub in constant_subscripts:
+            for index in sub:
+                if index not in rename:
+                    rename[index] = next(letters)
+        used = set(index for sub in constant_subscripts for index in sub)
+        constant_output = ''.join(rename[index] for index in kept if index in used)
+        if constant_arrays:
+            constant = coef * numpy.einsum(','.join(''.join(rename[i] for i in sub)
+                                                    for sub in constant_subscripts)
+                                   + '->' + constant_output, *constant_arrays)
+        else:
+            constant = numpy.array(coef, dtype=complex)
+
+        key = (constant_output,
+               tuple(''.join(rename[i] for i in sub) for sub in variable_subscripts),
+               tuple(variables), ''.join(rename[i] for i in output))
+        return key, constant
+
+    def __call__(self, momenta, wavefunctions):
+        """ value of the structure for the (N, 4) momenta and the
+        wavefunctions of the legs (the one of the open leg is ignored) """
+
+        nevents = None
+        for array in list(momenta) + list(wavefunctions):
+            if array is not None:
+                nevents = len(array)
+                break
+        out = None
+        for i, (subscripts, constant, operands) in enumerate(self.terms):
+            arrays = [constant]
+            for kind, leg in operands:
+                arrays.append(momenta[leg - 1] if kind == 'momentum'
+                                              else wavefunctions[leg - 1])
+            if not operands:
+                # no event dependence (e.g. '1' with an open scalar leg)
+                subscripts = subscripts.replace('->', ',z->')
+                arrays.append(numpy.ones(nevents))
+            if self._paths[i] is None:
+                # without a memory limit: the default one forbids the (N, ...)
+                # intermediates and falls back to a single slow contraction
+                self._paths[i] = numpy.einsum_path(subscripts, *arrays,
+                                                   optimize=('greedy', 2**62))[0]
+            value = numpy.einsum(subscripts, *arrays, optimize=self._paths[i])
+            out = value if out is None else out + value
+        if out is None:
+            shape = (nevents,) if self.open_leg is None or \
+                         self._leg_kind(self.open_leg) is None else (nevents, 4)
+            out = numpy.zeros(shape, dtype=complex)
+        return out
+
+
+_compiled = {}
+
+def compile_lorentz(lorentz, open_leg=None):
+    """ the CompiledLorentz of a Lorentz object, cached per structure, spins
+    and open leg """
+
+    key = (lorentz.structure, tuple(lorentz.spins), open_leg)
+    if key not in _compiled:
+        _compiled[key] = CompiledLorentz(lorentz.structure, lorentz.spins, open_leg)
+    return _compiled[key]
@@ -0,0 +1,613 @@
+""" Tree-level matrix elements of 2 -> 2 processes on batches of events.
+
+The diagrams (contact interactions and s/t/u-channel exchanges) are built
+from the vertices of the model, the Lorentz structures are evaluated with
+lorentz_numeric and the color factors are computed numerically from the
+color strings of the vertices. The squared matrix element, summed over
+helicities and colors and averaged over the initial ones, is returned for
+N events at once:
+
+    me = MatrixElement(['g', 'g'], ['t', 't~'], excluded=['a', 'z', 'h', 'w+'],
+                       max_orders={'DIM6': 1})
+    couplings = coupling_values(evaluator, points)   # one point or per event
+    me2 = me(momenta, couplings)   # momenta: (N, 4, 4), legs in, in, out, out
+
+Conventions: the fields of the vertices are outgoing (an incoming particle is
+an outgoing antiparticle) and P(mu,n) is the momentum of the outgoing field
+n; particles take the row index of the Dirac matrices and antiparticles the
+column index. Massless vector propagators are taken in the Feynman gauge,
+massive ones in the unitary gauge.
+
+    python matrix_elements.py [--param_card=FILE] EVENTS.lhe[.gz] reweight_card.dat
+
+compares the reweighting ratios to the weights stored by MadGraph, with the
+masses and widths of the param_card (by default the one in the header of
+the events).
+"""
+
+import itertools
+import os
+import re
+import sys
+
+import numpy
+
+from dedup import expand
+from lookup import ModelIndex
+from lorentz_numeric import compile_lorentz, gamma, metric
+from object_library import UFOError
+
+tools_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, os.pardir, os.pardir, 'tools')
+
+#=============================================================================
+# color
+#=============================================================================
+
+def _su3():
+    lam = numpy.zeros((8, 3, 3), dtype=complex)
+    lam[0][0, 1] = lam[0][1, 0] = 1
+    lam[1][0, 1], lam[1][1, 0] = -1j, 1j
+    lam[2][0, 0], lam[2][1, 1] = 1, -1
+    lam[3][0, 2] = lam[3][2, 0] = 1
+    lam[4][0, 2], lam[4][2, 0] = -1j, 1j
+    lam[5][1, 2] = lam[5][2, 1] = 1
+    lam[6][1, 2], lam[6][2, 1] = -1j, 1j
+    lam[7] = numpy.diag([1, 1, -2]) / numpy.sqrt(3)
+    t = lam / 2
+    commutator = numpy.einsum('aij,bjk->abik', t, t) - numpy.einsum('bij,ajk->abik', t, t)
+    anticommutator = numpy.einsum('aij,bjk->abik', t, t) + numpy.einsum('bij,ajk->abik', t, t)
+    f = (-2j * numpy.einsum('abij,cji->abc', commutator, t)).real
+    d = (2 * numpy.einsum('abij,cji->abc', anticommutator, t)).real
+    return t, f.astype(complex), d.astype(complex)
+
+color_t, color_f, color_d = _su3()
+# tensor -> (array, dimension of each index)
+color_tensors = {'T': (color_t, (8, 3, 3)), 'f': (color_f, (8, 8, 8)),
+                 'd': (color_d, (8, 8, 8))}
+color_dimensions = {1: 1, 3: 3, -3: 3, 6: 6, -6: 6, 8: 8}
+
+_letters = 'abcdefghijklmnopqrstuvwxy'
+
+def color_tensor(string, dimensions):
+    """ the color string of a vertex as an array with one axis per leg
+    (of dimension 1 for color singlets) """
+
+    out = numpy.zeros(tuple(dimensions), dtype=complex)
+    for term, coef in expand(string).items():
+        letters = dict((leg, _letters[leg - 1]) for leg in range(1, len(dimensions) + 1))
+        operands, subscripts = [], []
+        for name, indices in term:
+            for index in indices:
+                if index not in letters:
+                    letters[index] = _letters[len(letters)]
+            if name == 'Identity':
+                operands.append(numpy.eye(max(dimensions[i - 1] for i in indices if i > 0)))
+            elif name in color_tensors:
+                operands.append(color_tensors[name][0])
+            else:
+                raise UFOError('Unknown color tensor %s in %s.' % (name, string))
+            subscripts.append(''.join(letters[i] for i in indices))
+        legs = [leg for leg in range(1, len(dimensions) + 1) if dimensions[leg - 1] > 1]
+        value = numpy.einsum(','.join(subscripts) + '->' + ''.join(letters[l] for l in legs),
+                             *operands) if operands else numpy.array(1.)
+        out += coef * value.reshape(out.shape)
+    return out
+
+#=============================================================================
+# external wavefunctions
+#=============================================================================
+
+def _sqrt_sigma(p, mass, sign):
+    """ sqrt(p.sigma) (sign=-1) or sqrt(p.sigmabar) (sign=+1), (N, 2, 2) """
+    e, px, py, pz = p[:, 0], p[:, 1], p[:, 2], p[:, 3]
+    out = numpy.empty((len(p), 2, 2), dtype=complex)
+    out[:, 0, 0] = e + sign * pz + mass
+    out[:, 0, 1] = sign * (px - 1j * py)
+    out[:, 1, 0] = sign * (px + 1j * py)
+    out[:, 1, 1] = e - sign * pz + mass
+    return out / numpy.sqrt(2 * (e + mass))[:, numpy.newaxis, numpy.newaxis]
+
+def spinors(p, mass, kind):
+    """ the two spinors u, v, ubar or vbar of momentum p (N, 4) in the
+    chiral basis (the barred spinors are psi^dagger gamma^0) """
+
+    left, right = _sqrt_sigma(p, mass, -1), _sqrt_sigma(p, mass, 1)
+    out = []
+    for xi in numpy.eye(2):
+        if kind in ['u', 'ubar']:
+            psi = numpy.concatenate([left.dot(xi), right.dot(xi)], axis=1)
+        else:
+            psi = numpy.concatenate([left.dot(xi), -right.dot(xi)], axis=1)
+        if kind.endswith('bar'):
+            psi = psi.conj().dot(gamma[0])
+        out.append(psi)
+    return out
+
+def polarizations(k, mass):
+    """ the real polarization vectors (upper index) of a vector boson of
+    momentum k (N, 4): two transverse ones, and the longitudinal one if
+    massive """
+
+    kvec = k[:, 1:]
+    norm = numpy.sqrt((kvec ** 2).sum(axis=1))
+    khat = kvec / numpy.where(norm > 0, norm, 1.)[:, numpy.newaxis]
+    khat[norm == 0] = [0., 0., 1.]
+    reference = numpy.where((abs(khat[:, 2]) > 0.9)[:, numpy.newaxis],
+                            [1., 0., 0.], [0., 0., 1.])
+    e1 = numpy.cross(khat, reference)
+    e1 /= numpy.sqrt((e1 ** 2).sum(axis=1))[:, numpy.newaxis]
+    e2 = numpy.cross(khat, e1)
+    out = [numpy.concatenate([numpy.zeros((len(k), 1)), e], axis=1).astype(complex)
+                                                                for e in (e1, e2)]
+    if mass:
+        out.append(numpy.concatenate([norm[:, numpy.newaxis],
+                      k[:, 0:1] * khat], axis=1).astype(complex) / mass)
+    return out
+
+#=============================================================================
+# diagrams
+#=============================================================================
+
+def spinor_chains(structure):
+    """ the fermion chains of a Lorentz structure, as (row leg, column leg) """
+
+    slots = {'Gamma': (1, 2), 'ProjM': (0, 1), 'ProjP': (0, 1), 'Identity': (0, 1),
+             'Gamma5': (0, 1), 'Sigma': (2, 3)}
+    chains = None
+    for term in expand(structure):
+        links = {}
+        for name, indices in term:
+            if name in slots:
+                links[indices[slots[name][0]]] = indices[slots[name][1]]
+        term_chains = []
+        for start in sorted(i for i in links if i > 0):
+            index = links[start]
+            while index < 0:
+                index = links[index]
+            term_chains.append((start, index))
+        if chains is not None and term_chains != chains:
+            raise UFOError('Inconsistent fermion flow in %s.' % structure)
+        chains = term_chains
+    return chains or []
+
+def permutation_sign(sequence):
+    """ signature of the permutation sorting the sequence """
+    sign = 1
+    sequence = list(sequence)
+    for i in range(len(sequence)):
+        for j in range(i + 1, len(sequence)):
+            if sequence[i] > sequence[j]:
+                sign = -sign
+    return sign
+
+
+# gamma matrices with a lower Lorentz index
+_gamma_lower = numpy.einsum('mij,mn->nij', gamma, metric)
+
+
+def unphysical(particle):
+    """ True for the ghosts and the Goldstone bosons, which are neither
+    external nor exchanged in the unitary gauge """
+    return particle.spin == -1 or particle.goldstoneboson or \
+           getattr(particle, 'goldstone', False)
+
+
+class Leg(object):
+    """ an external particle, seen as an outgoing field of the vertices """
+
+    def __init__(self, number, particle, field, initial):
+        self.number = number            # 1..4
+        self.particle = particle        # physical particle
+        self.field = field              # outgoing field in the vertices
+        self.initial = initial
+
+
+def external_states(leg, p, mass):
+    """ the wavefunctions of the helicity states of an external leg of
+    momentum p (N, 4) """
+
+    particle = leg.particle
+    if particle.spin == 2:
+        if leg.field.pdg_code > 0:      # row index
+            kind = 'vbar' if leg.initial else 'ubar'
+        else:
+            kind = 'u' if leg.initial else 'v'
+        return spinors(p, mass, kind)
+    elif particle.spin == 3:
+        return polarizations(p, mass)
+    return [numpy.ones(len(p), dtype=complex)]
+
+
+class MatrixElement(object):
+    """ |M|^2 of initial -> final (2 -> 2) for batches of events """
+
+    def __init__(self, initial, final, excluded=(), max_orders=None,
+                 list_of_vertices=None, evaluator=None, point=None):
+        """ initial and final are lists of particle names or PDG codes, the
+        excluded particles are not propagated and max_orders limits the
+        coupling orders of each diagram (e.g. {'DIM6': 1}). The masses and
+        widths are the values of point (the external parameters), the
+        defaults of parameters.py (or of the evaluator) if None. """
+
+        if evaluator is None:
+            from evaluator import BatchEvaluator
+            evaluator = BatchEvaluator()
+        self.index = ModelIndex(list_of_vertices=list_of_vertices)
+        if len(initial) != 2 or len(final) != 2:
+            raise UFOError('Only 2 -> 2 processes are implemented.')
+        if point is None:
+            defaults = evaluator.default_values()
+        else:
+            defaults = numpy.array(point, dtype=float)
+        internal = evaluator.evaluate_parameters(defaults)[0]
+        self.values = dict(zip(evaluator.external_names, defaults))
+        self.values.update(zip(evaluator.internal_names, internal.real))
+        self.values['ZERO'] = 0.
+        self.excluded = set(name.lower() for name in excluded)
+        self.max_orders = dict(max_orders or {})
+
+        self.legs = []
+        for i, name in enumerate(list(initial) + list(final)):
+            particle = self.index.particle(name)
+            field = self.index.anti(particle) if i < 2 else particle
+            self.legs.append(Leg(i + 1, particle, field, i < 2))
+
+        self.average = 1.
+        for leg in self.legs[:2]:
+            self.average /= self._states(leg.particle) * \
+                             color_dimensions[leg.particle.color]
+        self.symmetry = 0.5 if final[0] == final[1] else 1.
+
+        self.colors = []         # color tensors over the external legs
+        self.recipes = []        # how to compute the Lorentz amplitudes
+        self.terms = []          # (couplings, color, recipe, sign)
+        self._build_contact()
+        self._build_exchange()
+        if not self.terms:
+            raise UFOError('No diagram for %s > %s.' % (' '.join(initial), ' '.join(final)))
+        colors = numpy.array([c.ravel() for c in self.colors])
+        self.color_matrix = colors.dot(colors.conj().T)
+
+    #-------------------------------------------------------------------------
+    def _states(self, particle):
+        """ number of helicity states """
+        if particle.spin == 2:
+            return 2
+        elif particle.spin == 3:
+            return 3 if self._mass(particle) else 2
+        return 1
+
+    def _mass(self, particle):
+        return self.values[particle.mass.name]
+
+    def _width(self, particle):
+        return self.values[particle.width.name]
+
+    def _allowed(self, couplings):
+        orders = {}
+        for coup in couplings:
+            for key, value in coup.order.items():
+                orders[key] = orders.get(key, 0) + value
+        return all(orders.get(key, 0) <= value for key, value in self.max_orders.items())
+
+    def _positions(self, vertex, fields):
+        """ position in the vertex of each field (a permutation) """
+        positions = []
+        for field in fields:
+            for i, particle in enumerate(vertex.particles):
+                if i not in positions and particle.pdg_code == field.pdg_code:
+                    positions.append(i)
+                    break
+            else:
+                return None
+        return positions
+
+    def _color(self, vertex, c, positions, internal=None):
+        """ color tensor of the vertex with its axes in the order of the
+        positions (the internal leg last) """
+        dims = [color_dimensions[p.color] for p in vertex.particles]
+        tensor = color_tensor(vertex.color[c], dims)
+        return tensor.transpose(positions + ([] if internal is None else [internal]))
+
+    def _add_color(self, tensor):
+        for i, other in enumerate(self.colors):
+            if other.shape == tensor.shape and numpy.allclose(other, tensor):
+                return i
+        self.colors.append(tensor)
+        return len(self.colors) - 1
+
+    def _chains_sign(self, chains):
+        sequence = []
+        for row, column in sorted(chains):
+            sequence.extend([row, column])
+        return permutation_sign(sequence)
+
+    def _build_contact(self):
+        fields = [leg.field for leg in self.legs]
+        for vertex in self.index.vertices(*fields):
+            positions = self._positions(vertex, fields)
+            for (c, l), coup in sorted(vertex.couplings.items()):
+                if not self._allowed([coup]):
+                    continue
+                lorentz = vertex.lorentz[l]
+                legs = dict((positions[i] + 1, leg.number) for i, leg in enumerate(self.legs))
+                chains = [(legs[r], legs[col]) for r, col in spinor_chains(lorentz.structure)]
+                color = self._color(vertex, c, positions)
+                recipe = ('contact', lorentz, positions)
+                self.terms.append(((coup.name,), self._add_color(color),
+                                   self._add_recipe(recipe), self._chains_sign(chains)))
+
+    def _add_recipe(self, recipe):
+        if recipe not in self.recipes:
+            self.recipes.append(recipe)
+        return self.recipes.index(recipe)
+
+    def _build_exchange(self):
+        for pair in [(0, 1), (0, 2), (0, 3)]:
+            legs1 = [self.legs[i] for i in pair]
+            legs2 = [leg for leg in self.legs if leg not in legs1]
+            for vertex1 in self.index.vertices_with(*[leg.field for leg in legs1]):
+                if len(vertex1.particles) != 3:
+                    continue
+                positions1 = self._positions(vertex1, [leg.field for leg in legs1])
+                internal1 = [i for i in range(3) if i not in positions1][0]
+                exchanged = vertex1.particles[internal1]
+                if unphysical(exchanged) or exchanged.name.lower() in self.excluded or \
+                   self.index.anti(exchanged).name.lower() in self.excluded:
+                    continue
+                fields2 = [leg.field for leg in legs2] + [self.index.anti(exchanged)]
+                for vertex2 in self.index.vertices(*fields2):
+                    positions2 = self._positions(vertex2, fields2)
+                    self._add_exchange(legs1, vertex1, positions1[:2] + [internal1],
+                                       legs2, vertex2, positions2, exchanged)
+
+    def _add_exchange(self, legs1, vertex1, positions1, legs2, vertex2, positions2, exchanged):
+        numbers1 = [leg.number for leg in legs1]
+        numbers2 = [leg.number for leg in legs2]
+        order = numbers1 + numbers2
+        for (c1, l1), coup1 in sorted(vertex1.couplings.items()):
+            for (c2, l2), coup2 in sorted(vertex2.couplings.items()):
+                if not self._allowed([coup1, coup2]):
+                    continue
+                # color: contraction over the exchanged particle
+                color1 = self._color(vertex1, c1, positions1[:2], positions1[2])
+                color2 = self._color(vertex2, c2, positions2[:2], positions2[2])
+                color = numpy.einsum('abx,cdx->abcd', color1, color2)
+                color = color.transpose(numpy.argsort(order))
+
+                # fermion chains, joined through the propagator
+                lor1, lor2 = vertex1.lorentz[l1], vertex2.lorentz[l2]
+                map1 = dict((positions1[i] + 1, numbers1[i]) for i in range(2))
+                map1[positions1[2] + 1] = 'x'
+                map2 = dict((positions2[i] + 1, numbers2[i]) for i in range(2))
+                map2[positions2[2] + 1] = 'y'
+                chains = [(map1[r], map1[c]) for r, c in spinor_chains(lor1.structure)] + \
+                         [(map2[r], map2[c]) for r, c in spinor_chains(lor2.structure)]
+                for end, start in [('x', 'y'), ('y', 'x')]:
+                    ending = [ch for ch in chains if ch[1] == end]
+                    starting = [ch for ch in chains if ch[0] == start]
+                    if ending and starting:
+                        chains.remove(ending[0])
+                        chains.remove(starting[0])
+                        chains.append((ending[0][0], starting[0][1]))
+
+                recipe = ('exchange', lor1, tuple(positions1), numbers1,
+                          lor2, tuple(positions2), numbers2, exchanged)
+                self.terms.append(((coup1.name, coup2.name), self._add_color(color),
+                                   self._add_recipe(recipe), self._chains_sign(chains)))
+
+    #-------------------------------------------------------------------------
+    def _wavefunctions(self, momenta):
+        """ for each leg, the list of its wavefunctions (one per state) and
+        the momentum of its outgoing field """
+
+        out = []
+        for leg in self.legs:
+            p = momenta[:, leg.number - 1, :]
+            states = external_states(leg, p, self._mass(leg.particle))
+            out.append((states, -p if leg.initial else p))
+        return out
+
+    def _propagator(self, particle, q):
+        """ numerator and denominator of the propagator of particle, of
+        momentum q (outgoing from vertex 1) """
+
+        mass = self._mass(particle)
+        width = self._width(particle)
+        q2 = q[:, 0] ** 2 - (q[:, 1:] ** 2).sum(axis=1)
+        denominator = q2 - mass ** 2 + 1j * mass * width
+        if particle.spin == 3:
+            return (q.dot(metric) / mass if mass else None), denominator
+        elif particle.spin == 2:
+            # i (pslash + m), p along the fermion flow, into the psi vertex
+            p = -q if particle.pdg_code < 0 else q
+            pslash = numpy.einsum('nij,zn->zij', _gamma_lower, p)
+            pslash += mass * numpy.eye(4)
+            return pslash, denominator
+        return None, denominator
+
+    def _current(self, lorentz, positions, numbers, q, states, wavefunctions, cache):
+        """ current of a 3-point vertex with the legs numbers (at positions)
+        and the exchanged particle (last position, momentum q) open """
+
+        key = (lorentz.name, positions, tuple(numbers), tuple(states[n - 1] for n in numbers))
+        if key not in cache:
+            vertex_wfs, vertex_moms = [None] * 3, [None] * 3
+            for i in range(2):
+                vertex_wfs[positions[i]] = wavefunctions[numbers[i] - 1][0][states[numbers[i] - 1]]
+                vertex_moms[positions[i]] = wavefunctions[numbers[i] - 1][1]
+            vertex_moms[positions[2]] = q
+            cache[key] = compile_lorentz(lorentz, positions[2] + 1)(vertex_moms, vertex_wfs)
+        return cache[key]
+
+    def _amplitude(self, recipe, states, wavefunctions, cache):
+        """ Lorentz part of the amplitude of a recipe, for the given state
+        (index) of each leg. The currents and propagators are kept in the
+        cache between the helicity configurations. """
+
+        moms = [wf[1] for wf in wavefunctions]
+        if recipe[0] == 'contact':
+            lorentz, positions = recipe[1], recipe[2]
+            vertex_wfs, vertex_moms = [None] * 4, [None] * 4
+            for i, position in enumerate(positions):
+                vertex_wfs[position] = wavefunctions[i][0][states[i]]
+                vertex_moms[position] = moms[i]
+            return compile_lorentz(lorentz)(vertex_moms, vertex_wfs)
+
+        lor1, positions1, numbers1, lor2, positions2, numbers2, exchanged = recipe[1:]
+        key = ('propagator', exchanged.name, tuple(numbers1))
+        if key not in cache:
+            q = -(moms[numbers1[0] - 1] + moms[numbers1[1] - 1])
+            cache[key] = (q,) + self._propagator(exchanged, q)
+        q, numerator, denominator = cache[key]
+        current1 = self._current(lor1, positions1, numbers1, q, states, wavefunctions, cache)
+        current2 = self._current(lor2, positions2, numbers2, -q, states, wavefunctions, cache)
+
+        if exchanged.spin == 3:
+            value = numpy.einsum('zm,zm->z', current1.dot(metric), current2)
+            if numerator is not None:
+                # unitary gauge, numerator is q_mu / M
+                value -= numpy.einsum('zm,zm->z', current1, numerator) * \
+                         numpy.einsum('zm,zm->z', current2, numerator)
+            return -1j * value / denominator
+        elif exchanged.spin == 2:
+            # the psi vertex has the exchanged antiparticle (column index)
+            psi, psibar = (current1, current2) if exchanged.pdg_code < 0 \
+                                               else (current2, current1)
+            value = numpy.einsum('zj,zj->z', numpy.einsum('zi,zij->zj', psi, numerator), psibar)
+            return 1j * value / denominator
+        return 1j * current1 * current2 / denominator
+
+    def coupling_vector(self, couplings):
+        """ product of the couplings of each term, (T,) or (T, N) """
+        return numpy.array([numpy.prod([couplings[name] for name in names], axis=0)
+                            for names, color, recipe, sign in self.terms])
+
+    def __call__(self, momenta, couplings):
+        """ |M|^2 for the (N, 4, 4) momenta (E, px, py, pz of the legs) and
+        the coupling values (name -> value, or array of N values) """
+
+        momenta = numpy.asarray(momenta, dtype=float)
+        wavefunctions = self._wavefunctions(momenta)
+        values = self.coupling_vector(couplings)
+        if values.ndim == 1:
+            values = values[:, numpy.newaxis]
+        out = numpy.zeros(len(momenta))
+        cache = {}
+        for states in itertools.product(*[range(len(wf[0])) for wf in wavefunctions]):
+            amplitudes = [self._amplitude(recipe, states, wavefunctions, cache)
+                                                        for recipe in self.recipes]
+            by_color = numpy.zeros((len(self.colors), len(momenta)), dtype=complex)
+            for (names, color, recipe, sign), value in zip(self.terms, values):
+                by_color[color] += sign * value * amplitudes[recipe]
+            out += numpy.einsum('iz,ij,jz->z', by_color, self.color_matrix,
+                                by_color.conj()).real
+        return out * self.average * self.symmetry
+
+
+def coupling_values(evaluator, points):
+    """ name -> value of the couplings for one point (1d array of the
+    external parameters) or one point per event (2d array) """
+    values = evaluator.evaluate(points)
+    return dict(zip(evaluator.coupling_names, values.T))
+
+#=============================================================================
+# comparison to the weights stored by MadGraph
+#=============================================================================
+
+def lhe_reader(filename, batch):
+    """ LHEReader of tools/lhe.py """
+    if tools_dir not in sys.path:
+        sys.path.append(tools_dir)
+    from lhe import LHEReader
+    return LHEReader(filename, batch)
+
+def header_param_card(header):
+    """ text of the param_card in the <slha> block of an LHE header, None
+    if there is none """
+    match = re.search(br'<slha>(.*?)</slha>', header, re.S)
+    return match.group(1).decode() if match else None
+
+def read_events(events, final=(6, -6)):
+    """ batches of the momenta (N, 4, 4) of the initial partons and of the
+    final particles with PDG codes final, the PDG codes (N, 2) of the
+    initial partons, alpha_s and the weights (the event weights and
+    name -> named reweights) of the events of an LHEReader """
+
+    for batch in events:
+        pdg, status = batch.pdg, batch.status
+        # the initial partons first, in the order of the file
+        initial = numpy.argsort(status != -1, axis=1, kind='mergesort')[:, :2]
+        columns = [initial[:, 0], initial[:, 1]]
+        for code in final:
+            found = pdg == code
+            if not found.any(axis=1).all():
+                raise ValueError('Events without a particle %d in %s.' % (code, events.filename))
+            columns.append(found.argmax(axis=1))
+        rows = numpy.arange(len(batch))[:, numpy.newaxis]
+        columns = numpy.array(columns).T
+        named = dict(zip(batch.weight_names, batch.weights.T))
+        yield (batch.momenta[rows, columns], pdg[rows, columns[:, :2]],
+               batch.alpha_s, batch.weight, named)
+
+def compare_to_lhe(filename, reweight_card, param_card=None, excluded=('a', 'z', 'h', 'w+'),
+                                                 max_orders={'DIM6': 1}, batch=10000):
+    """ relative differences between the reweighting ratios computed here
+    and the ones of MadGraph, per rwgt_name. The masses and widths are the
+    ones of param_card, by default the param_card in the header of the
+    events. For events with decays, the ratios of MadGraph include the
+    spin correlations and only agree approximately. """
+
+    from card_commands import CommandInterpreter
+    from evaluator import BatchEvaluator
+    from read_param_card import ParamCardReader
+    evaluator = BatchEvaluator()
+    index = ModelIndex()
+    out = {}
+    elements = {}
+    column = evaluator.index('aS')
+    with lhe_reader(filename, batch) as events:
+        if param_card is None:
+            text = header_param_card(events.header)
+            if text is None:
+                raise UFOError('No param_card in the header of %s, give one.' % filename)
+            base = ParamCardReader(evaluator.external).read(text, 'the header of %s' % filename)
+        else:
+            base = param_card
+        interpreter = CommandInterpreter(base, evaluator)
+        with open(reweight_card) as fsock:
+            names, points = interpreter.run(fsock)
+        for name in names:
+            out[name] = []
+        for momenta, pdgs, alphas, weight, named in read_events(events):
+            for initial in set(map(tuple, pdgs)):
+                selection = (pdgs == initial).all(axis=1)
+                if initial not in elements:
+                    elements[initial] = MatrixElement(
+                        [index.particle(code).name for code in initial], ['t', 't~'],
+                        excluded=excluded, max_orders=max_orders, evaluator=evaluator,
+                        point=interpreter.base)
+                me = elements[initial]
+                base = numpy.tile(interpreter.base, (selection.sum(), 1))
+                base[:, column] = alphas[selection]
+                reference = me(momenta[selection], coupling_values(evaluator, base))
+                for name, values in zip(names, points):
+                    point = numpy.tile(values, (selection.sum(), 1))
+                    point[:, column] = alphas[selection]
+                    ratio = me(momenta[selection], coupling_values(evaluator, point)) / reference
+                    stored = named.get(name, numpy.full(len(weight), numpy.nan)) / weight
+                    out[name].extend(ratio / stored[selection] - 1)
+    return dict((name, numpy.array(values)) for name, values in out.items())
+
+
+if '__main__' == __name__:
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--'))
+    arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(arguments) != 2 or set(options) - set(['param_card']):
+        sys.exit(__doc__)
+    differences = compare_to_lhe(arguments[0], arguments[1], options.get('param_card'))
+    for name, difference in sorted(differences.items()):
+        print('%-12s %d events, relative difference: mean %.3g, max %.3g' % (
+              name, len(difference), numpy.mean(abs(difference)),
+              numpy.max(abs(difference))))
@@ -0,0 +1,99 @@
+""" Write the files of a UFO model in the FeynRules format.
+
+Used to produce modified copies of the model (restricted or simplified
+models): the objects written only need the attributes of the corresponding
+UFO class, e.g. name, particles, color, lorentz and couplings for a vertex.
+"""
+
+import collections
+import os
+import shutil
+
+# same attributes as a Vertex, without registering it in all_vertices
+VertexRecord = collections.namedtuple('VertexRecord',
+                               ['name', 'particles', 'color', 'lorentz', 'couplings'])
+
+# not copied with the model: compiled files, caches, generated code and the
+# MG5 pickle, which would not describe the modified model
+ignored_files = ['model.pkl', 'optimized_couplings.py']
+ignored_extensions = ['.pyc', '.pyo']
+ignored_prefixes = ['snapshot_', '.']
+
+def _ignore(directory, names):
+    return [name for name in names if name in ignored_files or
+            os.path.splitext(name)[1] in ignored_extensions or
+            any(name.startswith(prefix) for prefix in ignored_prefixes)]
+
+def copy_model(model_dir, output_dir):
+    """ copy the model directory (output_dir must not exist) """
+    shutil.copytree(model_dir, output_dir, ignore=_ignore)
+
+def read_header(filename):
+    """ the comments and imports at the top of a model file, up to the first
+    object definition """
+
+    lines = []
+    for line in open(filename):
+        if ' = ' in line and not line.startswith(('#', ' ', 'from', 'import')):
+            break
+        lines.append(line)
+    return ''.join(lines)
+
+def format_order(order):
+    return '{%s}' % ','.join("'%s':%s" % (key, order[key]) for key in sorted(order))
+
+def format_coupling(coupling):
+    prefix = '%s = Coupling(' % coupling.name
+    indent = ' ' * len(prefix)
+    return '%sname = \'%s\',\n%svalue = \'%s\',\n%sorder = %s)\n' % (prefix,
+                    coupling.name, indent, coupling.value, indent,
+                    format_order(coupling.order))
+
+def format_lorentz(lorentz):
+    prefix = '%s = Lorentz(' % lorentz.name
+    indent = ' ' * len(prefix)
+    text = '%sname = \'%s\',\n%sspins = [ %s ],\n%sstructure = \'%s\'' % (prefix,
+                    lorentz.name, indent, ', '.join(str(s) for s in lorentz.spins),
+                    indent, lorentz.structure)
+    formfactors = getattr(lorentz, 'formfactors', None)
+    if formfactors:
+        text += ',\n%sformfactors = [ %s ]' % (indent,
+                        ', '.join('ForFac.%s' % repr(f) for f in formfactors))
+    return text + ')\n'
+
+def format_vertex(vertex):
+    prefix = '%s = Vertex(' % vertex.name
+    indent = ' ' * len(prefix)
+    couplings = ','.join('(%d,%d):C.%s' % (key[0], key[1], vertex.couplings[key].name)
+                                               for key in sorted(vertex.couplings))
+    return ('%sname = \'%s\',\n' % (prefix, vertex.name) +
+            '%sparticles = [ %s ],\n' % (indent, ', '.join('P.%s' % repr(p)
+                                                     for p in vertex.particles)) +
+            '%scolor = [ %s ],\n' % (indent, ', '.join("'%s'" % c for c in vertex.color)) +
+            '%slorentz = [ %s ],\n' % (indent, ', '.join('L.%s' % repr(l)
+                                                       for l in vertex.lorentz)) +
+            '%scouplings = {%s})\n' % (indent, couplings))
+
+def write_objects(filename, header, objects, formatter):
+    """ write the header followed by the definition of the objects """
+
+    fsock = open(filename, 'w')
+    fsock.write(header)
+    if not header.endswith('\n\n\n'):
+        fsock.write('\n')
+    for obj in objects:
+        fsock.write(formatter(obj))
+        fsock.write('\n')
+    fsock.close()
+
+def write_couplings(model_dir, couplings):
+    filename = os.path.join(model_dir, 'couplings.py')
+    write_objects(filename, read_header(filename), couplings, format_coupling)
+
+def write_lorentz(model_dir, lorentz):
+    filename = os.path.join(model_dir, 'lorentz.py')
+    write_objects(filename, read_header(filename), lorentz, format_lorentz)
+
+def write_vertices(model_dir, vertices):
+    filename = os.path.join(model_dir, 'vertices.py')
+    write_objects(filename, read_header(filename), vertices, format_vertex)
@@ -7,27 +7,96 @@
 ##
 ##
 
+import array
+import ast
 import cmath
 import re
+import sys
+
+# NumPy is only needed to work on arrays, it is imported on demand to keep
+# the import of the model fast
+numpy = None
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise UFOError('NumPy is required to work on arrays.')
+    return numpy
 
 class UFOError(Exception):
         """Exception raised if when inconsistencies are detected in the UFO model."""
         pass
 
 class UFOBaseClass(object):
-    """The class from which all FeynRules classes are derived."""
+    """The class from which all FeynRules classes are derived.
+
+    Derived classes can declare a fixed layout with __slots__, listing the
+    attributes to expose through get_all() in _fields. Options outside of the
+    fixed layout are kept in a per-object dictionary (created on demand)."""
 
     require_args = []
 
+    __slots__ = ['_options', '_stores']
+    _fields = ()
+
     def __init__(self, *args, **options):
         assert(len(self.require_args) == len (args))
-    
+
+        object.__setattr__(self, '_options', None)
+        object.__setattr__(self, '_stores', None)
+
         for i, name in enumerate(self.require_args):
             setattr(self, name, args[i])
     
         for (option, value) in options.items():
             setattr(self, option, value)
 
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            # not part of the fixed layout
+            if self._options is None:
+                object.__setattr__(self, '_options', {})
+            self._options[name] = value
+
+    def __getattr__(self, name):
+        # only called if the attribute is not found in the fixed layout
+        try:
+            return object.__getattribute__(self, '_options')[name]
+        except (AttributeError, KeyError, TypeError):
+            raise AttributeError("'%s' object has no attribute '%s'" %
+                                                (self.__class__.__name__, name))
+
+    def _get_dict(self):
+        out = {}
+        for name in self._fields:
+            try:
+                out[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        if self._options:
+            out.update(self._options)
+        return out
+
+    # classes without __slots__ have a real __dict__ overriding this one
+    __dict__ = property(_get_dict)
+
+    def __getstate__(self):
+        return self._get_dict()
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_options', None)
+        object.__setattr__(self, '_stores', None)
+        for name, value in state.items():
+            try:
+                object.__setattr__(self, name, value)
+            except AttributeError:
+                self.__setattr__(name, value)
+
     def get(self, name):
         return getattr(self, name)
     
@@ -62,6 +131,100 @@ class UFOBaseClass(object):
 
 
 
+class NumericStore(object):
+    """Array-backed storage of a numerical field of several UFO objects.
+
+    Once the objects are bound, reading or writing obj.<field> accesses one
+    element of store.values, such that the values of all the objects can be
+    read or changed at once (e.g. the external parameters of a scan).
+    Only the fields listed in _numeric_fields of the class can be stored.
+
+        store = NumericStore([p for p in all_parameters
+                                  if p.nature == 'external'], 'value')
+        store.values[:] = new_values
+    """
+
+    def __init__(self, objects, field, dtype=float):
+
+        self.objects = list(objects)
+        self.field = field
+        values = [getattr(obj, field) for obj in self.objects]
+        for obj, value in zip(self.objects, values):
+            if field not in getattr(obj, '_numeric_fields', ()):
+                raise UFOError('%s.%s can not be stored in an array.' %
+                                                 (type(obj).__name__, field))
+            if isinstance(value, str):
+                raise UFOError('%s.%s is not numerical: %s' % (obj.name, field, value))
+        try:
+            self.values = _import_numpy().array(values, dtype=dtype)
+        except UFOError:
+            self.values = array.array('d', [float(v) for v in values])
+
+        for index, obj in enumerate(self.objects):
+            if obj._stores is None:
+                object.__setattr__(obj, '_stores', {})
+                # same layout, with the numerical fields read from the stores
+                object.__setattr__(obj, '__class__', _stored_class(type(obj)))
+            obj._stores[field] = (self, index)
+
+    def release(self):
+        """ copy the values back in the objects and unbind them """
+
+        for index, obj in enumerate(self.objects):
+            if not obj._stores or obj._stores.get(self.field, (None,))[0] is not self:
+                continue
+            del obj._stores[self.field]
+            value = self.values[index]
+            setattr(obj, self.field, value.item() if hasattr(value, 'item') else value)
+            if not obj._stores:
+                object.__setattr__(obj, '_stores', None)
+                object.__setattr__(obj, '__class__', type(obj).__bases__[0])
+
+class _StoredField(object):
+    """ numerical attribute which can be moved to a NumericStore """
+
+    def __init__(self, name, slot):
+        self.name = name
+        self.slot = slot
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            store, index = obj._stores[self.name]
+        except KeyError:
+            return self.slot.__get__(obj, cls)
+        return store.values[index]
+
+    def __set__(self, obj, value):
+        try:
+            store, index = obj._stores[self.name]
+        except KeyError:
+            self.slot.__set__(obj, value)
+        else:
+            store.values[index] = value
+
+_stored_classes = {}
+
+def _stored_class(cls):
+    """ subclass of cls used for the objects bound to a NumericStore. Unbound
+    objects keep the plain slots and their fast attribute access."""
+
+    if cls not in _stored_classes:
+        namespace = {'__slots__': (), '__module__': cls.__module__,
+                     '__reduce_ex__': lambda self, protocol:
+                                    (_restore, (cls, self.__getstate__()))}
+        for name in cls._numeric_fields:
+            namespace[name] = _StoredField(name, getattr(cls, name))
+        _stored_classes[cls] = type(cls.__name__, (cls,), namespace)
+    return _stored_classes[cls]
+
+def _restore(cls, state):
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    return obj
+
+
 all_particles = []
 
 class Particle(UFOBaseClass):
@@ -71,6 +234,14 @@ class Particle(UFOBaseClass):
 
     require_args_all = ['pdg_code', 'name', 'antiname', 'spin', 'color', 'mass', 'width', 'texname', 'antitexname','counterterm','charge', 'line', 'propagating', 'goldstoneboson', 'propagator']
 
+    _fields = ('pdg_code', 'name', 'antiname', 'spin', 'color', 'mass', 'width',
+               'texname', 'antitexname', 'charge', 'line', 'propagating',
+               'goldstoneboson', 'propagator', 'counterterm', 'selfconjugate',
+               'partial_widths')
+    # _anti caches the antiparticle, it is not part of get_all()
+    __slots__ = list(_fields) + ['_anti']
+    _numeric_fields = ('pdg_code', 'spin', 'color', 'charge')
+
     def __init__(self, pdg_code, name, antiname, spin, color, mass, width, texname,
                  antitexname, charge , line=None, propagating=True, counterterm=None, goldstoneboson=False, 
                  propagator=None, **options):
@@ -130,8 +301,19 @@ class Particle(UFOBaseClass):
             return 'dashed' # not supported yet
         
     def anti(self):
+        """ return the antiparticle, only created on the first call (or
+        found in all_particles, e.g. for an unpickled particle) """
         if self.selfconjugate:
             raise Exception('%s has no anti particle.' % self.name) 
+        try:
+            return object.__getattribute__(self, '_anti')
+        except AttributeError:
+            pass
+        for particle in all_particles:
+            if particle.pdg_code == -self.pdg_code and particle.name == self.antiname:
+                self.set_anti(particle)
+                return particle
+
         outdic = {}
         for k,v in self.__dict__.iteritems():
             if k not in self.require_args_all:                
@@ -141,9 +323,15 @@ class Particle(UFOBaseClass):
         else:
             newcolor = -self.color
                 
-        return Particle(-self.pdg_code, self.antiname, self.name, self.spin, newcolor, self.mass, self.width,
+        anti = Particle(-self.pdg_code, self.antiname, self.name, self.spin, newcolor, self.mass, self.width,
                         self.antitexname, self.texname, -self.charge, self.line, self.propagating, self.goldstoneboson, **outdic)
+        self.set_anti(anti)
+        return anti
 
+    def set_anti(self, anti):
+        """ cache the particle/antiparticle pair on both particles """
+        object.__setattr__(self, '_anti', anti)
+        object.__setattr__(anti, '_anti', self)
 
 
 all_parameters = []
@@ -152,6 +340,10 @@ class Parameter(UFOBaseClass):
 
     require_args=['name', 'nature', 'type', 'value', 'texname']
 
+    _fields = ('name', 'nature', 'type', 'value', 'texname', 'lhablock', 'lhacode')
+    __slots__ = list(_fields)
+    _numeric_fields = ('value',)
+
     def __init__(self, name, nature, type, value, texname, lhablock=None, lhacode=None):
 
         args = (name,nature,type,value,texname)
@@ -199,12 +391,95 @@ class CTParameter(UFOBaseClass):
         except KeyError:
             return 'ZERO'
 
+class CTParameterIndex(object):
+    """Index of the CTParameters appearing in the coupling strings.
+
+    The regular expressions are compiled once per CTParameter and the
+    CTParameter of each coupling (and the resulting poles) are computed once,
+    such that Coupling.pole(x) is a dictionary lookup. The index is keyed by
+    the coupling strings and rebuilt when new CTParameters are defined."""
+
+    def __init__(self):
+        self.nparameters = -1
+
+    def build(self):
+        """ (re)build the index for all the couplings """
+
+        self.nparameters = len(all_CTparameters)
+        self.patterns = dict((param.name, re.compile(r"(?P<first>\A|\*|\+|\-|\()(?P<name>"+
+                             param.name+r")(?P<second>\Z|\*|\+|\-|\))")) for param in all_CTparameters)
+        self.parameters = dict((param.name, param) for param in all_CTparameters)
+        # one scan of each coupling to find the candidate CTParameters
+        if self.parameters:
+            names = sorted(self.parameters, key=len, reverse=True)
+            self.candidates = re.compile(r"(?:\A|(?<=[*+\-(]))(%s)(?=\Z|[*+\-)])" %
+                                                '|'.join(re.escape(n) for n in names))
+        else:
+            self.candidates = None
+        self.ctparameter = {}
+        self.poles = {}
+        for coupling in all_couplings:
+            if not isinstance(coupling.value, dict):
+                self.get_ctparameter(coupling.value)
+
+    def get_ctparameter(self, value):
+        """ the CTParameter appearing in the coupling string value, or None """
+
+        if self.nparameters != len(all_CTparameters):
+            self.build()
+        try:
+            return self.ctparameter[value]
+        except KeyError:
+            pass
+
+        CTparam = None
+        if self.candidates:
+            for name in set(self.candidates.findall(value)):
+                numberOfMatches=len(self.patterns[name].findall(value))
+                if numberOfMatches==1:
+                    if not CTparam:
+                        CTparam=self.parameters[name]
+                    else:
+                        raise UFOError, "UFO does not support yet more than one occurence of CTParameters in the couplings values."
+                elif numberOfMatches>1:
+                    raise UFOError, "UFO does not support yet more than one occurence of CTParameters in the couplings values."
+        self.ctparameter[value] = CTparam
+        return CTparam
+
+    def pole(self, value, x):
+        """ the coefficient of the pole 1/eps^x of the coupling string value """
+
+        CTparam = self.get_ctparameter(value)
+        try:
+            return self.poles[(value, x)]
+        except KeyError:
+            pass
+
+        if not CTparam:
+            if x==0:
+                out = value
+            else:
+                out = 'ZERO'
+        elif CTparam.pole(x)=='ZERO':
+            out = 'ZERO'
+        else:
+            def substitution(matchedObj):
+                return matchedObj.group('first')+"("+CTparam.pole(x)+")"+matchedObj.group('second')
+            out = self.patterns[CTparam.name].sub(substitution, value)
+        self.poles[(value, x)] = out
+        return out
+
+ctparameter_index = CTParameterIndex()
+
 all_vertices = []
 
 class Vertex(UFOBaseClass):
 
     require_args=['name', 'particles', 'color', 'lorentz', 'couplings']
 
+    _fields = ('name', 'particles', 'color', 'lorentz', 'couplings')
+    __slots__ = list(_fields)
+
     def __init__(self, name, particles, color, lorentz, couplings, **opt):
  
         args = (name, particles, color, lorentz, couplings)
@@ -241,6 +516,9 @@ class Coupling(UFOBaseClass):
 
     require_args_all=['name', 'value', 'order', 'loop_particles', 'counterterm']
 
+    _fields = ('name', 'value', 'order')
+    __slots__ = list(_fields)
+
     def __init__(self, name, value, order, **opt):
 
         args =(name, value, order)	
@@ -248,9 +526,6 @@ class Coupling(UFOBaseClass):
         global all_couplings
         all_couplings.append(self)
 
-    def value(self):
-        return self.pole(0)
-
     def pole(self, x):
         """ the self.value attribute can be a dictionary directly specifying the Laurent serie using normal
         parameter or just a string which can possibly contain CTparameter defining the Laurent serie."""
@@ -261,38 +536,17 @@ class Coupling(UFOBaseClass):
             else:
                 return 'ZERO'
 
-        CTparam=None
-        for param in all_CTparameters:
-           pattern=re.compile(r"(?P<first>\A|\*|\+|\-|\()(?P<name>"+param.name+r")(?P<second>\Z|\*|\+|\-|\))")
-           numberOfMatches=len(pattern.findall(self.value))
-           if numberOfMatches==1:
-               if not CTparam:
-                   CTparam=param
-               else:
-                   raise UFOError, "UFO does not support yet more than one occurence of CTParameters in the couplings values."
-           elif numberOfMatches>1:
-               raise UFOError, "UFO does not support yet more than one occurence of CTParameters in the couplings values."
-
-        if not CTparam:
-            if x==0:
-                return self.value
-            else:
-                return 'ZERO'
-        else:
-            if CTparam.pole(x)=='ZERO':
-                return 'ZERO'
-            else:
-                def substitution(matchedObj):
-                    return matchedObj.group('first')+"("+CTparam.pole(x)+")"+matchedObj.group('second')
-                pattern=re.compile(r"(?P<first>\A|\*|\+|\-|\()(?P<name>"+CTparam.name+r")(?P<second>\Z|\*|\+|\-|\))")
-                return pattern.sub(substitution,self.value)
+        return ctparameter_index.pole(self.value, x)
 
 all_lorentz = []
 
 class Lorentz(UFOBaseClass):
 
     require_args=['name','spins','structure']
-    
+
+    _fields = ('name', 'spins', 'structure')
+    __slots__ = list(_fields)
+
     def __init__(self, name, spins, structure='external', **opt):
         args = (name, spins, structure)
         UFOBaseClass.__init__(self, *args, **opt)
@@ -303,6 +557,83 @@ class Lorentz(UFOBaseClass):
 
 all_functions = []
 
+class ArrayMath(object):
+    """Element-wise replacement of the cmath module acting on NumPy arrays.
+    Results are always complex, as for cmath."""
+
+    pi = cmath.pi
+    e = cmath.e
+
+    def __init__(self):
+        _import_numpy()
+
+    @staticmethod
+    def _complex(z):
+        return numpy.asarray(z, dtype=complex)
+
+    def sqrt(self, z):
+        return numpy.sqrt(self._complex(z))
+
+    def exp(self, z):
+        return numpy.exp(self._complex(z))
+
+    def log(self, z, base=None):
+        if base is None:
+            return numpy.log(self._complex(z))
+        return numpy.log(self._complex(z)) / numpy.log(self._complex(base))
+
+    def log10(self, z):
+        return numpy.log10(self._complex(z))
+
+    def sin(self, z):
+        return numpy.sin(self._complex(z))
+
+    def cos(self, z):
+        return numpy.cos(self._complex(z))
+
+    def tan(self, z):
+        return numpy.tan(self._complex(z))
+
+    def asin(self, z):
+        return numpy.arcsin(self._complex(z))
+
+    def acos(self, z):
+        return numpy.arccos(self._complex(z))
+
+    def atan(self, z):
+        return numpy.arctan(self._complex(z))
+
+    def sinh(self, z):
+        return numpy.sinh(self._complex(z))
+
+    def cosh(self, z):
+        return numpy.cosh(self._complex(z))
+
+    def tanh(self, z):
+        return numpy.tanh(self._complex(z))
+
+    def phase(self, z):
+        return numpy.angle(z)
+
+def array_complex(real=0., imag=0.):
+    """ complex() accepting arrays """
+    _import_numpy()
+    if numpy.ndim(real) == 0 and numpy.ndim(imag) == 0:
+        return complex(real, imag)
+    return numpy.asarray(real, dtype=complex) + 1j * numpy.asarray(imag)
+
+class _ConditionalToWhere(ast.NodeTransformer):
+    """ rewrite 'a if test else b' into '_where(test, a, b)' """
+
+    conditional = False
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        self.conditional = True
+        call = ast.parse('_where(0, 0, 0)', mode='eval').body
+        call.args = [node.test, node.body, node.orelse]
+        return ast.copy_location(call, node)
+
 class Function(object):
 
     def __init__(self, name, arguments, expression):
@@ -313,13 +644,64 @@ class Function(object):
         self.name = name
         self.arguments = arguments
         self.expr = expression
-    
-    def __call__(self, *opt):
+        self._scalar = None
+        self._array = None
+
+    def _lambda_tree(self):
+        source = 'lambda %s: %s' % (', '.join(self.arguments), self.expr)
+        return ast.parse(source, '<UFO function %s>' % self.name, 'eval')
+
+    def scalar_function(self):
+        """ the expression compiled (once) into a python function """
+
+        if self._scalar is None:
+            namespace = {'cmath': cmath}
+            namespace.update((f.name, f) for f in all_functions)
+            code = compile(self._lambda_tree(), '<UFO function %s>' % self.name, 'eval')
+            self._scalar = eval(code, namespace)
+        return self._scalar
+
+    def array_function(self):
+        """ the expression compiled (once) into a function acting element-wise
+        on NumPy arrays """
+
+        if self._array is None:
+            _import_numpy()
+            namespace = {'cmath': ArrayMath(), 'complex': array_complex,
+                         '_where': numpy.where}
+            namespace.update((f.name, f) for f in all_functions)
+            transformer = _ConditionalToWhere()
+            tree = transformer.visit(self._lambda_tree())
+            code = compile(ast.fix_missing_locations(tree),
+                                       '<UFO function %s>' % self.name, 'eval')
+            function = eval(code, namespace)
+            if transformer.conditional:
+                # numpy.where evaluates both branches, e.g. log(0) for reglog
+                function = self._silent(function)
+            self._array = function
+        return self._array
+
+    @staticmethod
+    def _silent(function):
+        def silent_function(*args):
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                return function(*args)
+        return silent_function
+
+    def __getstate__(self):
+        # the compiled functions are rebuilt on demand
+        state = dict(self.__dict__)
+        state['_scalar'] = state['_array'] = None
+        return state
 
-        for i, arg in enumerate(self.arguments):
-            exec('%s = %s' % (arg, opt[i] ))
+    def __call__(self, *opt):
 
-        return eval(self.expr)
+        if 'numpy' in sys.modules:
+            ndarray = sys.modules['numpy'].ndarray
+            for arg in opt:
+                if isinstance(arg, ndarray):
+                    return self.array_function()(*opt)
+        return self.scalar_function()(*opt)
 
 all_orders = []
 
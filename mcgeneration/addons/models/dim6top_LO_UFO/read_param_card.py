@@ -0,0 +1,212 @@
+""" Reader of param_card.dat files into arrays of the external parameters.
+
+Each 'Block NAME' entry and 'DECAY' line is mapped back to the external
+Parameter of the model with the same lhablock and lhacode. A card becomes
+one row with the external parameters in the order of parameters.py (the
+order of BatchEvaluator), so that many cards give an (N, K) array:
+
+    from read_param_card import read_param_cards
+    sources, values = read_param_cards(['cards.tar.gz', 'gridpacks/'], nproc=8)
+
+Cards are read from files, from directories (all the files named
+*param_card*.dat below them) and from tar or zip archives (e.g. the output
+of write_param_card.write_param_cards). The parameters missing from a card
+take their default value, entries unknown to the model are ignored. Widths
+set to Auto (computed by MadGraph) are NaN, see card_commands.py to compute
+them.
+
+    python read_param_card.py [--nproc=N] [--all] PATH [PATH ...]
+
+prints the parameters which differ between the cards (all of them with
+--all), one line per card.
+"""
+
+import fnmatch
+import os
+import sys
+import tarfile
+import zipfile
+
+import numpy
+
+card_pattern = '*param_card*.dat'
+
+class ParamCardReader(object):
+    """ (block, lhacode) -> column of the external parameters """
+
+    def __init__(self, list_of_parameters=None):
+
+        if list_of_parameters is None:
+            from parameters import all_parameters as list_of_parameters
+        self.parameters = [p for p in list_of_parameters if p.nature == 'external']
+        self.names = [p.name for p in self.parameters]
+        self.defaults = numpy.array([complex(p.value).real for p in self.parameters])
+        self.columns = dict(((p.lhablock.upper(), tuple(p.lhacode)), i)
+                                             for i, p in enumerate(self.parameters))
+        # the same, keyed by the text of the codes as found in the cards
+        self._text_columns = {}
+
+    def column(self, block, codes):
+        """ column of the entry with the lhacode codes (strings) in block,
+        None for entries which are not external parameters """
+
+        key = (block, tuple(codes))
+        if key not in self._text_columns:
+            try:
+                self._text_columns[key] = self.columns.get(
+                                        (block, tuple(int(code) for code in codes)))
+            except ValueError:
+                self._text_columns[key] = None
+        return self._text_columns[key]
+
+    def read(self, text, name='the card'):
+        """ values of the external parameters for the text of a card, name
+        is used in the errors """
+
+        out = self.defaults.copy()
+        block = None
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].split()
+            if not line:
+                continue
+            first = line[0].upper()
+            if first == 'BLOCK':
+                block = line[1].upper()
+                continue
+            elif first == 'DECAY':
+                # the branching ratios which may follow are not parameters
+                block = None
+                column = self.column('DECAY', line[1:-1])
+            elif block is None:
+                continue
+            else:
+                column = self.column(block, line[:-1])
+            if column is not None:
+                out[column] = self.value(line, block, name)
+        return out
+
+    @staticmethod
+    def value(line, block, name):
+        """ number of the last word of a line of block (None for DECAY) """
+
+        try:
+            return float(line[-1])
+        except ValueError:
+            pass
+        if block is None and line[-1].lower().startswith('auto'):
+            return numpy.nan
+        try:
+            # fortran exponent
+            return float(line[-1].upper().replace('D', 'E'))
+        except ValueError:
+            raise ValueError('Invalid value "%s" in %s of %s: %s' % (line[-1],
+                             'Block %s' % block if block else 'DECAY', name, ' '.join(line)))
+
+    def read_file(self, filename):
+        with open(filename) as fsock:
+            return self.read(fsock.read(), filename)
+
+
+def card_sources(path):
+    """ (path, member) of the cards in a file, directory or archive (member
+    is None for plain files) """
+
+    if os.path.isdir(path):
+        out = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(fnmatch.filter(files, card_pattern)):
+                out.append((os.path.join(root, name), None))
+        return out
+    elif zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        return [(path, name) for name in archive.namelist()
+                    if fnmatch.fnmatch(os.path.basename(name), card_pattern)]
+    elif tarfile.is_tarfile(path):
+        archive = tarfile.open(path)
+        return [(path, info.name) for info in archive
+                    if info.isfile() and fnmatch.fnmatch(os.path.basename(info.name),
+                                                         card_pattern)]
+    return [(path, None)]
+
+def source_name(path, member):
+    """ 'path' or 'archive:member' """
+    return path if member is None else '%s:%s' % (path, member)
+
+def _read_texts(sources):
+    """ texts of the cards, opening each archive once """
+
+    out = []
+    archives = {}
+    for path, member in sources:
+        if member is None:
+            with open(path) as fsock:
+                out.append(fsock.read())
+            continue
+        if path not in archives:
+            archives[path] = zipfile.ZipFile(path) if zipfile.is_zipfile(path) \
+                                                   else tarfile.open(path)
+        archive = archives[path]
+        if isinstance(archive, zipfile.ZipFile):
+            text = archive.read(member)
+        else:
+            text = archive.extractfile(member).read()
+        out.append(text.decode() if isinstance(text, bytes) and str is not bytes else text)
+    return out
+
+_reader = None
+
+def _read_chunk(sources):
+    global _reader
+    if _reader is None:
+        _reader = ParamCardReader()
+    return numpy.array([_reader.read(text, source_name(*source))
+                        for source, text in zip(sources, _read_texts(sources))])
+
+def read_param_cards(paths, nproc=1, chunksize=200):
+    """ names of the cards ('path' or 'archive:member') and the (N, K) array
+    of the external parameters, with a pool of nproc processes """
+
+    sources = []
+    for path in paths:
+        sources.extend(card_sources(path))
+    names = [source_name(path, member) for path, member in sources]
+    chunks = [sources[i:i + chunksize] for i in range(0, len(sources), chunksize)]
+    if nproc > 1 and len(chunks) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(nproc)
+        try:
+            values = pool.map(_read_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        values = [_read_chunk(chunk) for chunk in chunks]
+    if not values:
+        return names, numpy.zeros((0, len(ParamCardReader().names)))
+    return names, numpy.concatenate(values)
+
+
+if '__main__' == __name__:
+    nproc = 1
+    show_all = False
+    paths = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--nproc='):
+            nproc = int(arg.split('=', 1)[1])
+        elif arg == '--all':
+            show_all = True
+        else:
+            paths.append(arg)
+    if not paths:
+        sys.exit(__doc__)
+    names, values = read_param_cards(paths, nproc)
+    parameters = ParamCardReader().names
+    if show_all or len(values) < 2:
+        columns = list(range(len(parameters)))
+    else:
+        columns = [i for i in range(len(parameters))
+                   if (values[:, i] != values[0, i]).any()]
+    print(' '.join(['card'] + [parameters[i] for i in columns]))
+    for name, row in zip(names, values):
+        print(' '.join([name] + ['%g' % row[i] for i in columns]))
@@ -0,0 +1,106 @@
+""" Restriction of the model to a subset of the dimension-six operators.
+
+Most productions only switch on a few Wilson coefficients. For a given set
+of non-zero coefficients, this tool writes a copy of the model where
+ - the couplings identically zero are removed from couplings.py,
+ - the vertices are rewired to the remaining couplings (the unused color
+   and Lorentz structures of each vertex are dropped),
+ - the vertices left without any coupling are removed from vertices.py.
+
+    python restrict.py OUTPUT_DIR ctG ctGI ctW ctWI
+
+OUTPUT_DIR must not exist; its name is the name of the model to import in
+MadGraph (e.g. models/dim6top_LO_UFO_ctG_ctW).
+"""
+
+import os
+import sys
+
+import numpy
+
+import model_writer
+from evaluator import BatchEvaluator, is_wilson_coefficient
+
+model_dir = os.path.dirname(os.path.abspath(__file__))
+
+def zero_couplings(active, evaluator=None, npoints=3, seed=12345):
+    """ names of the couplings identically zero when only the Wilson
+    coefficients listed in active are non-zero.
+
+    The couplings are evaluated at random values of the active coefficients
+    (and around the default SM inputs); the coefficients switched off are
+    exactly zero, so are the couplings only depending on them."""
+
+    if evaluator is None:
+        evaluator = BatchEvaluator()
+    coefficients = [p.name for p in evaluator.external if is_wilson_coefficient(p)]
+    unknown = set(active) - set(coefficients)
+    if unknown:
+        raise KeyError('Not Wilson coefficients: %s' % ', '.join(sorted(unknown)))
+
+    random = numpy.random.RandomState(seed)
+    points = evaluator.points(npoints)
+    points *= random.uniform(0.9, 1.1, size=points.shape)
+    for name in coefficients:
+        column = evaluator.index(name)
+        if name in active:
+            points[:, column] = random.uniform(-2., 2., size=npoints)
+        else:
+            points[:, column] = 0.
+    values = evaluator.evaluate(points)
+    return set(name for name, column in zip(evaluator.coupling_names, values.T)
+                                                           if not column.any())
+
+def restrict_vertices(vertices, zero):
+    """ return the vertices without the couplings in zero, with color and
+    Lorentz structures renumbered; vertices without coupling are dropped """
+
+    out = []
+    for vertex in vertices:
+        kept = dict((key, coup) for key, coup in vertex.couplings.items()
+                                                       if coup.name not in zero)
+        if not kept:
+            continue
+        colors = sorted(set(c for c, l in kept))
+        lorentz = sorted(set(l for c, l in kept))
+        couplings = dict(((colors.index(c), lorentz.index(l)), coup)
+                                                for (c, l), coup in kept.items())
+        out.append(model_writer.VertexRecord(vertex.name, vertex.particles,
+                                             [vertex.color[c] for c in colors],
+                                             [vertex.lorentz[l] for l in lorentz],
+                                             couplings))
+    return out
+
+def restrict_model(active, output_dir, vertices=None, couplings=None):
+    """ write the restricted copy of the model in output_dir and return a
+    dictionary summarizing the removed objects """
+
+    if vertices is None:
+        from vertices import all_vertices as vertices
+    if couplings is None:
+        from couplings import all_couplings as couplings
+
+    zero = zero_couplings(active)
+    new_vertices = restrict_vertices(vertices, zero)
+    used = set(coup.name for vertex in new_vertices
+                                            for coup in vertex.couplings.values())
+    new_couplings = [coup for coup in couplings if coup.name in used]
+
+    model_writer.copy_model(model_dir, output_dir)
+    model_writer.write_couplings(output_dir, new_couplings)
+    model_writer.write_vertices(output_dir, new_vertices)
+
+    return {'zero couplings': len(zero),
+            'removed couplings': len(couplings) - len(new_couplings),
+            'removed vertices': len(vertices) - len(new_vertices),
+            'couplings': len(new_couplings),
+            'vertices': len(new_vertices)}
+
+
+if '__main__' == __name__:
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    summary = restrict_model(sys.argv[2:], sys.argv[1])
+    print('%s: %d vertices (%d removed), %d couplings (%d removed, %d identically zero)' %
+          (sys.argv[1], summary['vertices'], summary['removed vertices'],
+           summary['couplings'], summary['removed couplings'], summary['zero couplings']))
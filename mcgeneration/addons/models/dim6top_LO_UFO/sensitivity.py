@@ -0,0 +1,109 @@
+""" Sensitivity scales of the Wilson coefficients, from the couplings.
+
+The scale s_i of a coefficient is the largest relative change of the
+vertices per unit c_i. With the linear decomposition GC = a + B.c (see
+linear.py), each coupling g of a vertex is made dimensionless with a typical
+energy E of the process, |g| E^-d, where d = 4 - (dimensions of the fields)
+- (number of momenta in the Lorentz structure) is its mass dimension. The
+change |B_gi| E^-d is compared to the SM strength of the vertices with the
+same particles (the largest |a| E^-d among them), or, for vertices which
+only exist through the operators (e.g. four-fermion contact vertices), to the
+largest SM three-point strength to the power n - 2 for n particles:
+
+    from sensitivity import sensitivity_scales
+    scales = sensitivity_scales(['ctG', 'ctW', 'cQq81'])   # {name: s_i}
+
+c_i = 1 / s_i changes the vertices by about as much as the SM.
+
+    python sensitivity.py [--energy=GEV] [ctG ctW ...]
+"""
+
+import sys
+
+import numpy
+
+from evaluator import BatchEvaluator
+from dedup import expand
+import linear
+
+def momentum_count(lorentz):
+    """ largest number of momenta P in a term of the Lorentz structure """
+    return max(sum(1 for tensor, _ in term if tensor == 'P')
+               for term in expand(lorentz.structure))
+
+def field_dimension(particle):
+    """ mass dimension of the field: 3/2 for fermions, 1 for bosons """
+    return 1.5 if particle.spin % 2 == 0 else 1.
+
+def coupling_dimensions(list_of_vertices):
+    """ coupling name -> (mass dimension, particles of the vertices) """
+
+    out = {}
+    for vertex in list_of_vertices:
+        fields = sum(field_dimension(p) for p in vertex.particles)
+        key = tuple(sorted(p.pdg_code for p in vertex.particles))
+        for (_, l), coup in vertex.couplings.items():
+            dimension = 4 - fields - momentum_count(vertex.lorentz[l])
+            if coup.name in out:
+                dimension = min(dimension, out[coup.name][0])
+                keys = out[coup.name][1] | set([key])
+            else:
+                keys = set([key])
+            out[coup.name] = (dimension, keys)
+    return out
+
+def sensitivity_scales(coefficients=None, energy=None, sm_values=None,
+                       cache_dir=None, list_of_vertices=None, evaluator=None):
+    """ coefficient name -> sensitivity scale s_i, for the typical energy
+    of the process (2 MT if None) """
+
+    if evaluator is None:
+        evaluator = BatchEvaluator()
+    if list_of_vertices is None:
+        from vertices import all_vertices as list_of_vertices
+    lin = linear.decompose(sm_values, cache_dir, evaluator)
+    if coefficients is None:
+        coefficients = lin.coefficients
+    if energy is None:
+        values = dict(zip(evaluator.external_names, evaluator.default_values()))
+        values.update(sm_values or {})
+        energy = 2 * values['MT']
+
+    dimensions = coupling_dimensions(list_of_vertices)
+    rows = dict((name, i) for i, name in enumerate(lin.couplings))
+    names = [name for name in lin.couplings if name in dimensions]
+    factor = numpy.array([energy ** -dimensions[name][0] for name in names])
+    strength = abs(lin.a[[rows[name] for name in names]]) * factor
+
+    # SM strength of each set of particles
+    sm = {}
+    for name, value in zip(names, strength):
+        for key in dimensions[name][1]:
+            sm[key] = max(sm.get(key, 0.), value)
+    three_point = max(value for key, value in sm.items() if len(key) == 3)
+    reference = numpy.array([min(sm[key] if sm[key] > 0 else three_point ** (len(key) - 2)
+                                 for key in dimensions[name][1]) for name in names])
+
+    B = lin.B.tocsc()[[rows[name] for name in names]].toarray()
+    out = {}
+    for name in coefficients:
+        column = abs(B[:, lin.coefficients.index(name)]) * factor / reference
+        out[name] = column.max()
+    return out
+
+
+if '__main__' == __name__:
+    energy = None
+    names = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--energy='):
+            energy = float(arg.split('=', 1)[1])
+        else:
+            names.append(arg)
+    scales = sensitivity_scales(names or None, energy)
+    for name in sorted(scales, key=scales.get, reverse=True):
+        if scales[name]:
+            print('%-10s %10.4g   c = %.3g for a SM-sized change' % (name, scales[name],
+                                                                      1 / scales[name]))
+        else:
+            print('%-10s %10s   not in the couplings' % (name, 0))
@@ -0,0 +1,221 @@
+""" Fast-start snapshot of the model.
+
+Building the model executes particles.py, parameters.py, couplings.py,
+lorentz.py, vertices.py, ... and creates several hundreds of objects. The
+snapshot stores the fully built object graph in a single pickle whose name
+contains a hash of those source files: a snapshot can therefore never be
+out of date, it is simply rebuilt when one of the files changes.
+
+    import snapshot
+    model = snapshot.load()
+    model.all_vertices, model.all_couplings, ...
+
+    python snapshot.py [--rebuild] [cache_dir]
+"""
+
+import __future__
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import types
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import object_library
+
+# files defining the model, the optional ones might not exist
+source_files = ['object_library.py', 'function_library.py', 'parameters.py',
+                'particles.py', 'couplings.py', 'lorentz.py', 'vertices.py',
+                'coupling_orders.py', 'propagators.py', 'decays.py',
+                'form_factors.py', 'CT_couplings.py', 'CT_vertices.py',
+                'CT_parameters.py']
+
+# name of the list in the snapshot -> (module, required)
+model_lists = [('all_particles', 'particles', True),
+               ('all_parameters', 'parameters', True),
+               ('all_couplings', 'couplings', True),
+               ('all_lorentz', 'lorentz', True),
+               ('all_vertices', 'vertices', True),
+               ('all_orders', 'coupling_orders', True),
+               ('all_functions', 'function_library', True),
+               ('all_propagators', 'propagators', True),
+               ('all_decays', 'decays', False),
+               ('all_form_factors', 'form_factors', False),
+               ('all_CTvertices', 'CT_vertices', False)]
+
+model_dir = os.path.dirname(os.path.abspath(__file__))
+# the package of the model files (empty if they are imported as top-level
+# modules), which is also the one of the classes in the pickle
+package = object_library.__name__.rpartition('.')[0]
+
+class ModelSnapshot(object):
+    """ the all_* lists of the model, as attributes """
+
+    def __init__(self, key, lists):
+        self.key = key
+        for name, value in lists.items():
+            setattr(self, name, value)
+
+class _ModuleReference(object):
+    """ a module in the namespace of a model file, imported again on load """
+
+    def __init__(self, name):
+        self.name = name
+
+def source_hash(path=model_dir):
+    """ hash of the source files of the model, of the python version and of
+    the import name of the model files """
+
+    key = hashlib.sha1(('%s;%s;%s;' % (sys.version_info[:2], pickle.HIGHEST_PROTOCOL,
+                                       object_library.__name__)).encode())
+    for name in source_files:
+        filename = os.path.join(path, name)
+        if not os.path.exists(filename):
+            continue
+        key.update(name.encode())
+        with open(filename, 'rb') as fsock:
+            key.update(fsock.read())
+    return key.hexdigest()
+
+def snapshot_prefix():
+    return 'snapshot_%s' % (package + '_' if package else '')
+
+def snapshot_path(key, cache_dir=None):
+    return os.path.join(cache_dir or model_dir, '%s%s.pkl' % (snapshot_prefix(), key))
+
+def module_name(module):
+    """ name in sys.modules of a model file """
+    return '%s.%s' % (package, module) if package else module
+
+def _namespace(module):
+    """ the attributes of a model file, with the modules as references """
+
+    out = {}
+    for name, value in vars(module).items():
+        if name.startswith('__') or isinstance(value, __future__._Feature):
+            continue
+        if isinstance(value, types.ModuleType):
+            value = _ModuleReference(value.__name__)
+        out[name] = value
+    return out
+
+def build():
+    """ import the model files and return the dictionary of their namespaces """
+
+    modules = {}
+    for name, module, required in model_lists:
+        try:
+            mod = __import__(module, globals(), locals(), [name])
+        except ImportError:
+            if required:
+                raise
+            continue
+        modules[module] = _namespace(mod)
+    return modules
+
+def model_lists_of(modules):
+    """ name -> all_* list of the namespaces of build """
+    return dict((name, modules[module][name]) for name, module, _ in model_lists
+                                                               if module in modules)
+
+def write(modules, path):
+    """ write the snapshot atomically (several jobs may start at once) """
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as fsock:
+            pickle.dump(modules, fsock, pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+def clean(cache_dir=None, keep=None):
+    """ remove the snapshots of older versions of the source files """
+
+    directory = cache_dir or model_dir
+    pattern = re.compile(re.escape(snapshot_prefix()) + r'[0-9a-f]{40}\.pkl$')
+    for name in os.listdir(directory):
+        if pattern.match(name) and os.path.join(directory, name) != keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def register(modules):
+    """ install the namespaces of the snapshot as the model files in
+    sys.modules and fill the (empty) global lists of object_library, as if
+    the model files had been imported """
+
+    installed = []
+    for module, namespace in modules.items():
+        name = module_name(module)
+        if name in sys.modules:
+            continue
+        mod = types.ModuleType(name)
+        mod.__file__ = os.path.join(model_dir, module + '.py')
+        sys.modules[name] = mod
+        if package and package in sys.modules:
+            setattr(sys.modules[package], module, mod)
+        installed.append((mod, namespace))
+    for mod, namespace in installed:
+        for name, value in namespace.items():
+            if isinstance(value, _ModuleReference):
+                __import__(value.name)
+                value = sys.modules[value.name]
+            setattr(mod, name, value)
+
+    for name, value in model_lists_of(modules).items():
+        target = getattr(object_library, name, None)
+        if target is not None and not target:
+            target.extend(value)
+
+def _read(path):
+    """ the namespaces of a snapshot file, None if it cannot be read (e.g.
+    written by an incompatible version) """
+
+    try:
+        with open(path, 'rb') as fsock:
+            return pickle.load(fsock)
+    except Exception:
+        return None
+
+def load(cache_dir=None, rebuild=False):
+    """ return the ModelSnapshot for the current source files, building it
+    if needed. If the directory is not writable, the snapshot is only built
+    in memory. If the model files are already imported, their objects are
+    used."""
+
+    key = source_hash()
+    path = snapshot_path(key, cache_dir)
+    if any(module_name(module) in sys.modules for _, module, _ in model_lists
+                                                 if module != 'function_library'):
+        return ModelSnapshot(key, model_lists_of(build()))
+    modules = _read(path) if not rebuild and os.path.exists(path) else None
+    if modules is not None:
+        register(modules)
+        return ModelSnapshot(key, model_lists_of(modules))
+
+    modules = build()
+    try:
+        write(modules, path)
+    except (IOError, OSError):
+        pass
+    else:
+        clean(cache_dir, keep=path)
+    return ModelSnapshot(key, model_lists_of(modules))
+
+
+if '__main__' == __name__:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    model = load(args[0] if args else None, rebuild='--rebuild' in sys.argv)
+    print('snapshot %s: %s' % (snapshot_path(model.key, args[0] if args else None),
+                ', '.join('%d %s' % (len(getattr(model, name)), name[4:])
+                          for name, _, _ in model_lists if hasattr(model, name))))
@@ -0,0 +1,288 @@
+""" Tree-level two-body partial widths as functions of the Wilson
+coefficients.
+
+The 1 -> 2 decays of a particle are read from the 3-point vertices of the
+model (e.g. t > W+ b with the couplings depending on ctW, ctWI, cpQ3, cptb,
+cptbI). The spin and color sums are computed once, such that the widths are
+quadratic forms of the couplings, evaluated for many points at once:
+
+    from widths import DecayWidths
+    top = DecayWidths('t')
+    top(points)                      # total width, points as for BatchEvaluator
+    top.partial(points)              # {('W+', 'b'): ..., ...}
+
+With the linear decomposition of the couplings (see linear.py) the widths
+are exact quadratic polynomials of the coefficients. WidthTable keeps their
+coefficients and is cached on disk:
+
+    table = top.table(cache_dir='cache')
+    table(table.coefficient_vector(ctW=1.))
+
+    python widths.py [--cache=DIR] PARTICLE [ctW=1. ...]
+
+The points may also change the masses and the other SM parameters: the
+channels (thresholds and kinematics) are built once for each set of values
+of the parameters which are neither Wilson coefficients nor widths. The
+table is computed at the values of parameters.py (or of sm_values). Decays
+with more than two particles (e.g. through four-fermion operators) are not
+included.
+"""
+
+import math
+import os
+import sys
+
+import numpy
+
+from evaluator import BatchEvaluator, is_wilson_coefficient
+from lookup import ModelIndex
+from lorentz_numeric import compile_lorentz
+from matrix_elements import Leg, color_dimensions, color_tensor, external_states, \
+                            unphysical
+import linear
+
+
+class DecayWidths(object):
+    """ two-body partial widths of a particle """
+
+    def __init__(self, particle, sm_values=None, list_of_vertices=None, evaluator=None):
+
+        if evaluator is None:
+            evaluator = BatchEvaluator()
+        self.evaluator = evaluator
+        index = ModelIndex(list_of_vertices=list_of_vertices)
+        self.particle = index.particle(particle)
+
+        defaults = evaluator.default_values()
+        for name, value in (sm_values or {}).items():
+            defaults[evaluator.index(name)] = value
+        internal = evaluator.evaluate_parameters(defaults)[0]
+        self.values = dict(zip(evaluator.external_names, defaults))
+        self.values.update(zip(evaluator.internal_names, internal.real))
+        self.values['ZERO'] = 0.
+        self.sm_values = dict(sm_values or {})
+
+        # the parameters fixing the channels, and the DecayWidths of the
+        # points with other values of them
+        self._fixed_columns = [i for i, p in enumerate(evaluator.external)
+                               if not is_wilson_coefficient(p) and
+                                  p.lhablock.upper() != 'DECAY']
+        self._fixed = tuple(defaults[self._fixed_columns])
+        self._list_of_vertices = list_of_vertices
+        self._others = {}
+
+        mother = self.mass(self.particle)
+        field = index.anti(self.particle)
+        self.channels = []       # (names of the products, coupling names, K)
+        done = set()
+        for vertex in index.vertices_with(field):
+            if len(vertex.particles) != 3:
+                continue
+            products = list(vertex.particles)
+            products.remove(field)
+            key = tuple(sorted(p.pdg_code for p in products))
+            if key in done or any(unphysical(p) for p in products) or \
+               sum(self.mass(p) for p in products) >= mother:
+                continue
+            done.add(key)
+            names, matrix = self._channel(index, field, products)
+            if names:
+                self.channels.append((tuple(p.name for p in products), names, matrix))
+        self._columns = dict((name, i) for i, name in enumerate(evaluator.coupling_names))
+
+    def mass(self, particle):
+        return self.values[particle.mass.name]
+
+    def _channel(self, index, field, products):
+        """ names of the couplings of the decay into products and the matrix
+        K of the quadratic form Gamma = sum g_a K_ab g_b^* """
+
+        mother = self.mass(self.particle)
+        m1, m2 = self.mass(products[0]), self.mass(products[1])
+        momentum = math.sqrt((mother ** 2 - (m1 + m2) ** 2) *
+                             (mother ** 2 - (m1 - m2) ** 2)) / (2 * mother)
+        e1 = math.sqrt(m1 ** 2 + momentum ** 2)
+        e2 = math.sqrt(m2 ** 2 + momentum ** 2)
+        momenta = [numpy.array([[mother, 0., 0., 0.]]),
+                   numpy.array([[e1, 0., 0., momentum]]),
+                   numpy.array([[e2, 0., 0., -momentum]])]
+        legs = [Leg(1, self.particle, field, True),
+                Leg(2, products[0], products[0], False),
+                Leg(3, products[1], products[1], False)]
+        states = [external_states(leg, p, self.mass(leg.particle))
+                                             for leg, p in zip(legs, momenta)]
+        outgoing = [-momenta[0], momenta[1], momenta[2]]
+
+        # amplitude of each coupling, for each helicity and color
+        amplitudes = {}
+        for vertex in index.vertices(*[leg.field for leg in legs]):
+            positions = []
+            for leg in legs:
+                positions.append([i for i, p in enumerate(vertex.particles)
+                                  if p.pdg_code == leg.field.pdg_code and i not in positions][0])
+            dims = [color_dimensions[p.color] for p in vertex.particles]
+            for (c, l), coup in vertex.couplings.items():
+                color = color_tensor(vertex.color[c], dims).transpose(positions).ravel()
+                lorentz = compile_lorentz(vertex.lorentz[l])
+                helicities = []
+                for hel in [(a, b, d) for a in range(len(states[0]))
+                            for b in range(len(states[1])) for d in range(len(states[2]))]:
+                    wfs, moms = [None] * 3, [None] * 3
+                    for i, position in enumerate(positions):
+                        wfs[position] = states[i][hel[i]]
+                        moms[position] = outgoing[i]
+                    helicities.append(lorentz(moms, wfs)[0])
+                term = numpy.outer(helicities, color)
+                amplitudes[coup.name] = amplitudes.get(coup.name, 0) + term
+
+        names = sorted(amplitudes)
+        flat = numpy.array([amplitudes[name].ravel() for name in names])
+        matrix = flat.dot(flat.conj().T)
+        matrix *= momentum / (8 * math.pi * mother ** 2)
+        matrix /= len(states[0]) * color_dimensions[self.particle.color]
+        if products[0] == products[1]:
+            matrix /= 2
+        return names, matrix
+
+    def _at(self, fixed):
+        """ the DecayWidths for the values fixed of the parameters which are
+        neither Wilson coefficients nor widths """
+
+        if fixed == self._fixed:
+            return self
+        if fixed not in self._others:
+            sm_values = dict((self.evaluator.external_names[i], value)
+                             for i, value in zip(self._fixed_columns, fixed))
+            self._others[fixed] = DecayWidths(self.particle, sm_values,
+                                              self._list_of_vertices, self.evaluator)
+        return self._others[fixed]
+
+    def _partial(self, couplings):
+        """ channel -> partial widths for the (N, ncouplings) couplings, with
+        the channels of the values of this object """
+
+        out = {}
+        for products, names, matrix in self.channels:
+            g = couplings[:, [self._columns[name] for name in names]]
+            out[products] = numpy.einsum('na,ab,nb->n', g, matrix, g.conj()).real
+        return out
+
+    def partial(self, points):
+        """ channel -> partial widths for the (N, nexternal) points (0 for
+        the points below the threshold of a channel) """
+
+        points = numpy.atleast_2d(points)
+        couplings = self.evaluator.evaluate(points)
+        sets, inverse = numpy.unique(points[:, self._fixed_columns], axis=0,
+                                     return_inverse=True)
+        out = {}
+        for i, fixed in enumerate(sets):
+            rows = (inverse == i)
+            for products, widths in self._at(tuple(fixed))._partial(couplings[rows]).items():
+                out.setdefault(products, numpy.zeros(len(points)))[rows] = widths
+        return out
+
+    def __call__(self, points):
+        """ total two-body width for the (N, nexternal) points """
+        return sum(self.partial(points).values())
+
+    def table(self, cache_dir=None, lin=None):
+        """ the WidthTable of the particle, computed from the linear
+        decomposition of the couplings (at the same sm_values) """
+
+        path = None
+        if cache_dir:
+            fixed = dict((p.name, self.values[p.name]) for p in self.evaluator.external
+                                                        if not is_wilson_coefficient(p))
+            key = linear.cache_key(self.evaluator, fixed)
+            path = os.path.join(cache_dir, 'widths_%s_%s.npz' % (self.particle.pdg_code, key))
+            if os.path.exists(path):
+                return WidthTable.load(path)
+        if lin is None:
+            lin = linear.decompose(self.sm_values, cache_dir, self.evaluator)
+
+        rows = dict((name, i) for i, name in enumerate(lin.couplings))
+        constant, first, second = [], [], []
+        for products, names, matrix in self.channels:
+            a = lin.a[[rows[name] for name in names]]
+            B = lin.B[[rows[name] for name in names]].toarray()
+            constant.append(a.dot(matrix).dot(a.conj()).real)
+            first.append(2 * B.T.dot(matrix).dot(a.conj()).real)
+            quadratic = B.T.dot(matrix).dot(B.conj()).real
+            second.append((quadratic + quadratic.T) / 2)
+        out = WidthTable(self.particle.name, [products for products, _, _ in self.channels],
+                         lin.coefficients, constant, first, second)
+        if path:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            out.save(path)
+        return out
+
+
+class WidthTable(object):
+    """ partial widths = constant + first.c + c.second.c for the Wilson
+    coefficients c """
+
+    def __init__(self, particle, channels, coefficients, constant, first, second):
+
+        self.particle = particle
+        self.channels = [tuple(products) for products in channels]
+        self.coefficients = list(coefficients)
+        self.constant = numpy.asarray(constant, dtype=float)
+        self.first = numpy.asarray(first, dtype=float).reshape(
+                                        len(self.channels), len(self.coefficients))
+        self.second = numpy.asarray(second, dtype=float).reshape(
+                  len(self.channels), len(self.coefficients), len(self.coefficients))
+
+    def coefficient_vector(self, **values):
+        """ vector of Wilson coefficients, zero if not specified """
+        c = numpy.zeros(len(self.coefficients))
+        for name, value in values.items():
+            c[self.coefficients.index(name)] = value
+        return c
+
+    def partial(self, c):
+        """ (nchannels,) or (N, nchannels) partial widths for a vector of
+        coefficients or an (N, ncoefficients) array """
+
+        c = numpy.asarray(c, dtype=float)
+        return self.constant + numpy.einsum('kj,...j->...k', self.first, c) + \
+               numpy.einsum('...i,kij,...j->...k', c, self.second, c)
+
+    def __call__(self, c):
+        """ total two-body width """
+        return self.partial(c).sum(axis=-1)
+
+    def save(self, path):
+        numpy.savez(path, particle=numpy.array(self.particle),
+                    channels=numpy.array([' '.join(p) for p in self.channels]),
+                    coefficients=numpy.array(self.coefficients),
+                    constant=self.constant, first=self.first, second=self.second)
+
+    @classmethod
+    def load(cls, path):
+        data = numpy.load(path)
+        return cls(str(data['particle']), [str(p).split() for p in data['channels']],
+                   [str(n) for n in data['coefficients']],
+                   data['constant'], data['first'], data['second'])
+
+
+if '__main__' == __name__:
+    cache_dir = None
+    particle = None
+    values = {}
+    for arg in sys.argv[1:]:
+        if arg.startswith('--cache='):
+            cache_dir = arg.split('=', 1)[1]
+        elif '=' in arg:
+            name, value = arg.split('=')
+            values[name] = float(value)
+        else:
+            particle = arg
+    if particle is None:
+        sys.exit(__doc__)
+    table = DecayWidths(particle).table(cache_dir)
+    c = table.coefficient_vector(**values)
+    for products, width in zip(table.channels, table.partial(c)):
+        print('%s > %-12s %.6g' % (table.particle, ' '.join(products), width))
+    print('total width: %.6g' % table(c))
@@ -12,7 +12,7 @@ class ParamCardWriter(object):
     """######################################################################\n"""   
     
     def __init__(self, filename, list_of_parameters=None, generic=False):
-        """write a valid param_card.dat"""
+        """write a valid param_card.dat (filename can also be an open file)"""
         
         if not list_of_parameters:
             from parameters import all_parameters
@@ -24,11 +24,15 @@ class ParamCardWriter(object):
             self.define_not_dep_param(list_of_parameters)
 
         
-        self.fsock = open(filename, 'w')
+        if hasattr(filename, 'write'):
+            self.fsock = filename
+        else:
+            self.fsock = open(filename, 'w')
         self.fsock.write(self.header)
         
         self.write_card(list_of_parameters)
-        self.fsock.close()
+        if self.fsock is not filename:
+            self.fsock.close()
     
     def define_not_dep_param(self, list_of_parameters):
         """define self.dep_mass and self.dep_width in case that they are 
@@ -46,22 +50,15 @@ class ParamCardWriter(object):
     def order_param(obj1, obj2):
         """ order parameter of a given block """
         
-        maxlen = min([len(obj1.lhacode), len(obj2.lhacode)])
-    
-        for i in range(maxlen):
-            if obj1.lhacode[i] < obj2.lhacode[i]:
-                return -1
-            elif obj1.lhacode[i] == obj2.lhacode[i]:
-                return 0
-            else:
-                return 1
-        #identical up to the first finish
-        if len(obj1.lhacode) > len(obj2.lhacode):
-            return 1
-        elif  len(obj1.lhacode) == len(obj2.lhacode):
-            return 0
-        else:
-            return -1
+        key1 = ParamCardWriter.param_key(obj1)
+        key2 = ParamCardWriter.param_key(obj2)
+        return (key1 > key2) - (key1 < key2)
+
+    @staticmethod
+    def param_key(obj):
+        """ sorting key of a parameter in its block: the lhacode, compared
+        element by element, the shorter first if identical up to its end """
+        return tuple(obj.lhacode)
         
     def write_card(self, all_ext_param):
         """ """
@@ -82,7 +79,7 @@ class ParamCardWriter(object):
             self.write_block(lhablock)
             need_writing = [ param for param in all_ext_param if \
                                                      param.lhablock == lhablock]
-            need_writing.sort(self.order_param)
+            need_writing.sort(key=self.param_key)
             [self.write_param(param, lhablock) for param in need_writing]
             
             if self.generic_output:
@@ -115,12 +112,26 @@ class ParamCardWriter(object):
 
 
     
+    def parameter_values(self):
+        """ namespace with the values of all the parameters, evaluated once """
+        
+        if getattr(self, '_namespace', None) is None:
+            import cmath
+            from parameters import all_parameters
+            import function_library
+            namespace = {'cmath': cmath}
+            namespace.update((f.name, f) for f in function_library.all_functions)
+            for parameter in all_parameters:
+                value = parameter.value
+                if isinstance(value, str):
+                    value = eval(value, namespace)
+                namespace[parameter.name] = value
+            self._namespace = namespace
+        return self._namespace
+
     def write_dep_param_block(self, lhablock):
-        import cmath
-        from parameters import all_parameters
         from particles import all_particles
-        for parameter in all_parameters:
-            exec("%s = %s" % (parameter.name, parameter.value))
+        namespace = self.parameter_values()
         text = "##  Not dependent paramater.\n"
         text += "## Those values should be edited following analytical the \n"
         text += "## analytical expression. Some generator could simply ignore \n"
@@ -135,7 +146,7 @@ class ParamCardWriter(object):
 
         for part, param in data:
             if isinstance(param.value, str):
-                value = complex(eval(param.value)).real
+                value = complex(eval(param.value, namespace)).real
             else:
                 value = param.value
             
@@ -201,7 +212,167 @@ class ParamCardWriter(object):
             
         
             
+class CardTemplate(ParamCardWriter):
+    """ the text of a param_card.dat where the values of some parameters
+    are left free: the static blocks are written once, and each card only
+    costs the formatting of the free values """
+
+    marker = '\0'
+
+    def __init__(self, names, list_of_parameters=None, generic=False):
+
+        from cStringIO import StringIO
+        self.names = list(names)
+        self._slots = []
+        text = StringIO()
+        ParamCardWriter.__init__(self, text, list_of_parameters, generic)
+        missing = set(self.names) - set(self._slots)
+        if missing:
+            raise KeyError('Not external parameters: %s' % ' '.join(sorted(missing)))
+        self.chunks = text.getvalue().split(self.marker)
+        self.fsock = self._namespace = None
+        columns = dict((name, i) for i, name in enumerate(self.names))
+        self.columns = [columns[name] for name in self._slots]
+
+    def write_param(self, param, lhablock):
+        if param.name not in self.names:
+            return ParamCardWriter.write_param(self, param, lhablock)
+        self._slots.append(param.name)
+        lhacode=' '.join(['%3s' % key for key in param.lhacode])
+        if lhablock != 'DECAY':
+            text = """  %s %s # %s \n""" % (lhacode, self.marker, param.name)
+        else:
+            text = '''DECAY %s %s \n''' % (lhacode, self.marker)
+        self.fsock.write(text)
+
+    def format(self, values):
+        """ text of the card for the values of the free parameters (in the
+        order of names) """
+        
+        out = [self.chunks[0]]
+        for column, chunk in zip(self.columns, self.chunks[1:]):
+            out.append('%e' % values[column])
+            out.append(chunk)
+        return ''.join(out)
+
+
+_template = None
+
+def _init_worker(template):
+    global _template
+    _template = template
+
+def _format_cards(values):
+    return [_template.format(row) for row in values]
+
+def read_points(filename):
+    """ names and (N, len(names)) values of a table of points: a first line
+    with the parameter names, then one line of values per point """
+
+    import numpy
+    with open(filename) as fsock:
+        names = fsock.readline().strip().lstrip('#').split()
+        values = numpy.loadtxt(fsock, ndmin=2)
+    if values.shape[1] != len(names):
+        raise ValueError('%s: %d names for %d columns' % (filename, len(names),
+                                                                 values.shape[1]))
+    return names, values
+
+def write_param_cards(names, values, output, nproc=1, widths=None,
+                      list_of_parameters=None, generic=False, chunksize=500):
+    """ write one param_card per row of values (N, len(names)) in output: a
+    directory or a single .tar, .tar.gz, .tgz, .tar.bz2 or .zip archive.
+    widths maps width parameters (e.g. 'WT') to functions of the points
+    of all the external parameters, like widths.DecayWidths: the widths are
+    computed with the masses of each point. The cards are formatted by
+    nproc processes and written in order. Return the names of the cards. """
+
+    import numpy
+    values = numpy.atleast_2d(numpy.asarray(values, dtype=float))
+    names = list(names)
+    if widths:
+        scanned = sorted(set(widths) & set(names))
+        if scanned:
+            raise ValueError('Widths both scanned and computed: %s' % ' '.join(scanned))
+        from evaluator import BatchEvaluator
+        evaluator = BatchEvaluator()
+        points = evaluator.points(len(values), **dict(zip(names, values.T)))
+        extra = [(name, function(points)) for name, function in sorted(widths.items())]
+        names += [name for name, width in extra]
+        values = numpy.column_stack([values] + [width for name, width in extra])
+
+    template = CardTemplate(names, list_of_parameters, generic)
+    digits = len(str(max(len(values) - 1, 0)))
+    card_names = ['param_card_%0*d.dat' % (digits, i) for i in range(len(values))]
+    chunks = [values[i:i + chunksize] for i in range(0, len(values), chunksize)]
+
+    if nproc > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(nproc, _init_worker, (template,))
+        texts = pool.imap(_format_cards, chunks)
+    else:
+        _init_worker(template)
+        texts = (_format_cards(chunk) for chunk in chunks)
+
+    import os
+    import tarfile
+    import time
+    import zipfile
+    from cStringIO import StringIO
+    card_iter = iter(card_names)
+    try:
+        if output.endswith('.zip'):
+            archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED)
+            for chunk in texts:
+                for text in chunk:
+                    archive.writestr(next(card_iter), text)
+            archive.close()
+        elif output.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2')):
+            mode = 'w:bz2' if output.endswith('.bz2') else \
+                   'w' if output.endswith('.tar') else 'w:gz'
+            archive = tarfile.open(output, mode)
+            now = time.time()
+            for chunk in texts:
+                for text in chunk:
+                    info = tarfile.TarInfo(next(card_iter))
+                    info.size = len(text)
+                    info.mtime = now
+                    archive.addfile(info, StringIO(text))
+            archive.close()
+        else:
+            if not os.path.isdir(output):
+                os.makedirs(output)
+            for chunk in texts:
+                for text in chunk:
+                    with open(os.path.join(output, next(card_iter)), 'w') as fsock:
+                        fsock.write(text)
+    finally:
+        if nproc > 1:
+            pool.close()
+            pool.join()
+    return card_names
+
+
 if '__main__' == __name__:
-    ParamCardWriter('./param_card.dat', generic=True)
-    print 'write ./param_card.dat'
+    # python write_param_card.py [--scan=POINTS --output=DIR|FILE.tar.gz|FILE.zip
+    #                             [--nproc=N] [--auto-width=t ...]]
+    import sys
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if '=' in arg)
+    if 'scan' in options:
+        auto = [arg.split('=', 1)[1] for arg in sys.argv[1:]
+                                     if arg.startswith('--auto-width=')]
+        widths = {}
+        if auto:
+            from widths import DecayWidths
+            from lookup import model_index
+            for particle in auto:
+                widths[model_index.particle(particle).width.name] = DecayWidths(particle)
+        names, values = read_points(options['scan'])
+        output = options.get('output', 'param_cards')
+        cards = write_param_cards(names, values, output,
+                                  int(options.get('nproc', 1)), widths)
+        print 'write %d cards in %s' % (len(cards), output)
+    else:
+        ParamCardWriter('./param_card.dat', generic=True)
+        print 'write ./param_card.dat'
     
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+""" Import time of the dim6top_LO_UFO model for different access patterns.
+
+Each case runs in a fresh interpreter, the time reported is the median of
+the time spent in the import (interpreter start-up excluded).
+
+    python benchmarks/model_import.py [--repeat=20] [--model=dim6top_LO_UFO]
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     os.pardir, 'addons', 'models')
+
+cases = [
+    ('package only', 'import %(model)s'),
+    ('all_parameters', 'import %(model)s as m; m.all_parameters'),
+    ('all_particles', 'import %(model)s as m; m.all_particles'),
+    ('full model (eager)', 'import %(model)s as m; [getattr(m, n) for n in '
+                           '["all_particles", "all_vertices", "all_couplings", '
+                           '"all_lorentz", "all_parameters", "all_orders", '
+                           '"all_functions", "all_propagators"]]; '
+                           'm.write_param_card; hasattr(m, "all_decays"); '
+                           'hasattr(m, "all_form_factors"); hasattr(m, "all_CTvertices")'),
+    ('snapshot', 'from %(model)s import snapshot; snapshot.load()'),
+    ]
+
+timer = """
+import sys, time
+sys.path.insert(0, %(path)r)
+start = time.time()
+%(code)s
+sys.stdout.write('%%r' %% (time.time() - start))
+"""
+
+def run(code, model):
+    script = timer % {'path': models_dir, 'code': code % {'model': model}}
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return float(output.decode().strip().splitlines()[-1])
+
+def main(repeat=20, model='dim6top_LO_UFO'):
+    # a first run to compile the .pyc files and build the snapshot
+    for _, code in cases:
+        run(code, model)
+    print('%-22s %10s %10s' % ('case', 'median ms', 'min ms'))
+    for name, code in cases:
+        times = sorted(run(code, model) for _ in range(repeat))
+        print('%-22s %10.1f %10.1f' % (name, 1e3 * times[len(times) // 2],
+                                                               1e3 * times[0]))
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:]
+                                                    if arg.startswith('--'))
+    main(int(options.get('repeat', 20)), options.get('model', 'dim6top_LO_UFO'))
@@ -59,46 +59,174 @@ fi
 #generate events
 ./run.sh $nevt $rnum
 
-#reweight if necessary
-if [ -e ./madevent/Cards/reweight_card.dat ]; then
-    echo "reweighting events"
-    mv events.lhe.gz ./madevent/Events/GridRun_${rnum}/unweighted_events.lhe.gz
-    cd madevent
-    echo "0" |./bin/madevent --debug reweight GridRun_${rnum}
-    cd ..
-    mv $LHEWORKDIR/process/madevent/Events/GridRun_${rnum}/unweighted_events.lhe.gz $LHEWORKDIR/process/events.lhe.gz
-fi
+runlabel=GridRun_${rnum}
+pdfsets="PDF_SETS_REPLACE"
+scalevars="--mur=1,2,0.5 --muf=1,2,0.5 --together=muf,mur,dyn --dyn=-1,1,2,3,4"
+
+#split an lhe.gz file into at most n files prefix<i>.lhe.gz with the full header,
+#in one pass: the events are dealt in turn to the files, which are created when
+#they get their first event
+split_lhe() {
+    zcat $1 | awk -v n=$2 -v prefix=$3 '
+        BEGIN { ievent = 0; nfiles = 0 }
+        !body && /^<event[ >]/ { body = 1 }
+        !body { header = header $0 "\n"; next }
+        /<\/LesHouchesEvents>/ { next }
+        /^<event[ >]/ {
+            file = prefix (ievent % n) ".lhe"
+            if (ievent < n) { printf "%s", header > file; nfiles++ }
+            ievent++
+        }
+        { print > file }
+        END { for (i = 0; i < nfiles; i++) print "</LesHouchesEvents>" >> (prefix i ".lhe") }'
+    if ls ${3}*.lhe > /dev/null 2>&1; then
+        gzip ${3}*.lhe
+    fi
+}
 
-domadspin=0
-if [ -f ./madspin_card.dat ] ;then
-    domadspin=1
-    echo "import events.lhe.gz" > madspinrun.dat
-    rnum2=$(($rnum+1000000))
-    echo `echo "set seed $rnum2"` >> madspinrun.dat
-    cat ./madspin_card.dat >> madspinrun.dat
-    cat madspinrun.dat | $LHEWORKDIR/mgbasedir/MadSpin/madspin
+#print the events of lhe.gz files, with the header of the first one
+merge_lhe() {
+    if [ "$#" -eq "0" ]; then
+        return 1
+    fi
+    zcat $1 | sed '/^<event[ >]/,$d'
+    for file in "$@"; do
+        zcat $file | awk '/^<event[ >]/ { body = 1 } body && !/<\/LesHouchesEvents>/'
+    done
+    echo "</LesHouchesEvents>"
+}
+
+#madevent directory for one worker (madevent does not run twice in the same
+#directory): the directories madevent writes in are copied, the others linked.
+#In rwgt, where the reweighting writes the param_card of each point, only the
+#Cards are copied and the compiled matrix elements are linked.
+worker_madevent() {
+    local source=$PWD/madevent
+    local worker=$1
+    mkdir $worker
+    for entry in $source/*; do
+        case "$(basename $entry)" in
+            Events) ;;
+            Cards|HTML) cp -rp $entry $worker/ ;;
+            rwgt)
+                cp -rs $entry $worker/
+                for card in `find $worker/rwgt -path "*/Cards/*" -type l`; do
+                    cp --remove-destination `readlink $card` $card
+                done ;;
+            *)
+                if [ -d $entry ]; then
+                    ln -s $entry $worker/
+                else
+                    cp -p $entry $worker/
+                fi ;;
+        esac
+    done
+    echo "run_mode = 0" >> $worker/Cards/me5_configuration.txt
+}
+
+#reweight if necessary, decay and add the systematics weights to one chunk of
+#events, in the madevent directory of a worker
+process_chunk() {
+    local worker=worker_$1
+    local events=$worker/Events/${runlabel}
+    worker_madevent $worker
+    mkdir -p $events
+    if [ -e $worker/Cards/reweight_card.dat ]; then
+        mv chunk_$1.lhe.gz $events/unweighted_events.lhe.gz
+        (cd $worker && echo "0" | ./bin/madevent --debug reweight ${runlabel}) || return 1
+        mv $events/unweighted_events.lhe.gz $worker/events.lhe.gz
+    else
+        mv chunk_$1.lhe.gz $worker/events.lhe.gz
+    fi
+    local event_file=$worker/events.lhe.gz
+    if [ -f ./madspin_card.dat ]; then
+        echo "import $worker/events.lhe.gz" > $worker/madspinrun.dat
+        echo "set seed $(($rnum+1000000*($1+1)))" >> $worker/madspinrun.dat
+        cat ./madspin_card.dat >> $worker/madspinrun.dat
+        cat $worker/madspinrun.dat | $LHEWORKDIR/mgbasedir/MadSpin/madspin || return 1
+        event_file=$worker/events_decayed.lhe.gz
+    fi
+    mv $event_file $events/events.lhe.gz
+    (cd $worker && echo "systematics ${runlabel} --start_id=1001 --pdf=$pdfsets $scalevars" | ./bin/madevent)
+}
+
+#the events are processed in RWGT_NCPU (ncpu by default) parallel chunks: each
+#chunk is reweighted (with a reweight_card), goes through madspin and systematics
+#in its worker, and the chunks are written once, uncompressed, in
+#cmsgrid_final.lhe. The merged events are in the order of the chunks.
+nchunks=0
+nrwgt=${RWGT_NCPU:-$ncpu}
+if [ "$nrwgt" -gt "1" ]; then
+    split_lhe events.lhe.gz $nrwgt chunk_
+    nchunks=`ls chunk_*.lhe.gz 2> /dev/null | wc -l`
+    if [ "$nchunks" -eq "0" ]; then
+        echo "no events to split, processing them in one pass"
+    fi
 fi
+if [ "$nchunks" -gt "0" ]; then
+    pids=""
+    chunks=""
+    for chunk in `ls chunk_*.lhe.gz | sed 's/chunk_\([0-9]*\).lhe.gz/\1/' | sort -n`; do
+        process_chunk $chunk > worker_$chunk.log 2>&1 &
+        pids="$pids $!"
+        chunks="$chunks worker_${chunk}/Events/${runlabel}/events.lhe.gz"
+    done
+    echo "processing the events in `echo $pids | wc -w` parallel chunks"
+    for pid in $pids; do
+        if ! wait $pid; then
+            echo "%MSG-MG5 error: processing of a chunk failed"
+            cat worker_*.log
+            exit 1
+        fi
+    done
+    for chunk in $chunks; do
+        if [ ! -s $chunk ]; then
+            echo "%MSG-MG5 error: no events in $chunk"
+            cat worker_*.log
+            exit 1
+        fi
+    done
+    merge_lhe $chunks > $LHEWORKDIR/cmsgrid_final.lhe
+    rm -rf worker_* events.lhe.gz
+    cd $LHEWORKDIR
+else
+    #reweight if necessary
+    if [ -e ./madevent/Cards/reweight_card.dat ]; then
+        echo "reweighting events"
+        mv events.lhe.gz ./madevent/Events/${runlabel}/unweighted_events.lhe.gz
+        cd madevent
+        echo "0" |./bin/madevent --debug reweight ${runlabel}
+        cd ..
+        mv $LHEWORKDIR/process/madevent/Events/${runlabel}/unweighted_events.lhe.gz $LHEWORKDIR/process/events.lhe.gz
+    fi
 
-cd $LHEWORKDIR
+    domadspin=0
+    if [ -f ./madspin_card.dat ] ;then
+        domadspin=1
+        echo "import events.lhe.gz" > madspinrun.dat
+        rnum2=$(($rnum+1000000))
+        echo `echo "set seed $rnum2"` >> madspinrun.dat
+        cat ./madspin_card.dat >> madspinrun.dat
+        cat madspinrun.dat | $LHEWORKDIR/mgbasedir/MadSpin/madspin
+    fi
 
-runlabel=GridRun_${rnum}
-event_file=events.lhe.gz
-if [ "$domadspin" -gt "0" ] ; then 
-    event_file=events_decayed.lhe.gz
-fi
-mv process/$event_file process/madevent/Events/${runlabel}/events.lhe.gz
+    cd $LHEWORKDIR
 
-# Add scale and PDF weights using systematics module
-#
-pushd process/madevent
-pdfsets="PDF_SETS_REPLACE"
-scalevars="--mur=1,2,0.5 --muf=1,2,0.5 --together=muf,mur,dyn --dyn=-1,1,2,3,4"
+    event_file=events.lhe.gz
+    if [ "$domadspin" -gt "0" ] ; then 
+        event_file=events_decayed.lhe.gz
+    fi
+    mv process/$event_file process/madevent/Events/${runlabel}/events.lhe.gz
 
-echo "systematics $runlabel --start_id=1001 --pdf=$pdfsets $scalevars" | ./bin/madevent
-popd
+    # Add scale and PDF weights using systematics module
+    #
+    pushd process/madevent
+    echo "systematics $runlabel --start_id=1001 --pdf=$pdfsets $scalevars" | ./bin/madevent
+    popd
 
-mv process/madevent/Events/${runlabel}/events.lhe.gz cmsgrid_final.lhe.gz
-gzip -d cmsgrid_final.lhe.gz
+    mv process/madevent/Events/${runlabel}/events.lhe.gz cmsgrid_final.lhe.gz
+    gzip -d cmsgrid_final.lhe.gz
+fi
 
 ls -l
 echo
@@ -1,6 +1,8 @@
 #!/bin/bash                                                                                                                                                                                                       
 SETUPTAG=( gluontop_rwgt ) 
 MODEL=dim6top_LO_UFO
+# operators of a quadratic reweight_card (tools/reweight_card.py), empty: use the template
+OPERATORS=""
 NSETUPTAG=`echo "scale=0; ${#SETUPTAG[@]} -1 " | bc`
 for ISETUPTAG in `seq 0 ${NSETUPTAG}`; do
   
@@ -11,6 +13,9 @@ for ISETUPTAG in `seq 0 ${NSETUPTAG}`; do
 	for CARD in run_card proc_card customizecards reweight_card; do 
 	    cp -rp addons/cards/${MODEL}_template/${CARD}.dat  addons/cards/${SETUP}/${SETUP}_${CARD}.dat
 	done 
+	if [ -n "${OPERATORS}" ]; then
+	    python tools/reweight_card.py --output=addons/cards/${SETUP}/${SETUP}_reweight_card.dat ${OPERATORS}
+	fi
 	sed -i -e "s|SUBSETUP|${SETUP}|g" addons/cards/${SETUP}/${SETUP}_*.dat 
 	# 15k for LO; 30k for NLO 
 	./submit_gridpack_generation.sh 15000 15000 1nd ${SETUP} addons/cards/${SETUP} 8nh
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+""" Regression checks of the LHE reader and writer of lhe.py.
+
+A small file with the features of the MadGraph outputs (a header with
+tags starting with <event, event attributes, <mgrwt>, reweights, comments)
+is written in a temporary directory, and each check raises an
+AssertionError when the results change:
+
+    copy        copies are byte-identical, gzipped or not, for any batch size
+    arrays      the arrays of the batches hold the numbers of the events
+    formats     the events written with the formats of the writer instead
+                of the lines read are identical to the MadGraph lines
+    modified    the modified events are written with the new numbers and
+                read back identically
+    selection   the events selected from the batches are written as read
+
+    python tools/check_lhe.py [copy arrays formats modified selection]
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy
+
+from lhe import LHEReader, LHEWriter, open_file
+
+header = b"""<LesHouchesEvents version="3.0">
+<header>
+<MGVersion>
+2.6.0
+</MGVersion>
+<initrwgt>
+<weightgroup name="mg_reweighting">
+<weight id="ctg_1"> set param_card dim6 ctG 1.0 </weight>
+<weight id="ctg_m1"> set param_card dim6 ctG -1.0 </weight>
+</weightgroup>
+</initrwgt>
+<eventgroup_note> not an event </eventgroup_note>
+</header>
+<init>
+2212 2212 6.500000e+03 6.500000e+03 0 0 247000 247000 -4 1
+5.1e+02 1.2e+00 5.1e+02 1
+</init>
+"""
+
+def event_text(i):
+    """ the lines of a g g > t t~ event, with attributes every other event """
+
+    weight = (-1) ** i * 511.7
+    opening = b'<event npLO=" -1 " npNLO=" -1 ">\n' if i % 2 else b'<event>\n'
+    lines = [b' 4      1 %+13.7e %14.8e %14.8e %14.8e' % (weight, 170. + i, 7.546771e-03, 0.1079),
+             b'       21 -1    0    0  502  501 +0.0000000000e+00 +0.0000000000e+00 '
+             b'+%.10e %.10e 0.0000000000e+00 0.0000e+00 -1.0000e+00' % (300. + i, 300. + i),
+             b'       21 -1    0    0  501  503 -0.0000000000e+00 -0.0000000000e+00 '
+             b'-%.10e %.10e 0.0000000000e+00 0.0000e+00 1.0000e+00' % (250. + i, 250. + i),
+             b'        6  1    1    2  502    0 +%.10e -4.3210000000e+01 '
+             b'+5.0000000000e+01 %.10e 1.7300000000e+02 0.0000e+00 1.0000e+00' % (
+                 10. + i, 0.5 * (550. + 2 * i)),
+             b'       -6  1    1    2    0  503 -%.10e +4.3210000000e+01 '
+             b'-0.0000000000e+00 %.10e 1.7300000000e+02 0.0000e+00 -1.0000e+00' % (
+                 10. + i, 0.5 * (550. + 2 * i)),
+             b'# a comment line %d' % i,
+             b'<mgrwt>',
+             b'<rscale>  0 0.17000000E+03</rscale>',
+             b'</mgrwt>',
+             b'<rwgt>',
+             b"<wgt id='ctg_1'> %+.7e </wgt>" % (1.5 * weight),
+             b"<wgt id='ctg_m1'> %+.7e </wgt>" % (0.7 * weight),
+             b'</rwgt>',
+             b'</event>']
+    return opening + b''.join(line + b'\n' for line in lines)
+
+def write_events(directory, nevents=7):
+    """ the same events in events.lhe and events.lhe.gz """
+
+    text = header + b''.join(event_text(i) for i in range(nevents)) + \
+           b'</LesHouchesEvents>\n'
+    names = [os.path.join(directory, name) for name in ('events.lhe', 'events.lhe.gz')]
+    for name in names:
+        with open_file(name, 'wb') as fsock:
+            fsock.write(text)
+    return names
+
+def read_all(filename, batch):
+    with LHEReader(filename, batch) as events:
+        return events.header, list(events)
+
+def copy(filename, output, batch, change=None):
+    with LHEReader(filename, batch) as events, LHEWriter(output, events.header) as out:
+        for events_batch in events:
+            if change is not None:
+                events_batch = change(events_batch)
+            out.write(events_batch)
+
+def file_bytes(filename):
+    with open_file(filename) as fsock:
+        return fsock.read()
+
+#=============================================================================
+# checks
+#=============================================================================
+
+def check_copy(directory, files):
+    for filename in files:
+        for batch in (1, 3, 7, 100):
+            for output in ('copy.lhe', 'copy.lhe.gz'):
+                output = os.path.join(directory, output)
+                copy(filename, output, batch)
+                if file_bytes(output) != file_bytes(filename):
+                    raise AssertionError('copy of %s with batches of %d differs' %
+                                         (os.path.basename(filename), batch))
+    return '%d files, batches of 1 to 100 events' % len(files)
+
+def check_arrays(directory, files):
+    head, batches = read_all(files[0], 3)
+    if head != header:
+        raise AssertionError('header differs')
+    if [len(batch) for batch in batches] != [3, 3, 1]:
+        raise AssertionError('batches of %s events' % [len(batch) for batch in batches])
+    weight = numpy.concatenate([batch.weight for batch in batches])
+    expected = numpy.array([(-1) ** i * 511.7 for i in range(7)])
+    if not numpy.allclose(weight, expected, rtol=1e-7):
+        raise AssertionError('event weights %s' % weight)
+    for batch in batches:
+        if batch.weight_names != ['ctg_1', 'ctg_m1']:
+            raise AssertionError('weight names %s' % batch.weight_names)
+        if not numpy.allclose(batch.weights, batch.weight[:, None] * [1.5, 0.7], rtol=1e-7):
+            raise AssertionError('named weights %s' % batch.weights)
+        if (batch.pdg != [21, 21, 6, -6]).any() or (batch.status != [-1, -1, 1, 1]).any():
+            raise AssertionError('particles %s %s' % (batch.pdg, batch.status))
+    momenta = numpy.concatenate([batch.momenta for batch in batches])
+    if not numpy.allclose(momenta[:, 0] + momenta[:, 1], momenta[:, 2] + momenta[:, 3]):
+        raise AssertionError('momentum conservation of the momenta')
+    if not numpy.allclose(momenta[:, 0, 3], 300. + numpy.arange(7)):
+        raise AssertionError('pz of the first parton %s' % momenta[:, 0, 3])
+    return '7 events, 2 named weights'
+
+def check_formats(directory, files):
+    def formatted(batch):
+        batch.texts = None
+        return batch
+    output = os.path.join(directory, 'formatted.lhe')
+    copy(files[0], output, 3, formatted)
+    if file_bytes(output) != file_bytes(files[0]):
+        raise AssertionError('the formatted events differ from the lines read')
+    return 'identical to the lines read'
+
+def check_modified(directory, files):
+    def change(batch):
+        batch.particles[::2, :, 6] *= -1
+        batch.info[::2, 2] *= 2
+        batch.weights[::2] *= 3
+        return batch
+    output = os.path.join(directory, 'modified.lhe.gz')
+    copy(files[1], output, 2, change)
+    head, expected = read_all(files[1], 7)
+    head, batches = read_all(output, 7)
+    expected, batch = change(expected[0]), batches[0]
+    if not (numpy.allclose(batch.particles, expected.particles, rtol=1e-10) and
+            numpy.allclose(batch.info, expected.info, rtol=1e-7) and
+            numpy.allclose(batch.weights, expected.weights, rtol=1e-7)):
+        raise AssertionError('the modified events are not read back')
+    if batch.extras != expected.extras or batch.openings != expected.openings:
+        raise AssertionError('the other lines of the modified events differ')
+    return 'modified events read back'
+
+def check_selection(directory, files):
+    output = os.path.join(directory, 'selection.lhe')
+    with LHEReader(files[0], 2) as events, LHEWriter(output, events.header) as out:
+        for batch in events:
+            out.write(batch[batch.weight > 0])
+    expected = header + b''.join(event_text(i) for i in range(0, 7, 2)) + \
+               b'</LesHouchesEvents>\n'
+    if file_bytes(output) != expected:
+        raise AssertionError('the selected events differ from the events read')
+    return '4 of 7 events'
+
+checks = [('copy', check_copy), ('arrays', check_arrays), ('formats', check_formats),
+          ('modified', check_modified), ('selection', check_selection)]
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or [name for name, _ in checks]
+    if set(names) - set(name for name, _ in checks):
+        sys.exit(__doc__)
+    directory = tempfile.mkdtemp()
+    failed = 0
+    try:
+        files = write_events(directory)
+        for name, check in checks:
+            if name not in names:
+                continue
+            try:
+                result = check(directory, files)
+            except Exception as error:
+                failed += 1
+                print('%-10s FAILED: %s: %s' % (name, error.__class__.__name__, error))
+            else:
+                print('%-10s ok (%s)' % (name, result))
+    finally:
+        shutil.rmtree(directory)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+""" Per-event coefficients of the quadratic dependence on the operators.
+
+After the reweighting in runcmsgrid_LO.sh each event of cmsgrid_final.lhe
+has one <wgt> per rwgt_name of the reweight_card. The points of the card
+(from reweight_card.py or reweight_points.py) fix the coefficients of
+
+    w(c) = sum_t C_t m_t(c),   m_t in 1, c_i, c_i c_j (i <= j)
+
+for each event. The events are streamed in batches, the fit of a batch is
+one matrix product with the pseudo-inverse of the design matrix, and each
+coefficient is appended to its own .npy file in the output directory, which
+also holds metadata.json (operators, terms, files, points):
+
+    python tools/eft_coefficients.py [--batch=100000] cmsgrid_final.lhe[.gz]
+                                     reweight_card.dat OUTPUT_DIR
+
+Analysis jobs map the columns without parsing the events again:
+
+    from eft_coefficients import load, evaluate
+    metadata, columns = load('OUTPUT_DIR')          # numpy memmaps
+    w = evaluate(metadata, columns, ctG=0.5, ctW=-1.)
+
+Every point of the card is expected to set the operators it uses, the ones
+not set are 0.
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import shlex
+import struct
+import sys
+
+import numpy
+
+from lhe import LHEReader
+from reweight_card import design_matrix, quadratic_terms
+
+def read_points(lines):
+    """ names, points ({operator: value}) and operators of the launch
+    blocks of a reweight_card """
+
+    names, points, operators = [], [], []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        words = shlex.split(line)
+        if words[0] == 'launch':
+            name = [word.split('=', 1)[1] for word in words[1:]
+                                           if word.startswith('--rwgt_name=')]
+            if not name:
+                raise ValueError('Reweight points need a --rwgt_name: %s' % line)
+            names.append(name[0])
+            points.append({})
+        elif words[0] == 'set' and points:
+            if len(words) != 3:
+                raise ValueError('Only "set OPERATOR VALUE" is supported: %s' % line)
+            points[-1][words[1]] = float(words[2])
+            if words[1] not in operators:
+                operators.append(words[1])
+    return names, points, operators
+
+def term_names(operators):
+    """ names of the terms of quadratic_terms, also used for the files """
+    return ['_'.join(operators[i] for i in term) or 'sm'
+            for term in quadratic_terms(operators)]
+
+def fit_matrix(points, operators):
+    """ (nterms, npoints) matrix giving the coefficients from the weights
+    of the points """
+
+    design = design_matrix(points, operators)
+    if numpy.linalg.matrix_rank(design) < design.shape[1]:
+        raise ValueError('The %d points do not fix the %d coefficients of %d operators'
+                         % (design.shape[0], design.shape[1], len(operators)))
+    return numpy.linalg.pinv(design)
+
+def weight_batches(filename, names, batch=100000):
+    """ (n, len(names)) arrays of the weights named names, batch events at
+    a time """
+
+    with LHEReader(filename, batch) as events:
+        for weights in events:
+            yield weights.named_weights(names)
+
+
+class NpyColumn(object):
+    """ .npy file of float64 values written by appending batches. The header
+    has a fixed size and is rewritten with the final shape on close. """
+
+    header_size = 128
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.fsock = open(path, 'wb')
+        self._header()
+
+    def _header(self):
+        text = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d,), }" % self.size
+        text = text.ljust(self.header_size - 11) + '\n'
+        self.fsock.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(text)) +
+                         text.encode('latin1'))
+
+    def append(self, values):
+        values = numpy.ascontiguousarray(values, dtype='<f8')
+        self.fsock.write(values.tobytes())
+        self.size += len(values)
+
+    def close(self):
+        self.fsock.seek(0)
+        self._header()
+        self.fsock.close()
+
+
+def extract(events, card, output, batch=100000):
+    """ write the coefficients of the events in the output directory,
+    return the number of events """
+
+    with open(card) as fsock:
+        names, points, operators = read_points(fsock)
+    fit = fit_matrix(points, operators)
+    terms = term_names(operators)
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    files = [term + '.npy' for term in terms]
+    columns = [NpyColumn(os.path.join(output, name)) for name in files]
+    try:
+        for weights in weight_batches(events, names, batch):
+            coefficients = weights.dot(fit.T)
+            for column, values in zip(columns, coefficients.T):
+                column.append(values)
+    finally:
+        for column in columns:
+            column.close()
+    metadata = {'operators': operators, 'terms': terms, 'files': files,
+                'events': columns[0].size, 'source': os.path.abspath(events),
+                'points': dict(zip(names, points))}
+    with open(os.path.join(output, 'metadata.json'), 'w') as fsock:
+        json.dump(metadata, fsock, indent=1, sort_keys=True)
+    return columns[0].size
+
+def load(output, mmap_mode='r'):
+    """ metadata and term -> memory-mapped coefficients of an output
+    directory of extract """
+
+    with open(os.path.join(output, 'metadata.json')) as fsock:
+        metadata = json.load(fsock)
+    columns = dict((term, numpy.load(os.path.join(output, name), mmap_mode=mmap_mode))
+                   for term, name in zip(metadata['terms'], metadata['files']))
+    return metadata, columns
+
+def evaluate(metadata, columns, **values):
+    """ weights of the events for the values of the operators (0 if not
+    given) """
+
+    operators = metadata['operators']
+    unknown = set(values) - set(operators)
+    if unknown:
+        raise ValueError('Operators not in the fit: %s' % ' '.join(sorted(unknown)))
+    monomials = design_matrix([values], operators)[0]
+    out = numpy.zeros(metadata['events'])
+    for term, monomial in zip(metadata['terms'], monomials):
+        if monomial:
+            out += monomial * columns[term]
+    return out
+
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:]
+                                                    if arg.startswith('--'))
+    arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(arguments) != 3:
+        sys.exit(__doc__)
+    nevents = extract(arguments[0], arguments[1], arguments[2],
+                      int(options.get('batch', 100000)))
+    print('coefficients of %d events written in %s' % (nevents, arguments[2]))
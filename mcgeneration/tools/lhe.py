@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+""" Streaming reader and writer of LHE files, in batches of events.
+
+The events of a .lhe or .lhe.gz file are read batch events at a time, such
+that the memory does not depend on the size of the file. Each batch holds
+numpy arrays, padded to the largest number of particles of the batch:
+
+    from lhe import LHEReader, LHEWriter
+    with LHEReader('cmsgrid_final.lhe.gz', batch=10000) as events:
+        for batch in events:
+            batch.momenta       # (n, m, 4) E, px, py, pz
+            batch.pdg           # (n, m), 0 beyond batch.nparticles
+            batch.status
+            batch.weight        # (n,) XWGTUP
+            batch.weights       # (n, nweights), named batch.weight_names
+
+The lines of each event which are neither particles nor reweights (e.g.
+<mgrwt>, <scales>, comments) are kept, such that LHEWriter writes the events
+back with the header of the reader. The events whose particles are not
+modified are written with the lines read, a copy is identical to the input:
+
+    with LHEReader('in.lhe.gz') as events, LHEWriter('out.lhe.gz', events.header) as out:
+        for batch in events:
+            out.write(batch[batch.weight > 0])
+
+    python tools/lhe.py [--batch=10000] EVENTS.lhe[.gz] [OUTPUT.lhe[.gz]]
+
+prints the number of events and the weights of a file, and copies it to
+OUTPUT.
+"""
+
+from __future__ import print_function
+
+import gzip
+import re
+import sys
+import time
+
+import numpy
+
+# the columns of the particle lines
+particle_columns = ['pdg', 'status', 'mother1', 'mother2', 'color1', 'color2',
+                    'px', 'py', 'pz', 'E', 'mass', 'lifetime', 'spin']
+# the opening tags of the events, <event> or <event with attributes>
+event_pattern = re.compile(br'^<event[ >]', re.M)
+weight_pattern = re.compile(br"<wgt id=['\"]?([^'\">]+)['\"]?>\s*([^<\s]+)\s*</wgt>")
+
+def open_file(filename, mode='rb', compresslevel=6):
+    """ binary file object, gzipped if the name ends with .gz """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode, compresslevel)
+    return open(filename, mode)
+
+def parse_numbers(lines, columns):
+    """ (len(lines), columns) array of the numbers of the lines """
+    if not lines:
+        return numpy.zeros((0, columns))
+    return numpy.fromstring(b' '.join(lines), sep=' ').reshape(len(lines), columns)
+
+
+class EventBatch(object):
+    """ arrays of a batch of events """
+
+    def __init__(self, nparticles, info, particles, weight_names, weights,
+                 openings=None, extras=None, texts=None):
+        """ info is the (n, 6) array of the event lines, particles the
+        (n, m, 13) array of the particle lines, weights the (n, nweights)
+        array of the reweights named weight_names. texts are the lines read
+        for info and particles, written back as they are for the events
+        whose info and particles are not modified. """
+
+        self.nparticles = numpy.asarray(nparticles, dtype=int)
+        self.info = numpy.asarray(info, dtype=float).reshape(len(self.nparticles), 6)
+        self.particles = numpy.asarray(particles, dtype=float).reshape(
+                                                    len(self.nparticles), -1, 13)
+        self.weight_names = list(weight_names)
+        self.weights = numpy.asarray(weights, dtype=float).reshape(
+                                          len(self.nparticles), len(self.weight_names))
+        self.openings = openings if openings is not None else [b'<event>\n'] * len(self)
+        self.extras = extras if extras is not None else [b''] * len(self)
+        self.texts = texts
+        if texts is not None:
+            self._read = (self.info.copy(), self.particles.copy())
+
+    def __len__(self):
+        return len(self.nparticles)
+
+    def __getitem__(self, index):
+        """ the events selected by a slice, mask or indices """
+        selection = numpy.arange(len(self))[index]
+        out = EventBatch(self.nparticles[selection], self.info[selection],
+                         self.particles[selection], self.weight_names,
+                         self.weights[selection],
+                         [self.openings[i] for i in selection],
+                         [self.extras[i] for i in selection])
+        if self.texts is not None:
+            out.texts = [self.texts[i] for i in selection]
+            out._read = (self._read[0][selection], self._read[1][selection])
+        return out
+
+    def unchanged(self):
+        """ mask of the events with the info and particles of texts """
+        if self.texts is None:
+            return numpy.zeros(len(self), dtype=bool)
+        return (self.info == self._read[0]).all(axis=1) & \
+               (self.particles == self._read[1]).all(axis=(1, 2))
+
+    def column(self, name):
+        return self.particles[:, :, particle_columns.index(name)]
+
+    @property
+    def pdg(self):
+        return self.column('pdg').astype(int)
+
+    @property
+    def status(self):
+        return self.column('status').astype(int)
+
+    @property
+    def momenta(self):
+        return self.particles[:, :, [9, 6, 7, 8]]
+
+    @property
+    def weight(self):
+        return self.info[:, 2]
+
+    @property
+    def scale(self):
+        return self.info[:, 3]
+
+    @property
+    def alpha_s(self):
+        return self.info[:, 5]
+
+    def named_weights(self, names):
+        """ (n, len(names)) weights with the given names """
+        try:
+            columns = [self.weight_names.index(name) for name in names]
+        except ValueError:
+            raise ValueError('Weights missing in the events: %s' % ' '.join(
+                          name for name in names if name not in self.weight_names))
+        return self.weights[:, columns]
+
+
+class LHEReader(object):
+    """ iterator over the EventBatch of a file """
+
+    chunk_size = 1 << 22
+
+    def __init__(self, filename, batch=10000):
+        self.filename = filename
+        self.batch = batch
+        self.fsock = open_file(filename)
+        self.weight_names = None
+        buffer = b''
+        while True:
+            chunk = self.fsock.read(self.chunk_size)
+            buffer += chunk
+            match = event_pattern.search(buffer)
+            if match or not chunk:
+                break
+        if match is None:
+            # no events
+            first = buffer.find(b'</LesHouchesEvents>')
+            first = len(buffer) if first < 0 else first
+        else:
+            first = match.start()
+        self.header = buffer[:first]
+        self._buffer = buffer[first:]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.fsock.close()
+
+    def __iter__(self):
+        """ the events are read by chunks of the file, split at </event> """
+
+        buffer, self._buffer = self._buffer, b''
+        infos, particles, counts, openings, extras, wgts, texts = [], [], [], [], [], [], []
+        while True:
+            chunk = self.fsock.read(self.chunk_size)
+            buffer += chunk
+            blocks = buffer.split(b'</event>')
+            buffer = blocks.pop()
+            for block in blocks:
+                lines = block[event_pattern.search(block).start():].split(b'\n')
+                count = int(lines[1].split(None, 1)[0])
+                openings.append(lines[0] + b'\n')
+                texts.append(b'\n'.join(lines[1:count + 2]) + b'\n')
+                infos.append(lines[1])
+                counts.append(count)
+                particles.extend(lines[2:count + 2])
+                extra = b'\n'.join(lines[count + 2:])
+                begin = extra.find(b'<rwgt>')
+                if begin >= 0:
+                    end = extra.find(b'</rwgt>', begin)
+                    wgts.append(extra[begin:end])
+                    extra = extra[:begin] + extra[end + 7:]
+                extras.append(b''.join(line + b'\n' for line in extra.split(b'\n')
+                                                           if line.strip()))
+                if len(counts) == self.batch:
+                    yield self._batch(counts, infos, particles, wgts, openings, extras, texts)
+                    infos, particles, counts, openings, extras, wgts, texts = \
+                                                              [], [], [], [], [], [], []
+            if not chunk:
+                break
+        if counts:
+            yield self._batch(counts, infos, particles, wgts, openings, extras, texts)
+
+    def _batch(self, counts, infos, particles, wgts, openings, extras, texts):
+        counts = numpy.array(counts, dtype=int)
+        flat = parse_numbers(particles, 13)
+        padded = numpy.zeros((len(counts), counts.max() if len(counts) else 0, 13))
+        offsets = numpy.concatenate([[0], numpy.cumsum(counts)[:-1]])
+        rows = numpy.repeat(numpy.arange(len(counts)), counts)
+        padded[rows, numpy.arange(len(flat)) - numpy.repeat(offsets, counts)] = flat
+
+        pairs = weight_pattern.findall(b''.join(wgts))
+        if self.weight_names is None:
+            # the names of the first event
+            first = len(pairs) // len(counts) if len(counts) else 0
+            self.weight_names = [name.decode() for name, _ in pairs[:first]]
+        nweights = len(self.weight_names)
+        names = [name.encode() for name in self.weight_names]
+        if [name for name, _ in pairs] != names * len(counts):
+            raise ValueError('The events of %s do not all have the weights %s, in '
+                             'this order' % (self.filename, ' '.join(self.weight_names)))
+        weights = numpy.array([value for _, value in pairs], dtype=float)
+        return EventBatch(counts, parse_numbers(infos, 6), padded, self.weight_names,
+                          weights.reshape(len(counts), nweights), openings, extras, texts)
+
+
+class LHEWriter(object):
+    """ writes EventBatch objects after a header """
+
+    event_format = b'%2d %6d %+13.7e %14.8e %14.8e %14.8e\n'
+    particle_format = b'%9d %2d %4d %4d %4d %4d %+.10e %+.10e %+.10e %.10e %.10e ' \
+                      b'%.4e %.4e\n'
+
+    def __init__(self, filename, header, compresslevel=6):
+        self.filename = filename
+        self.fsock = open_file(filename, 'wb', compresslevel)
+        self.fsock.write(header)
+        self.nevents = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.fsock is not None:
+            self.fsock.write(b'</LesHouchesEvents>\n')
+            self.fsock.close()
+            self.fsock = None
+
+    def write(self, batch):
+        """ the events which are not modified are written with the lines
+        read, the others with one format per event """
+
+        rwgt = b''
+        if batch.weight_names:
+            rwgt = b'<rwgt>\n' + b''.join(b"<wgt id='" + name.replace('%', '%%').encode() +
+                                         b"'> %+.7e </wgt>\n" for name in batch.weight_names) + \
+                   b'</rwgt>\n'
+        unchanged = batch.unchanged()
+        changed = numpy.nonzero(~unchanged)[0]
+        info = dict(zip(changed, batch.info[changed].tolist()))
+        particles = batch.particles.reshape(len(batch), batch.particles.shape[1] * 13)
+        particles = dict(zip(changed, particles[changed].tolist()))
+        weights = batch.weights.tolist()
+        out = []
+        for i, count in enumerate(batch.nparticles.tolist()):
+            out.append(batch.openings[i])
+            if unchanged[i]:
+                out.append(batch.texts[i])
+            else:
+                out.append(self.event_format % tuple(info[i]))
+                out.append((self.particle_format * count) % tuple(particles[i][:13 * count]))
+            out.append(batch.extras[i])
+            if rwgt:
+                out.append(rwgt % tuple(weights[i]))
+            out.append(b'</event>\n')
+        self.fsock.write(b''.join(out))
+        self.nevents += len(batch)
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:]
+                                                    if arg.startswith('--'))
+    arguments = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if len(arguments) not in (1, 2):
+        sys.exit(__doc__)
+    start = time.time()
+    nevents = 0
+    total = 0.
+    with LHEReader(arguments[0], int(options.get('batch', 10000))) as events:
+        out = LHEWriter(arguments[1], events.header) if len(arguments) == 2 else None
+        for batch in events:
+            nevents += len(batch)
+            total += batch.weight.sum()
+            if out:
+                out.write(batch)
+        if out:
+            out.close()
+    print('%d events, sum of the weights %g, %d named weights (%.1f s)' % (
+          nevents, total, len(events.weight_names or []), time.time() - start))
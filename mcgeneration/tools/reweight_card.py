@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+""" Minimal reweight_card.dat for the quadratic dependence on N operators.
+
+At LO with one insertion of the operators, the weight of an event is a
+quadratic function of the Wilson coefficients c:
+
+    w(c) = w0 + sum_i a_i c_i + sum_i b_ii c_i^2 + sum_i<j b_ij c_i c_j
+
+which has 1 + 2N + N(N-1)/2 parameters. The card has exactly as many
+points: the SM, c_i = +v and -v for each operator, and c_i = c_j = v for
+each pair. Every point sets all the operators, such that it does not
+depend on the param_card of the events.
+
+    python tools/reweight_card.py [--value=1.0] [--output=reweight_card.dat] ctG ctGI ctW ...
+"""
+
+from __future__ import print_function
+
+import itertools
+import sys
+
+import numpy
+
+header = """#******************************************************************
+#                       Reweight Module                           *
+#******************************************************************
+"""
+
+def quadratic_terms(operators):
+    """ the terms of the quadratic polynomial: () for the constant, (i,) for
+    c_i and (i, j) for c_i c_j with i <= j """
+
+    n = len(operators)
+    return [()] + [(i,) for i in range(n)] + \
+           [(i, j) for i in range(n) for j in range(i, n)]
+
+def design_matrix(points, operators):
+    """ (npoints, nterms) values of the terms of quadratic_terms at the
+    points, given as dictionaries operator -> value (missing ones are 0) """
+
+    values = numpy.array([[point.get(op, 0.) for op in operators] for point in points],
+                         dtype=float).reshape(len(points), len(operators))
+    columns = []
+    for term in quadratic_terms(operators):
+        column = numpy.ones(len(points))
+        for i in term:
+            column = column * values[:, i]
+        columns.append(column)
+    return numpy.column_stack(columns)
+
+def format_value(value):
+    """ 1.0 -> p1, -0.5 -> m0p5 """
+    text = ('%g' % abs(value)).replace('.', 'p').replace('+', '')
+    return ('m' if value < 0 else 'p') + text
+
+def quadratic_points(operators, value=1.):
+    """ the 1 + 2N + N(N-1)/2 points (name, {operator: value}) fixing the
+    quadratic dependence """
+
+    if len(set(operators)) != len(operators):
+        raise ValueError('Operators given more than once: %s' % ' '.join(operators))
+    points = [('sm', {})]
+    for op in operators:
+        for v in (value, -value):
+            points.append(('%s_%s' % (op.lower(), format_value(v)), {op: v}))
+    for op1, op2 in itertools.combinations(operators, 2):
+        points.append(('%s_%s_%s' % (op1.lower(), op2.lower(), format_value(value)),
+                       {op1: value, op2: value}))
+    return points
+
+def reweight_card(points, operators):
+    """ text of the reweight_card with one launch block per point """
+
+    lines = [header, 'change rwgt_dir rwgt', '']
+    for name, values in points:
+        lines.append('launch --rwgt_name=%s' % name)
+        for op in operators:
+            lines.append('set %s %r' % (op, float(values.get(op, 0.))))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:]
+                                                    if arg.startswith('--'))
+    operators = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not operators:
+        sys.exit(__doc__)
+    points = quadratic_points(operators, float(options.get('value', 1.)))
+    text = reweight_card(points, operators)
+    if 'output' in options:
+        with open(options['output'], 'w') as fsock:
+            fsock.write(text)
+        print('%d points for %d operators written in %s' % (len(points),
+                                                   len(operators), options['output']))
+    else:
+        print(text, end='')
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+""" Minimal reweight_card.dat with well conditioned points.
+
+The per-event quadratic fit to the points of reweight_card.py solves a
+linear system with the design matrix of the points. With c = +-1 for every
+operator, operators to which the vertices are much more sensitive than to
+others give columns of very different sizes and an ill conditioned system.
+
+The points are placed in the scaled coefficients x_i = s_i c_i, with the
+sensitivity scales s_i of the model (sensitivity.py): the SM, x_i = +a and
+-a for each operator and x_i = b, x_j = +-b for each pair. a, b (at most
+--max) and the relative sign of the pairs minimize the condition number of
+the design matrix in x. The values of c are rounded to two digits.
+
+    python tools/reweight_points.py [--max=1.] [--energy=GEV] [--output=reweight_card.dat]
+                                    [--model=dim6top_LO_UFO] ctG ctGI ctW ...
+"""
+
+from __future__ import print_function
+
+import itertools
+import os
+import sys
+
+import numpy
+
+from reweight_card import design_matrix, format_value, quadratic_points, reweight_card
+
+models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     os.pardir, 'addons', 'models')
+
+def scaled_points(n, a, b, sign):
+    """ the points in x for n operators, as dictionaries index -> value """
+
+    points = [{}]
+    for i in range(n):
+        points.extend([{i: a}, {i: -a}])
+    for i, j in itertools.combinations(range(n), 2):
+        points.append({i: b, j: sign * b})
+    return points
+
+def condition(points, n):
+    return numpy.linalg.cond(design_matrix(points, list(range(n))))
+
+def optimize(n, xmax=1., steps=20):
+    """ (condition number, a, b, sign) of the best design on a grid of a
+    and b in (0, xmax] """
+
+    best = None
+    grid = xmax * numpy.arange(1, steps + 1) / float(steps)
+    for a in grid:
+        for b in grid:
+            for sign in ((1, -1) if n > 1 else (1,)):
+                cond = condition(scaled_points(n, a, b, sign), n)
+                if best is None or cond < best[0]:
+                    best = (cond, a, b, sign)
+    return best
+
+def round_value(value, digits=2):
+    return float('%.*g' % (digits, value))
+
+def conditioned_points(operators, scales, a, b, sign):
+    """ the 1 + 2N + N(N-1)/2 points (name, {operator: value}) at x = s c
+    of scaled_points """
+
+    points = [('sm', {})]
+    for op in operators:
+        for v in (a, -a):
+            value = round_value(v / scales[op])
+            points.append(('%s_%s' % (op.lower(), format_value(value)), {op: value}))
+    for op1, op2 in itertools.combinations(operators, 2):
+        values = {op1: round_value(b / scales[op1]), op2: round_value(sign * b / scales[op2])}
+        points.append(('%s_%s_%s' % (op1.lower(), op2.lower(), 'pp' if sign > 0 else 'pm'),
+                       values))
+    return points
+
+def scaled_condition(points, operators, scales):
+    """ condition number of the design matrix of points in x = s c """
+    return numpy.linalg.cond(design_matrix(
+        [dict((op, scales[op] * v) for op, v in values.items()) for _, values in points],
+        operators))
+
+def sensitivity_scales(operators, model='dim6top_LO_UFO', energy=None):
+    sys.path.insert(0, os.path.join(models_dir, model))
+    from sensitivity import sensitivity_scales
+    return sensitivity_scales(operators, energy)
+
+
+if __name__ == '__main__':
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:]
+                                                    if arg.startswith('--'))
+    operators = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not operators:
+        sys.exit(__doc__)
+    if len(set(operators)) != len(operators):
+        sys.exit('Operators given more than once: %s' % ' '.join(operators))
+
+    energy = float(options['energy']) if 'energy' in options else None
+    scales = sensitivity_scales(operators, options.get('model', 'dim6top_LO_UFO'), energy)
+    missing = [op for op in operators if not scales[op]]
+    if missing:
+        sys.exit('No coupling depends on %s' % ' '.join(missing))
+
+    cond, a, b, sign = optimize(len(operators), float(options.get('max', 1.)))
+    points = conditioned_points(operators, scales, a, b, sign)
+    report = ['# sensitivity scales: %s' % ' '.join('%s=%.3g' % (op, scales[op])
+                                                   for op in operators),
+              '# x = s c: a=%g b=%g, pairs %s' % (a, b, '(b, b)' if sign > 0 else '(b, -b)'),
+              '# condition number in x: %.4g (c = +-1: %.4g)' % (
+                  scaled_condition(points, operators, scales),
+                  scaled_condition(quadratic_points(operators), operators, scales))]
+    text = '\n'.join(report) + '\n' + reweight_card(points, operators)
+    if 'output' in options:
+        with open(options['output'], 'w') as fsock:
+            fsock.write(text)
+        print('%d points for %d operators written in %s' % (len(points),
+                                                   len(operators), options['output']))
+        print('\n'.join(line[2:] for line in report))
+    else:
+        print(text, end='')